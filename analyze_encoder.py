@@ -28,6 +28,10 @@ from scipy.spatial.distance import pdist
 from sklearn.decomposition import PCA
 from tqdm import tqdm
 
+import xeno_activations
+import xeno_inference
+import xeno_signature
+
 # ── CLI ────────────────────────────────────────────────────────────────────────
 
 parser = argparse.ArgumentParser(
@@ -49,7 +53,7 @@ parser.add_argument("--vector", type=str, default="avg",
 parser.add_argument("-o", "--output-dir", type=str, default="analysis",
                     help="Directory to save plots and text report")
 parser.add_argument("--save-glyphs", type=str, default=None, metavar="DIR",
-                    help="If set, save each glyph image + _code.json + _code_signature.json to this directory")
+                    help="If set, save each glyph image + _code.npy + _code_signature.json to this directory")
 parser.add_argument("--feature-maps", action="store_true", default=False,
                     help="Save a grid image showing the mean 7×7 activation map per encoder channel")
 parser.add_argument("--activation-maps", action="store_true", default=False,
@@ -104,6 +108,10 @@ _enc, _ = model(_test, training=False)
 encoder_shape = tuple(_enc.shape[1:])
 print("Encoder output shape: {}".format(encoder_shape))
 
+# Compiled single-frame inference (avoids model.predict() overhead per iteration).
+inference = xeno_inference.InferenceFunction(model, input_shape)
+inference.warmup()
+
 os.makedirs(args.output_dir, exist_ok=True)
 
 # ── Helpers ────────────────────────────────────────────────────────────────────
@@ -118,91 +126,17 @@ def array_to_image(frame):
     return Image.fromarray(img, mode='L')
 
 
-def _save_encoded_json(encoded, filepath, precision=4):
-    """Save raw encoder activations as channel-major JSON (matches xeno_osc format, no normalization)."""
-    arr = encoded.copy()
-    if arr.ndim == 4:
-        arr = arr[0]                        # (H, W, C)
-        channels = np.round(np.transpose(arr, (2, 0, 1)), precision).tolist()
-    else:
-        channels = np.round(arr.flatten().astype(np.float32), precision).tolist()
-    with open(filepath, "w") as f:
-        json.dump(channels, f, indent=2)
-
-
-def _save_code_signature(encoded, filepath, n_bins=40, precision=4):
-    """Save compact signature JSON (matches xeno_osc format)."""
-    arr = (encoded[0] if encoded.ndim == 4 else encoded).astype(np.float32)
-    vmin, vmax = arr.min(), arr.max()
-    if vmax > vmin:
-        arr = (arr - vmin) / (vmax - vmin)
-    def _r(v): return round(float(v), precision)
-    if arr.ndim == 3:
-        H, W, C = arr.shape
-        spatial = arr.reshape(H * W, C)
-        def _peak(ch_map):
-            vmax = ch_map.max()
-            rows, cols = np.where(ch_map == vmax)
-            return [int(round(rows.mean())), int(round(cols.mean()))]
-        peak_rc = [_peak(arr[:, :, c]) for c in range(C)]
-        data = {
-            "model": model_name,
-            "encoder_layer": encoder_layer,
-            "encoder_shape": list(arr.shape),
-            "n_values": int(arr.size),
-            "min":  [_r(v) for v in spatial.min(axis=0)],
-            "max":  [_r(v) for v in spatial.max(axis=0)],
-            "avg":  [_r(v) for v in spatial.mean(axis=0)],
-            "std":  [_r(v) for v in spatial.std(axis=0)],
-            "q25":  [_r(v) for v in np.percentile(spatial, 25, axis=0)],
-            "q50":  [_r(v) for v in np.percentile(spatial, 50, axis=0)],
-            "q75":  [_r(v) for v in np.percentile(spatial, 75, axis=0)],
-            "peak": peak_rc,
-        }
-    else:
-        flat = arr.flatten()
-        bins = np.array_split(flat, n_bins)
-        data = {
-            "model": model_name,
-            "encoder_layer": encoder_layer,
-            "encoder_shape": list(arr.shape),
-            "n_values": int(flat.size),
-            "min":  [_r(b.min())  for b in bins],
-            "max":  [_r(b.max())  for b in bins],
-            "avg":  [_r(b.mean()) for b in bins],
-            "std":  [_r(b.std())  for b in bins],
-            "q25":  [_r(np.percentile(b, 25)) for b in bins],
-            "q50":  [_r(np.percentile(b, 50)) for b in bins],
-            "q75":  [_r(np.percentile(b, 75)) for b in bins],
-        }
-    with open(filepath, "w") as f:
-        json.dump(data, f, indent=2)
-
-
-def compute_signature(encoded):
-    """Return (min_vec, max_vec, avg_vec) per channel, globally normalized to [0,1]."""
-    arr = encoded[0] if encoded.ndim == 4 else encoded
-    arr = arr.astype(np.float32)
-    vmin, vmax = arr.min(), arr.max()
-    if vmax > vmin:
-        arr = (arr - vmin) / (vmax - vmin)
-    if arr.ndim == 3:
-        H, W, C = arr.shape
-        spatial = arr.reshape(H * W, C)        # (H*W, C)
-        return spatial.min(axis=0), spatial.max(axis=0), spatial.mean(axis=0)
-    else:
-        flat = arr.flatten()
-        return np.array([flat.min()]), np.array([flat.max()]), np.array([flat.mean()])
-
-
 def run_experiment(n, collect_frames=False):
     """Run one feedback loop from a random seed; return list of (min, max, avg) per step.
     If collect_frames is True, also return (frames, encodeds) lists for saving glyphs."""
     frame = np.random.random(input_shape).astype(np.float32)
-    sigs = []
+    encodeds = []
     for _ in range(n):
-        encoded, frame = model.predict(frame, verbose=0)
-        sigs.append(compute_signature(encoded))
+        encoded, frame = inference(frame)
+        encodeds.append(encoded)
+    # Per-channel (or per-bin, for dense encoders) vectors of all steps at once.
+    stats = xeno_signature.batch_stats(np.concatenate(encodeds))
+    sigs = list(zip(stats["min"], stats["max"], stats["avg"]))
     if collect_frames:
         return sigs, np.array(frame), np.array(encoded)
     return sigs
@@ -236,10 +170,10 @@ if save_glyphs:
         name = "glyph_{:04d}".format(idx)
         array_to_image(all_frames[idx]).save(
             os.path.join(args.save_glyphs, name + ".png"))
-        _save_encoded_json(all_encodeds[idx],
-            os.path.join(args.save_glyphs, name + "_code.json"))
-        _save_code_signature(all_encodeds[idx],
-            os.path.join(args.save_glyphs, name + "_code_signature.json"))
+        xeno_activations.save_activations(all_encodeds[idx],
+            os.path.join(args.save_glyphs, name + xeno_activations.NPY_SUFFIX))
+        xeno_signature.save_signature(all_encodeds[idx],
+            os.path.join(args.save_glyphs, name + "_code_signature.json"), model_name, encoder_layer)
     print("Saved {} glyphs.".format(len(all_frames)))
 
 # ── Feature maps ───────────────────────────────────────────────────────────────
@@ -0,0 +1,131 @@
+"""Report the drift of quantized autoencoder inference against float32.
+
+Runs N feedback loops (each from a different random seed) with the NumPy
+runtime at full precision and at each quantized precision, chaining every
+precision on its own outputs as xeno_osc does, and reports per iteration how
+far the quantized frames drift from the float32 ones: per-pixel absolute
+difference (mean / 99th percentile / max), the share of pixels on the other
+side of output_threshold (i.e. that would change the projected glyph), and
+the relative drift of the encoder activations sent to the sonoscope. Also
+reports weight memory and per-iteration latency.
+
+The model must have been exported with `python xeno_inference.py results/<model>.hdf5`.
+
+Usage:
+    python analyze_quantization.py                         # uses settings.json defaults
+    python analyze_quantization.py -n 100 -s 16            # 100 runs, 16 iterations each
+    python analyze_quantization.py --precisions int8 --csv drift.csv
+"""
+
+import argparse
+import csv
+import json
+import time
+
+import numpy as np
+
+import xeno_inference
+
+# ── CLI ────────────────────────────────────────────────────────────────────────
+
+parser = argparse.ArgumentParser(
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    description=__doc__,
+)
+parser.add_argument("-C", "--configuration-file", type=str,
+                    default="XenoPi/settings.json",
+                    help="Path to settings.json")
+parser.add_argument("-M", "--model-directory", type=str, default="results",
+                    help="Directory containing exported .npz model files")
+parser.add_argument("-n", "--n-experiments", type=int, default=50,
+                    help="Number of independent feedback runs (different random seeds)")
+parser.add_argument("-s", "--n-steps", type=int, default=None,
+                    help="Feedback iterations per run (default: n_feedback_steps from settings)")
+parser.add_argument("--precisions", type=lambda str: str.split(","), default="float16,int8",
+                    help="Comma-separated quantized precisions to compare with float32")
+parser.add_argument("--seed", type=int, default=0,
+                    help="Random seed for the starting frames")
+parser.add_argument("--csv", type=str, default=None,
+                    help="If set, also write the per-iteration results to this CSV file")
+args = parser.parse_args()
+
+# ── Load settings ──────────────────────────────────────────────────────────────
+
+with open(args.configuration_file, "r") as f:
+    settings = json.load(f)
+
+model_name    = settings["model_name"]
+encoder_layer = settings["encoder_layer"]
+use_conv      = settings["use_convolutional"]
+threshold     = float(settings.get("output_threshold", 0.5))
+n_steps       = args.n_steps if args.n_steps is not None else settings["n_feedback_steps"]
+
+for precision in args.precisions:
+    if precision not in xeno_inference.PRECISIONS:
+        parser.error("unknown precision '{}' (expected one of {})".format(precision, ", ".join(xeno_inference.PRECISIONS)))
+
+image_side = 28
+input_shape = (1, image_side, image_side, 1) if use_conv else (1, image_side * image_side)
+npz_file = "{}/{}.npz".format(args.model_directory, model_name)
+
+print("Model     : {}".format(npz_file))
+print("Enc layer : {}".format(encoder_layer))
+print("Steps/run : {}".format(n_steps))
+print("Runs      : {}".format(args.n_experiments))
+print("Threshold : {}".format(threshold))
+
+models = {precision: xeno_inference.NumpyModel(npz_file, encoder_layer, input_shape, precision=precision)
+          for precision in ["float32"] + args.precisions}
+
+# ── Run ────────────────────────────────────────────────────────────────────────
+
+def run_chains(model, seeds):
+    """Run the feedback loop on a batch of seeds; return per-iteration (encoded, frame) lists and seconds/iteration."""
+    frame = seeds
+    encodeds, frames = [], []
+    start = time.perf_counter()
+    for _ in range(n_steps):
+        encoded, frame = model(frame)
+        encodeds.append(encoded)
+        frames.append(frame)
+    return encodeds, frames, (time.perf_counter() - start) / n_steps
+
+
+seeds = np.random.RandomState(args.seed).random_sample((args.n_experiments,) + input_shape[1:]).astype(np.float32)
+results = {precision: run_chains(model, seeds) for precision, model in models.items()}
+ref_encodeds, ref_frames, _ = results["float32"]
+
+rows = []
+print("\n{:>9} {:>5} {:>10} {:>10} {:>10} {:>10} {:>10}".format(
+    "precision", "iter", "mean|d|", "p99|d|", "max|d|", "glyph%", "enc rel"))
+for precision in args.precisions:
+    encodeds, frames, _ = results[precision]
+    for i in range(n_steps):
+        diff = np.abs(frames[i] - ref_frames[i])
+        flipped = (frames[i] > threshold) != (ref_frames[i] > threshold)
+        enc_rel = np.abs(encodeds[i] - ref_encodeds[i]).mean() / max(np.abs(ref_encodeds[i]).mean(), 1e-12)
+        row = {
+            "precision": precision,
+            "iteration": i + 1,
+            "mean_abs_diff": float(diff.mean()),
+            "p99_abs_diff": float(np.percentile(diff, 99)),
+            "max_abs_diff": float(diff.max()),
+            "glyph_pixels_changed_pct": float(flipped.mean() * 100),
+            "encoder_relative_drift": float(enc_rel),
+        }
+        rows.append(row)
+        print("{:>9} {:>5} {:>10.5f} {:>10.5f} {:>10.5f} {:>9.3f}% {:>10.5f}".format(
+            precision, i + 1, row["mean_abs_diff"], row["p99_abs_diff"],
+            row["max_abs_diff"], row["glyph_pixels_changed_pct"], row["encoder_relative_drift"]))
+
+print("\nPer-iteration latency ({} frames per batch):".format(args.n_experiments))
+for precision, (_, _, seconds) in results.items():
+    print("  {:>8}: {:8.3f} ms/frame  weights {:6.0f} KB".format(
+        precision, seconds * 1000 / args.n_experiments, models[precision].weight_bytes() / 1024))
+
+if args.csv:
+    with open(args.csv, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+    print("\nWrote {}".format(args.csv))
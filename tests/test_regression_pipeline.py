@@ -55,6 +55,33 @@ class TestRegressionPipeline(unittest.TestCase):
         if failures:
             self.fail(f"Pipeline output differs from stored _2res.png:\n" + "\n".join(failures))
 
+    def test_numpy_engine_matches_stored_outputs(self):
+        """The numpy engine must reproduce stored _2res.png exactly, like the PIL engine."""
+        cases = _collect_cases()
+        self.assertGreater(len(cases), 0, "No regression cases found — check SNAPSHOTS_BASE path")
+        failures = []
+        for raw_path, ref_path, camera_quad, base_image_path in cases:
+            resized, _, _, _, _, _ = xeno_image.load_image(
+                raw_path, base_image_path,
+                image_side=28, input_quad=camera_quad,
+                squircle_mode="none", engine="numpy"
+            )
+            ref = Image.open(ref_path).convert('L')
+            if not np.array_equal(np.array(resized), np.array(ref)):
+                failures.append(os.path.relpath(raw_path))
+        if failures:
+            self.fail("Numpy engine output differs from stored _2res.png:\n" + "\n".join(failures))
+
+    def test_numpy_engine_stages_match_pil_engine(self):
+        """Every intermediate stage of the numpy engine must match the PIL engine."""
+        cases = _collect_cases()
+        self.assertGreater(len(cases), 0, "No regression cases found — check SNAPSHOTS_BASE path")
+        for raw_path, ref_path, camera_quad, base_image_path in cases[:10]:
+            image = Image.open(raw_path)
+            base_image = Image.open(base_image_path) if base_image_path else False
+            diffs = xeno_image.compare_engines(image, base_image, 28, camera_quad, squircle_mode="none")
+            self.assertEqual(max(diffs.values()), 0, f"{os.path.relpath(raw_path)}: {diffs}")
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,66 @@
+# tests/test_xeno_activations.py
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import xeno_activations
+
+
+class TestActivations(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.encoded = np.random.RandomState(0).random_sample((1, 7, 7, 32)).astype(np.float32)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _write_json(self, path, encoded):
+        """Same layout as xeno_osc.save_encoded_json(): channel-major nested lists."""
+        with open(path, "w") as f:
+            json.dump(np.round(np.transpose(encoded[0], (2, 0, 1)), 6).tolist(), f, indent=2)
+
+    def test_round_trip_is_channel_major_float16(self):
+        path = os.path.join(self.tmp.name, "snapshot_0001_raw_code.npy")
+        xeno_activations.save_activations(self.encoded, path)
+        codes = xeno_activations.load_activations(path)
+        self.assertIsInstance(codes, np.memmap)
+        self.assertEqual(codes.dtype, np.float16)
+        self.assertEqual(codes.shape, (32, 7, 7))
+        np.testing.assert_allclose(codes, np.transpose(self.encoded[0], (2, 0, 1)), rtol=1e-3)
+
+    def test_dense_activations_are_flat(self):
+        path = os.path.join(self.tmp.name, "dense_code.npy")
+        xeno_activations.save_activations(np.arange(64, dtype=np.float32).reshape(1, 64), path)
+        codes = xeno_activations.load_activations(path, mmap=False)
+        self.assertEqual(codes.shape, (64,))
+        np.testing.assert_array_equal(codes, np.arange(64))
+
+    def test_json_and_npy_load_to_the_same_layout(self):
+        json_path = os.path.join(self.tmp.name, "snapshot_0001_raw_code.json")
+        npy_path = os.path.join(self.tmp.name, "snapshot_0001_raw_code.npy")
+        self._write_json(json_path, self.encoded)
+        xeno_activations.save_activations(self.encoded, npy_path)
+        np.testing.assert_allclose(xeno_activations.load_activations(json_path),
+                                   xeno_activations.load_activations(npy_path), rtol=1e-3)
+
+    def test_convert_directory(self):
+        experiment = os.path.join(self.tmp.name, "experiment")
+        os.makedirs(experiment)
+        for i in range(3):
+            self._write_json(os.path.join(experiment, "snapshot_{:04d}_raw_code.json".format(i)), self.encoded)
+        json_files = xeno_activations.find_json_files(self.tmp.name)
+        self.assertEqual(len(json_files), 3)
+        npy_file, json_size, npy_size = xeno_activations.convert(json_files[0])
+        self.assertTrue(npy_file.endswith("snapshot_0000_raw_code.npy"))
+        self.assertLess(npy_size, json_size)
+        # Already converted: skipped unless overwriting.
+        self.assertIsNone(xeno_activations.convert(json_files[0]))
+        self.assertIsNotNone(xeno_activations.convert(json_files[0], overwrite=True))
+        xeno_activations.convert(json_files[1], remove_json=True)
+        self.assertFalse(os.path.exists(json_files[1]))
+        np.testing.assert_allclose(xeno_activations.load_activations(npy_file),
+                                   np.transpose(self.encoded[0], (2, 0, 1)), rtol=1e-3)
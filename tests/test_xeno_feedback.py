@@ -0,0 +1,171 @@
+# tests/test_xeno_feedback.py
+import unittest
+
+import numpy as np
+
+import xeno_feedback
+import xeno_timing
+
+
+class ScalingInference:
+    """Stub inference multiplying each frame of a batch by its rate (0.5: the change halves at every call); counts calls."""
+
+    def __init__(self, rates=(0.5,)):
+        self.rates = np.asarray(rates, dtype=np.float64).reshape(-1, 1, 1, 1)
+        self.n_calls = 0
+
+    def __call__(self, frames):
+        self.n_calls += 1
+        return frames.reshape(len(frames), -1).sum(axis=1), frames * self.rates
+
+
+def identity_inference(frames):
+    """Stub inference leaving frames unchanged; encodes each frame as its average."""
+    return frames.reshape(len(frames), -1).mean(axis=1), frames
+
+
+def constant_frame(value):
+    return np.full((1, 2, 2, 1), value, dtype=np.float64)
+
+
+class TestFrameChange(unittest.TestCase):
+
+    def test_l1_and_linf_norms(self):
+        prev = np.zeros((2, 2, 2, 1))
+        frame = prev.copy()
+        frame[0, 0, 0, 0] = 0.8
+        frame[1] = 0.1
+        np.testing.assert_allclose(xeno_feedback.frame_change(frame, prev, "linf"), [0.8, 0.1])
+        np.testing.assert_allclose(xeno_feedback.frame_change(frame, prev, "l1"), [0.2, 0.1])
+
+
+class TestFeedbackLoop(unittest.TestCase):
+
+    def test_runs_all_steps_without_tolerance(self):
+        inference = ScalingInference()
+        encoded, frame, n_iterations = xeno_feedback.feedback_loop(inference, np.ones((1, 2, 2, 1)), 5)
+        self.assertEqual(n_iterations, 5)
+        self.assertEqual(inference.n_calls, 5)
+        np.testing.assert_allclose(frame, 0.5 ** 5)
+        np.testing.assert_allclose(encoded, [4 * 0.5 ** 4])
+
+    def test_stops_once_converged(self):
+        # Changes: 0.5, 0.25, 0.125, 0.0625, ...
+        inference = ScalingInference()
+        _, frame, n_iterations = xeno_feedback.feedback_loop(inference, np.ones((1, 2, 2, 1)), 10, tolerance=0.1)
+        self.assertEqual(n_iterations, 4)
+        self.assertEqual(inference.n_calls, 4)
+        np.testing.assert_allclose(frame, 0.5 ** 4)
+
+    def test_norms(self):
+        # One pixel of four changes: linf change 0.5, 0.25, ...; l1 change a quarter of it.
+        frame = np.zeros((1, 2, 2, 1))
+        frame[0, 0, 0, 0] = 1.0
+        _, _, n_linf = xeno_feedback.feedback_loop(ScalingInference(), frame, 10, tolerance=0.1, norm="linf")
+        _, _, n_l1 = xeno_feedback.feedback_loop(ScalingInference(), frame, 10, tolerance=0.1, norm="l1")
+        self.assertEqual(n_linf, 4)
+        self.assertEqual(n_l1, 2)
+
+    def test_batch_stops_when_every_frame_converged(self):
+        # The first frame converges after 1 iteration (change 0.01), the second after 4.
+        inference = ScalingInference(rates=(0.99, 0.5))
+        _, frames, n_iterations = xeno_feedback.feedback_loop(inference, np.ones((2, 2, 2, 1)), 10, tolerance=0.1)
+        self.assertEqual(n_iterations, 4)
+        np.testing.assert_allclose(frames[1], 0.5 ** 4)
+
+    def test_never_converging_runs_all_steps(self):
+        _, _, n_iterations = xeno_feedback.feedback_loop(ScalingInference(), np.ones((1, 2, 2, 1)), 3, tolerance=1e-6)
+        self.assertEqual(n_iterations, 3)
+
+    def test_iterations_are_timed(self):
+        timing = xeno_timing.StepTiming()
+        xeno_feedback.feedback_loop(ScalingInference(), np.ones((1, 2, 2, 1)), 10, tolerance=0.1, timing=timing)
+        self.assertEqual(timing.counts["iteration"], 4)
+
+    def test_feedback_steps(self):
+        self.assertEqual(xeno_feedback.feedback_steps(5), 5)
+        self.assertEqual(xeno_feedback.feedback_steps(5, tolerance=None, max_steps=20), 5)
+        self.assertEqual(xeno_feedback.feedback_steps(5, tolerance=0.01, max_steps=20), 20)
+        self.assertEqual(xeno_feedback.feedback_steps(5, tolerance=0.01), 5)
+
+
+class TestCandidates(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(0)
+        self.masked = []
+
+    def _mask(self, frame):
+        self.masked.append(frame)
+        return frame
+
+    def _random_frames(self, values):
+        values = iter(values)
+        return lambda: constant_frame(next(values))
+
+    def test_candidate_frames(self):
+        starting_frame, prev_frame = constant_frame(0.2), np.zeros((1, 2, 2, 1))
+        prev_frame[0, 0, 0, 0] = 0.9
+        frames = xeno_feedback.candidate_frames(5, starting_frame, prev_frame, None, jitter=0.5, mask=self._mask)
+        self.assertEqual(frames.shape, (5, 2, 2, 1))
+        np.testing.assert_array_equal(frames[0], starting_frame[0])
+        np.testing.assert_array_equal(frames[1], np.maximum(starting_frame, prev_frame)[0])
+        # Jittered variants: clipped to [0, 1] and masked.
+        self.assertEqual(len(self.masked), 3)
+        self.assertTrue(((frames[2:] >= 0) & (frames[2:] <= 1)).all())
+        self.assertFalse(np.array_equal(frames[2], frames[3]))
+        # Without previous frame, jittered variants follow the starting frame.
+        frames = xeno_feedback.candidate_frames(3, starting_frame, None, None)
+        np.testing.assert_array_equal(frames[0], starting_frame[0])
+        self.assertFalse(np.array_equal(frames[1], starting_frame[0]))
+        self.assertEqual(len(xeno_feedback.candidate_frames(1, starting_frame, prev_frame, None)), 1)
+
+    def test_random_candidates_without_starting_frame(self):
+        frames = xeno_feedback.candidate_frames(3, None, constant_frame(0.9), self._random_frames([0.1, 0.2, 0.3]))
+        np.testing.assert_allclose(frames.reshape(3, -1).mean(axis=1), [0.1, 0.2, 0.3])
+
+    def test_candidate_scores(self):
+        frames = np.concatenate([constant_frame(v) for v in (0.2, 0.45, 0.9)])
+        prev_frame = constant_frame(0.3)
+        self.assertEqual(np.argmax(xeno_feedback.candidate_scores(frames, prev_frame, "first")), 0)
+        self.assertEqual(np.argmax(xeno_feedback.candidate_scores(frames, prev_frame, "density")), 1)
+        self.assertEqual(np.argmax(xeno_feedback.candidate_scores(frames, prev_frame, "novelty")), 2)
+        # Novelty without previous frame: candidate order.
+        self.assertEqual(np.argmax(xeno_feedback.candidate_scores(frames, None, "novelty")), 0)
+
+    def _generate(self, starting_frame, prev_frame, random_frame=None, score="first", n_candidates=3):
+        return xeno_feedback.generate_candidates(identity_inference, 3, starting_frame, prev_frame, random_frame,
+                                                 lambda frame: 0.1 <= frame.mean() <= 0.6,
+                                                 n_candidates=n_candidates, score=score)
+
+    def test_best_valid_candidate_wins(self):
+        # Candidates: starting frame (0.3), merge with the previous frame (0.5) and a jittered variant.
+        starting_frame, prev_frame = constant_frame(0.3), constant_frame(0.5)
+        encoded, frame = self._generate(starting_frame, prev_frame)
+        np.testing.assert_array_equal(frame, starting_frame)
+        np.testing.assert_allclose(encoded, [0.3])
+        encoded, frame = self._generate(starting_frame, prev_frame, score="density")
+        np.testing.assert_array_equal(frame, np.maximum(starting_frame, prev_frame))
+        np.testing.assert_allclose(encoded, [0.5])
+
+    def test_invalid_candidates_are_masked(self):
+        # "first" prefers the starting frame, but it does not validate (average 0.075): its merge with the
+        # previous frame (average 0.325) does.
+        starting_frame = np.array([0.0, 0.0, 0.0, 0.3]).reshape(1, 2, 2, 1)
+        prev_frame = np.array([0.5, 0.5, 0.0, 0.0]).reshape(1, 2, 2, 1)
+        encoded, frame = self._generate(starting_frame, prev_frame, score="first", n_candidates=2)
+        np.testing.assert_array_equal(frame, np.maximum(starting_frame, prev_frame))
+        np.testing.assert_allclose(encoded, [0.325])
+
+    def test_no_valid_candidate_resends_previous_frame(self):
+        starting_frame, prev_frame = constant_frame(0.8), constant_frame(0.9)
+        encoded, frame = self._generate(starting_frame, prev_frame, score="density", n_candidates=2)
+        self.assertIs(frame, prev_frame)
+        # Encoding of the best (invalid) candidate: the starting frame, closest to 0.5.
+        np.testing.assert_allclose(encoded, [0.8])
+
+    def test_random_candidates_are_drawn_until_one_validates(self):
+        random_frame = self._random_frames([0.9, 0.95, 0.05, 0.4])
+        encoded, frame = self._generate(None, None, random_frame, n_candidates=2)
+        np.testing.assert_array_equal(frame, constant_frame(0.4))
+        np.testing.assert_allclose(encoded, [0.4])
@@ -1,4 +1,6 @@
 # tests/test_xeno_image.py
+import os
+import tempfile
 import unittest
 import numpy as np
 from PIL import Image
@@ -119,6 +121,31 @@ class TestPostprocessOutput(unittest.TestCase):
         result = xeno_image.postprocess_output(img)
         self.assertIsInstance(result, Image.Image)
 
+    def _assert_same_as_loop(self, img, **kwargs):
+        reference = np.array(xeno_image.postprocess_output(img, vectorized=False, **kwargs))
+        result = np.array(xeno_image.postprocess_output(img, **kwargs))
+        np.testing.assert_array_equal(result, reference)
+
+    def test_vectorized_matches_loop_on_noise(self):
+        """The vectorized renderer must match the per-component loop on noisy outputs."""
+        rng = np.random.RandomState(0)
+        for threshold in (0.3, 0.5, 0.7):
+            img = Image.fromarray((rng.rand(28, 28) * 255).astype(np.uint8), mode='L')
+            self._assert_same_as_loop(img, output_size=112, threshold=threshold)
+            self._assert_same_as_loop(img, output_size=112, threshold=threshold, stroke_width=3, boundary_px=4)
+
+    def test_vectorized_matches_loop_nested_components(self):
+        """A thick blob inside the hole of a thick ring, and thin strokes next to
+        thick shapes, must be rendered as by the per-component loop."""
+        arr = np.zeros((28, 28), dtype=np.uint8)
+        y, x = np.mgrid[:28, :28]
+        r2 = (x - 14) ** 2 + (y - 14) ** 2
+        arr[(r2 <= 13 ** 2) & (r2 >= 9 ** 2)] = 255
+        arr[r2 <= 5 ** 2] = 255
+        arr[0, :] = 255
+        arr[:, 27] = 255
+        self._assert_same_as_loop(Image.fromarray(arr, mode='L'), output_size=112, stroke_width=4, boundary_px=3)
+
 
 def _semicircle_image(size=224):
     """White top-half disc on black background, simulating petri dish content."""
@@ -205,6 +232,175 @@ class TestProcessImageSquircle(unittest.TestCase):
                 f"Corner ({r},{c}) R={result[r,c,0]} should be near-white after add_mask vignette")
 
 
+class TestImagePipeline(unittest.TestCase):
+
+    def test_stages_match_process_image(self):
+        """All pipeline stages must equal process_image() outputs."""
+        img = _semicircle_image()
+        expected = xeno_image.process_image(img, squircle_mode="inside")
+        pipeline = xeno_image.ImagePipeline(img, squircle_mode="inside")
+        for name, exp in zip(xeno_image.ImagePipeline.STAGES, expected):
+            np.testing.assert_array_equal(np.array(pipeline.get(name)), np.array(exp))
+
+    def test_raw_transformed_skips_filtering(self):
+        """Requesting only raw_transformed must not run masking, filtering or thinning."""
+        from unittest.mock import patch
+        img = _semicircle_image()
+        with patch.object(xeno_image, 'add_mask') as add_mask, \
+             patch.object(xeno_image, 'enhance') as enhance, \
+             patch.object(xeno_image, 'simplify') as simplify:
+            pipeline = xeno_image.ImagePipeline(img)
+            self.assertEqual(pipeline.raw_transformed.size, (224, 224))
+        add_mask.assert_not_called()
+        enhance.assert_not_called()
+        simplify.assert_not_called()
+        self.assertFalse(pipeline.is_computed("transformed"))
+
+    def test_stages_are_memoized(self):
+        """A stage must be computed once and then reused."""
+        pipeline = xeno_image.ImagePipeline(_semicircle_image())
+        self.assertIs(pipeline.resized, pipeline.resized)
+        self.assertIs(pipeline.stages("enhanced")[0], pipeline.enhanced)
+
+    def test_unknown_stage_raises(self):
+        with self.assertRaises(ValueError):
+            xeno_image.ImagePipeline(_semicircle_image()).get("bogus")
+
+
+def _capture_pair(width=320, height=240, seed=0):
+    """Return (raw, base) RGB images: noisy background with darker blobs."""
+    rng = np.random.RandomState(seed)
+    base = (rng.rand(height, width, 3) * 60 + 150).astype(np.uint8)
+    raw = base.astype(np.int32)
+    y, x = np.mgrid[:height, :width]
+    for _ in range(6):
+        cx, cy, r = rng.randint(0, width), rng.randint(0, height), rng.randint(5, 30)
+        raw[(x - cx) ** 2 + (y - cy) ** 2 < r * r] -= 60
+    raw = np.clip(raw + rng.randint(-10, 10, raw.shape), 0, 255).astype(np.uint8)
+    return Image.fromarray(raw), Image.fromarray(base)
+
+
+class TestNumpyEngine(unittest.TestCase):
+
+    QUAD = [0.1, 0.05, 0.12, 0.95, 0.9, 0.93, 0.88, 0.07]
+
+    def test_stages_identical_to_pil_engine(self):
+        """All stages must be bit-exact with the PIL engine, for every squircle mode."""
+        raw, base = _capture_pair()
+        for squircle_mode in ("none", "inside", "outside"):
+            for base_image in (False, base):
+                diffs = xeno_image.compare_engines(raw, base_image, 28, self.QUAD, squircle_mode)
+                self.assertEqual(max(diffs.values()), 0, f"{squircle_mode}: {diffs}")
+
+    def test_quad_outside_frame_is_black(self):
+        """Quad corners outside the frame must be filled with black, as with PIL."""
+        raw, _ = _capture_pair(seed=1)
+        quad = [-0.1, -0.1, -0.1, 1.1, 1.1, 1.1, 1.1, -0.1]
+        diffs = xeno_image.compare_engines(raw, False, 28, quad)
+        self.assertEqual(diffs["raw_transformed"], 0)
+        self.assertEqual(diffs["transformed"], 0)
+
+    def test_process_image_engine_argument(self):
+        """process_image(engine='numpy') must return PIL images with the same modes."""
+        raw, base = _capture_pair(seed=2)
+        reference = xeno_image.process_image(raw, base, input_quad=self.QUAD)
+        fast = xeno_image.process_image(raw, base, input_quad=self.QUAD, engine="numpy")
+        for ref, img in zip(reference, fast):
+            self.assertIsInstance(img, Image.Image)
+            self.assertEqual(img.mode, ref.mode)
+            self.assertEqual(img.size, ref.size)
+
+    def test_unknown_engine_raises(self):
+        with self.assertRaises(ValueError):
+            xeno_image.create_pipeline(_semicircle_image(), engine="bogus")
+
+
+class TestQuadTransformer(unittest.TestCase):
+
+    QUAD = [0.1, 0.05, -0.1, 0.9, 1.1, 1.05, 0.92, -0.1]
+
+    def _pil_transform(self, image, quad):
+        w, h = image.size
+        quad_abs = tuple(v * (w if i % 2 == 0 else h) for i, v in enumerate(quad))
+        side = max(w, h)
+        return image.transform((side, side), Image.QUAD, quad_abs)
+
+    def setUp(self):
+        xeno_image.clear_transformer_cache()
+
+    def test_identical_to_pil_quad(self):
+        """transform() must match Image.QUAD exactly for L and RGB frames of any aspect."""
+        rng = np.random.RandomState(0)
+        for w, h in ((320, 240), (240, 320), (101, 77)):
+            for mode, shape in (("L", (h, w)), ("RGB", (h, w, 3))):
+                img = Image.fromarray(rng.randint(0, 256, shape, dtype=np.uint8), mode=mode)
+                out = xeno_image.transform(img, self.QUAD)
+                self.assertEqual(out.mode, mode)
+                np.testing.assert_array_equal(np.asarray(out), np.asarray(self._pil_transform(img, self.QUAD)))
+
+    def test_transformer_is_cached_per_quad_and_size(self):
+        t1 = xeno_image.get_transformer(self.QUAD, (320, 240))
+        self.assertIs(xeno_image.get_transformer(list(self.QUAD), (320, 240)), t1)
+        self.assertIsNot(xeno_image.get_transformer(self.QUAD, (240, 320)), t1)
+        self.assertTrue(t1.matches(self.QUAD, (320, 240)))
+        xeno_image.clear_transformer_cache()
+        self.assertIsNot(xeno_image.get_transformer(self.QUAD, (320, 240)), t1)
+
+    def test_apply_several_images_in_one_warp(self):
+        """apply() on an RGB and an L frame must equal transforming each separately."""
+        raw, base = _capture_pair()
+        transformer = xeno_image.get_transformer(self.QUAD, raw.size)
+        out_raw, out_base = transformer.apply(raw, base.convert('L'))
+        self.assertEqual((out_raw.mode, out_base.mode), ("RGB", "L"))
+        np.testing.assert_array_equal(np.asarray(out_raw), np.asarray(self._pil_transform(raw, self.QUAD)))
+        np.testing.assert_array_equal(np.asarray(out_base), np.asarray(self._pil_transform(base.convert('L'), self.QUAD)))
+
+
+class TestBaseImageCache(unittest.TestCase):
+
+    QUAD = [0.1, 0.05, 0.12, 0.95, 0.9, 0.93, 0.88, 0.07]
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.raw, self.base = _capture_pair()
+        self.raw_path = os.path.join(self.tmp.name, "snapshot_raw.png")
+        self.base_path = os.path.join(self.tmp.name, "base_image.png")
+        self.raw.save(self.raw_path)
+        self.base.save(self.base_path)
+        xeno_image.clear_base_image_cache()
+
+    def tearDown(self):
+        xeno_image.clear_base_image_cache()
+        self.tmp.cleanup()
+
+    def test_base_image_is_decoded_once(self):
+        first = xeno_image.get_base_image(self.base_path)
+        self.assertIs(xeno_image.get_base_image(self.base_path), first)
+        self.assertIs(first.transformed(self.QUAD), first.transformed(self.QUAD))
+        np.testing.assert_array_equal(first.array, np.asarray(self.base))
+
+    def test_reloaded_when_file_changes(self):
+        first = xeno_image.get_base_image(self.base_path)
+        Image.fromarray(255 - np.asarray(self.base)).save(self.base_path)
+        os.utime(self.base_path, (first.mtime + 10, first.mtime + 10))
+        second = xeno_image.get_base_image(self.base_path)
+        self.assertIsNot(second, first)
+        np.testing.assert_array_equal(second.array, 255 - np.asarray(self.base))
+
+    def test_transformed_matches_transform(self):
+        expected = xeno_image.transform(Image.open(self.base_path).convert('L'), self.QUAD)
+        np.testing.assert_array_equal(xeno_image.get_base_image(self.base_path).transformed_array(self.QUAD),
+                                      np.asarray(expected))
+
+    def test_load_image_with_cached_base_unchanged(self):
+        reference = xeno_image.process_image(Image.open(self.raw_path), Image.open(self.base_path), input_quad=self.QUAD)
+        for engine in xeno_image.PIPELINE_ENGINES:
+            for _ in range(2):
+                stages = xeno_image.load_image(self.raw_path, self.base_path, input_quad=self.QUAD, engine=engine)
+                for ref, img in zip(reference, stages):
+                    np.testing.assert_array_equal(np.asarray(img), np.asarray(ref))
+
+
 class TestSquircleOutside(unittest.TestCase):
 
     def test_to_circle_outside_all_corners_populated(self):
@@ -271,5 +467,109 @@ class TestSquircleOutside(unittest.TestCase):
                 f"Corner ({r},{c})={result[r,c]} is near-zero — source coords not clamped")
 
 
+class TestSquircleMapsCache(unittest.TestCase):
+
+    def setUp(self):
+        xeno_image.clear_squircle_cache()
+
+    def tearDown(self):
+        xeno_image.clear_squircle_cache()
+        xeno_image.use_fixed_point_maps = False
+
+    def test_cached_grid_is_reused(self):
+        """A second lookup with the same (n, scale, direction) must return the same arrays."""
+        first = xeno_image.squircle_maps(64, 1.0, "circle")
+        second = xeno_image.squircle_maps(64, 1.0, "circle")
+        self.assertIs(first[0], second[0])
+        self.assertIs(first[1], second[1])
+
+    def test_cached_result_matches_recomputed(self):
+        """Repeated remaps through the cache must match a fresh computation exactly."""
+        ramp = Image.fromarray(np.tile(np.arange(112, dtype=np.uint8), (112, 1)), mode='L')
+        cached = [np.array(xeno_image.to_circle_outside(ramp)) for _ in range(2)]
+        xeno_image.clear_squircle_cache()
+        fresh = np.array(xeno_image.to_circle_outside(ramp))
+        np.testing.assert_array_equal(cached[0], fresh)
+        np.testing.assert_array_equal(cached[1], fresh)
+
+    def test_fixed_point_maps_close_to_float(self):
+        """Fixed-point remap grids must stay within a few grey levels of the float ones."""
+        ramp = Image.fromarray(np.tile(np.arange(224, dtype=np.uint8), (224, 1)), mode='L')
+        exact = np.array(xeno_image.to_square_inside(ramp)).astype(int)
+        xeno_image.use_fixed_point_maps = True
+        fixed = np.array(xeno_image.to_square_inside(ramp)).astype(int)
+        self.assertLessEqual(np.abs(exact - fixed).max(), 8)
+
+    def test_cache_file_round_trip(self):
+        """Grids saved to disk must be reloaded identically."""
+        import os
+        import tempfile
+        map_x, map_y, outside = xeno_image.squircle_maps(32, np.sqrt(2), "circle")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "squircle_maps.npz")
+            xeno_image.save_squircle_cache(path)
+            xeno_image.clear_squircle_cache()
+            self.assertEqual(xeno_image.load_squircle_cache(path), 1)
+        loaded_x, loaded_y, loaded_outside = xeno_image.squircle_maps(32, np.sqrt(2), "circle")
+        np.testing.assert_array_equal(loaded_x, map_x)
+        np.testing.assert_array_equal(loaded_y, map_y)
+        np.testing.assert_array_equal(loaded_outside, outside)
+
+    def test_cache_file_write_failure_is_not_fatal(self):
+        """A grid computed while the cache file cannot be written is still returned."""
+        import os
+        import tempfile
+        with tempfile.TemporaryDirectory() as tmp:
+            xeno_image.set_squircle_cache_file(os.path.join(tmp, "missing", "squircle_maps.npz"))
+            try:
+                with self.assertLogs("xeno_image", level="WARNING"):
+                    map_x, _, _ = xeno_image.squircle_maps(32, np.sqrt(2), "circle")
+            finally:
+                xeno_image.set_squircle_cache_file(None)
+        self.assertEqual(map_x.shape, (32, 32))
+
+
+class TestMaskCache(unittest.TestCase):
+
+    def _reference_add_mask(self, image):
+        """Original add_mask: composite xeno_mask.png read from disk with PIL."""
+        import os
+        mask_path = os.path.join(os.path.dirname(xeno_image.__file__), "xeno_mask.png")
+        mask = Image.open(mask_path).convert('RGBA').resize(image.size)
+        return Image.alpha_composite(image.convert('RGBA'), mask).convert('RGB')
+
+    def test_add_mask_matches_alpha_composite(self):
+        """Numpy blend must reproduce PIL alpha_composite exactly for L and RGB images."""
+        rng = np.random.RandomState(0)
+        for shape, mode in [((60, 80), 'L'), ((60, 80, 3), 'RGB')]:
+            img = Image.fromarray(rng.randint(0, 256, shape).astype(np.uint8), mode=mode)
+            np.testing.assert_array_equal(np.array(xeno_image.add_mask(img)),
+                                          np.array(self._reference_add_mask(img)))
+
+    def test_add_mask_invert_matches_reference(self):
+        """Inverted masking must equal invert(mask(invert(image)))."""
+        from PIL import ImageOps
+        img = Image.fromarray(np.random.RandomState(1).randint(0, 256, (28, 28)).astype(np.uint8), mode='L')
+        expected = ImageOps.invert(self._reference_add_mask(ImageOps.invert(img)))
+        np.testing.assert_array_equal(np.array(xeno_image.add_mask(img, True)), np.array(expected))
+
+    def test_mask_file_read_once(self):
+        """Repeated masking at one size must not reopen xeno_mask.png."""
+        from unittest.mock import patch
+        img = _solid_white_image(size=37)
+        xeno_image.add_mask(img)
+        with patch.object(xeno_image.Image, 'open', side_effect=AssertionError("mask reloaded")):
+            xeno_image.add_mask(img)
+            xeno_image.add_mask(img, True)
+            xeno_image.create_mask(img)
+
+    def test_mask_variants_consistent(self):
+        """Array and PIL variants must hold the same data."""
+        variants = xeno_image.mask_variants((40, 30))
+        self.assertEqual(variants.rgba_array.shape, (30, 40, 4))
+        np.testing.assert_array_equal(variants.gray_array, np.array(variants.gray))
+        np.testing.assert_array_equal(variants.inverted_array, 255 - variants.gray_array)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,208 @@
+# tests/test_xeno_inference.py
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+try:
+    import keras
+except ImportError:
+    keras = None
+
+import xeno_inference
+
+
+def _feedback_model():
+    """Small conv autoencoder with [encoder, decoder] outputs, like xeno_osc builds."""
+    inputs = keras.Input(shape=(28, 28, 1))
+    x = keras.layers.Conv2D(4, 3, activation='relu', padding='same')(inputs)
+    encoded = keras.layers.MaxPooling2D(2, padding='same')(x)
+    x = keras.layers.UpSampling2D(2)(encoded)
+    decoded = keras.layers.Conv2D(1, 3, activation='sigmoid', padding='same')(x)
+    return keras.Model(inputs=inputs, outputs=[encoded, decoded])
+
+
+@unittest.skipIf(keras is None, "keras not installed")
+class TestInferenceFunction(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.model = _feedback_model()
+        cls.inference = xeno_inference.InferenceFunction(cls.model, (1, 28, 28, 1))
+
+    def test_matches_predict(self):
+        """Outputs must match model.predict() for a single float64 frame."""
+        frame = np.random.RandomState(0).random_sample((1, 28, 28, 1))
+        expected = self.model.predict(frame.astype(np.float32), verbose=0)
+        encoded, decoded = self.inference(frame)
+        self.assertEqual(decoded.dtype, np.float32)
+        np.testing.assert_allclose(encoded, expected[0], atol=1e-6)
+        np.testing.assert_allclose(decoded, expected[1], atol=1e-6)
+
+    def test_batch_of_frames(self):
+        """The batch dimension is free: a batch gives the per-frame results stacked."""
+        frames = np.random.RandomState(1).random_sample((3, 28, 28, 1)).astype(np.float32)
+        _, decoded = self.inference(frames)
+        self.assertEqual(decoded.shape, (3, 28, 28, 1))
+        np.testing.assert_allclose(decoded[1:2], self.inference(frames[1:2])[1], atol=1e-6)
+
+    def test_warmup_returns_elapsed_seconds(self):
+        self.assertGreaterEqual(self.inference.warmup(n_calls=1), 0.0)
+
+
+def _autoencoder(dense=False):
+    """Layer mix of deep_autoencoder.py models (odd 7 -> 4 'same' pooling, dropout, dense)."""
+    if dense:
+        inputs = keras.Input(shape=(28 * 28,))
+        x = keras.layers.Dense(32, activation='relu')(inputs)
+        x = keras.layers.Dropout(0.1)(x)
+        x = keras.layers.Dense(28 * 28, activation='sigmoid')(x)
+        return keras.Model(inputs=inputs, outputs=x)
+    inputs = keras.Input(shape=(28, 28, 1))
+    x = keras.layers.Conv2D(4, 5, activation='relu', padding='same')(inputs)
+    x = keras.layers.MaxPooling2D(2, padding='same')(x)
+    x = keras.layers.Dropout(0.1)(x)
+    x = keras.layers.Conv2D(6, 3, activation='relu', padding='same')(x)
+    x = keras.layers.MaxPooling2D(2, padding='same')(x)
+    x = keras.layers.MaxPooling2D(2, padding='same')(x)
+    x = keras.layers.UpSampling2D(2)(x)
+    x = keras.layers.Conv2D(4, 3, activation='relu', padding='valid')(x)
+    x = keras.layers.UpSampling2D(4)(x)
+    x = keras.layers.Conv2D(1, 5, activation='sigmoid', padding='same')(x)
+    return keras.Model(inputs=inputs, outputs=x)
+
+
+@unittest.skipIf(keras is None, "keras not installed")
+class TestNumpyModel(unittest.TestCase):
+    """The exported NumPy runtime must match the Keras model on random inputs."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _check_parity(self, autoencoder, input_shape, encoder_layers):
+        model_file = os.path.join(self.tmp.name, "model.h5")
+        autoencoder.save(model_file)
+        npz_file = xeno_inference.export_npz(model_file)
+        self.assertEqual(npz_file, os.path.join(self.tmp.name, "model.npz"))
+        frames = np.random.RandomState(0).random_sample((3,) + input_shape[1:]).astype(np.float32)
+        for encoder_layer in encoder_layers:
+            model = xeno_inference.load_feedback_model(model_file, encoder_layer)
+            expected = xeno_inference.InferenceFunction(model, input_shape)(frames)
+            encoded, decoded = xeno_inference.NumpyModel(npz_file, encoder_layer)(frames)
+            self.assertEqual(decoded.dtype, np.float32)
+            np.testing.assert_allclose(encoded, expected[0], atol=1e-5)
+            np.testing.assert_allclose(decoded, expected[1], atol=1e-5)
+
+    def test_convolutional_parity(self):
+        autoencoder = _autoencoder()
+        self._check_parity(autoencoder, (1, 28, 28, 1), range(1, len(autoencoder.layers)))
+
+    def test_dense_parity(self):
+        self._check_parity(_autoencoder(dense=True), (1, 28 * 28), [1, 2])
+
+    def test_unsupported_layer_is_rejected(self):
+        inputs = keras.Input(shape=(28, 28, 1))
+        x = keras.layers.Conv2D(1, 3, strides=2, padding='same')(inputs)
+        model_file = os.path.join(self.tmp.name, "strided.h5")
+        keras.Model(inputs=inputs, outputs=x).save(model_file)
+        with self.assertRaises(ValueError):
+            xeno_inference.export_npz(model_file)
+
+
+class TestNumpyOps(unittest.TestCase):
+
+    def test_max_pool_same_pads_like_tensorflow(self):
+        """Odd sizes: 'same' pooling pads at the end, with -inf (not zeros)."""
+        x = -np.arange(1, 50, dtype=np.float32).reshape(1, 7, 7, 1)
+        pooled = xeno_inference._max_pool(x, (2, 2), "same")
+        self.assertEqual(pooled.shape, (1, 4, 4, 1))
+        self.assertEqual(pooled[0, 3, 3, 0], -49)
+        self.assertEqual(pooled[0, 0, 0, 0], -1)
+
+    def test_conv2d_matches_direct_sum(self):
+        rng = np.random.RandomState(0)
+        x = rng.random_sample((2, 6, 5, 3)).astype(np.float32)
+        kernel = rng.random_sample((3, 3, 3, 4)).astype(np.float32)
+        out = xeno_inference._conv2d(x, kernel.reshape(-1, 4), (3, 3), None, "same")
+        padded = np.pad(x, ((0, 0), (1, 1), (1, 1), (0, 0)))
+        expected = np.zeros((2, 6, 5, 4), dtype=np.float32)
+        for i in range(3):
+            for j in range(3):
+                expected += np.tensordot(padded[:, i:i + 6, j:j + 5], kernel[i, j], axes=1)
+        np.testing.assert_allclose(out, expected, atol=1e-5)
+
+
+def _write_npz(path, seed=0):
+    """Hand-written export_npz() file: conv -> pool -> conv -> upsample -> conv (sigmoid)."""
+    rng = np.random.RandomState(seed)
+    layers = [{"type": "input"},
+              {"type": "conv2d", "padding": "same", "activation": "relu"},
+              {"type": "maxpool", "pool_size": [2, 2], "padding": "same"},
+              {"type": "conv2d", "padding": "same", "activation": "relu"},
+              {"type": "upsample", "size": [2, 2]},
+              {"type": "conv2d", "padding": "same", "activation": "sigmoid"}]
+    np.savez(path, format_version=np.array(xeno_inference.NPZ_FORMAT_VERSION),
+             layers=np.array(json.dumps(layers)), input_shape=np.array([1, 28, 28, 1]),
+             kernel_1=rng.normal(0, 0.3, (5, 5, 1, 8)).astype(np.float32), bias_1=np.full(8, 0.01, np.float32),
+             kernel_3=rng.normal(0, 0.1, (5, 5, 8, 8)).astype(np.float32), bias_3=np.zeros(8, np.float32),
+             kernel_5=rng.normal(0, 0.1, (5, 5, 8, 1)).astype(np.float32), bias_5=np.zeros(1, np.float32))
+
+
+class TestQuantizedNumpyModel(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.npz_file = os.path.join(cls.tmp.name, "model.npz")
+        _write_npz(cls.npz_file)
+        cls.frames = np.random.RandomState(1).random_sample((4, 28, 28, 1)).astype(np.float32)
+        cls.reference = xeno_inference.NumpyModel(cls.npz_file, 3)(cls.frames)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_quantize_int8_round_trip(self):
+        x = np.random.RandomState(0).normal(0, 1, (50, 6)).astype(np.float32)
+        q, scale = xeno_inference.quantize_int8(x, axis=-1)
+        self.assertEqual(scale.shape, (1, 6))
+        self.assertLessEqual(np.abs(q).max(), 127)
+        np.testing.assert_array_equal(q, np.round(q))
+        self.assertTrue(np.all(np.abs(q * scale - x) <= scale / 2 + 1e-6))
+
+    def test_int_dot_is_exact(self):
+        rng = np.random.RandomState(0)
+        for k in (100, 2000):
+            a = rng.randint(-127, 128, (10, k))
+            b = rng.randint(-127, 128, (k, 3))
+            np.testing.assert_array_equal(xeno_inference._int_dot(a.astype(np.float32), b.astype(np.float32)), a.dot(b))
+
+    def test_quantized_outputs_stay_close(self):
+        for precision, atol in (("float16", 5e-3), ("int8", 5e-2)):
+            model = xeno_inference.NumpyModel(self.npz_file, 3, precision=precision)
+            encoded, decoded = model(self.frames)
+            self.assertEqual(decoded.dtype, np.float32)
+            np.testing.assert_allclose(decoded, self.reference[1], atol=atol)
+            np.testing.assert_allclose(encoded, self.reference[0], atol=atol * np.abs(self.reference[0]).max())
+
+    def test_int8_frames_are_quantized_independently(self):
+        """Per-frame activation scales: a frame's result does not depend on the rest of the batch."""
+        model = xeno_inference.NumpyModel(self.npz_file, 3, precision="int8")
+        _, batch = model(self.frames)
+        _, single = model(self.frames[2:3])
+        np.testing.assert_array_equal(batch[2:3], single)
+
+    def test_weight_memory(self):
+        sizes = {precision: xeno_inference.NumpyModel(self.npz_file, 3, precision=precision).weight_bytes()
+                 for precision in xeno_inference.PRECISIONS}
+        self.assertLess(sizes["float16"], sizes["float32"])
+        self.assertLess(sizes["int8"], sizes["float16"])
+
+    def test_unknown_precision_raises(self):
+        with self.assertRaises(ValueError):
+            xeno_inference.NumpyModel(self.npz_file, 3, precision="int4")
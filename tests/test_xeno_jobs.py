@@ -0,0 +1,181 @@
+# tests/test_xeno_jobs.py
+import threading
+import time
+import unittest
+
+import xeno_jobs
+
+
+class TestJobWorker(unittest.TestCase):
+
+    def setUp(self):
+        self.worker = xeno_jobs.JobWorker()
+
+    def tearDown(self):
+        self.worker.stop()
+
+    def _block_worker(self):
+        """Occupy the worker until the returned event is set."""
+        started, release = threading.Event(), threading.Event()
+        self.worker.submit(lambda: (started.set(), release.wait()))
+        started.wait(5)
+        return release
+
+    def test_jobs_run_in_order(self):
+        order = []
+        for i in range(5):
+            self.worker.submit(order.append, i)
+        self.worker.join()
+        self.assertEqual(order, list(range(5)))
+
+    def test_submit_returns_immediately(self):
+        """The caller (OSC receive thread) must not wait for a running job."""
+        release = self._block_worker()
+        t0 = time.perf_counter()
+        self.worker.submit(lambda: None)
+        self.assertLess(time.perf_counter() - t0, 0.1)
+        self.assertTrue(self.worker.is_busy())
+        release.set()
+        self.worker.join()
+        self.assertFalse(self.worker.is_busy())
+
+    def test_duplicate_keys_are_coalesced(self):
+        runs = []
+        release = self._block_worker()
+        self.assertTrue(self.worker.submit(runs.append, "a", key=("step", "a")))
+        self.assertFalse(self.worker.submit(runs.append, "a", key=("step", "a")))
+        self.assertTrue(self.worker.submit(runs.append, "b", key=("step", "b")))
+        self.assertEqual(self.worker.pending(), 2)
+        release.set()
+        self.worker.join()
+        self.assertEqual(runs, ["a", "b"])
+        # Once done, the same key can be submitted again.
+        self.assertTrue(self.worker.submit(runs.append, "a", key=("step", "a")))
+        self.worker.join()
+        self.assertEqual(runs, ["a", "b", "a"])
+
+    def test_running_job_key_is_coalesced(self):
+        started, release = threading.Event(), threading.Event()
+        self.worker.submit(lambda: (started.set(), release.wait()), key=("step", "a"))
+        started.wait(5)
+        self.assertFalse(self.worker.submit(lambda: None, key=("step", "a")))
+        release.set()
+        self.worker.join()
+
+    def test_rerun_job_runs_again_after_running_one(self):
+        """A settings reload requested while one is running must run again (the file may have changed since read)."""
+        runs = []
+        started, release = threading.Event(), threading.Event()
+        def load_settings():
+            runs.append("settings")
+            if len(runs) == 1:
+                started.set()
+                release.wait()
+        self.assertTrue(self.worker.submit(load_settings, key="settings", rerun=True))
+        started.wait(5)
+        self.assertTrue(self.worker.submit(load_settings, key="settings", rerun=True))
+        # Further requests merge with the pending one.
+        self.assertFalse(self.worker.submit(load_settings, key="settings", rerun=True))
+        self.assertEqual(self.worker.pending(), 1)
+        release.set()
+        self.worker.join()
+        self.assertEqual(runs, ["settings", "settings"])
+
+    def test_failing_job_does_not_stop_worker(self):
+        done = []
+        with self.assertLogs("xeno_jobs", level="ERROR"):
+            self.worker.submit(lambda: 1 / 0, key="bad")
+            self.worker.submit(done.append, True)
+            self.worker.join()
+        self.assertEqual(done, [True])
+
+    def test_stop_drops_pending_jobs(self):
+        runs = []
+        release = self._block_worker()
+        self.worker.submit(runs.append, 1)
+        self.worker.stop(wait=False)
+        release.set()
+        self.worker.stop()
+        self.assertEqual(runs, [])
+        with self.assertRaises(RuntimeError):
+            self.worker.submit(runs.append, 2)
+
+
+class TestKeyedWorker(unittest.TestCase):
+
+    def setUp(self):
+        self.runs = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+        self.worker = xeno_jobs.KeyedWorker(self._fn)
+
+    def tearDown(self):
+        self.release.set()
+        self.worker.stop()
+
+    def _fn(self, key, callbacks):
+        self.runs.append((key, len(callbacks)))
+        if key == "a":
+            self.started.set()
+            self.release.wait(5)
+        for callback in callbacks:
+            callback()
+
+    def _block(self):
+        """Start a run for "a" that lasts until self.release is set."""
+        self.release.clear()
+        self.worker.request("a")
+        self.started.wait(5)
+
+    def test_requests_during_a_run_are_merged(self):
+        notified = []
+        self._block()
+        self.assertTrue(self.worker.request("a", lambda: notified.append(1)))
+        self.assertFalse(self.worker.request("a", lambda: notified.append(2)))
+        self.assertFalse(self.worker.request("a", lambda: notified.append(3)))
+        self.assertTrue(self.worker.is_busy("a"))
+        self.release.set()
+        self.worker.join()
+        # One run for the first request, one for the three merged ones.
+        self.assertEqual(self.runs, [("a", 0), ("a", 3)])
+        self.assertEqual(notified, [1, 2, 3])
+        self.assertFalse(self.worker.is_busy())
+
+    def test_keys_run_concurrently(self):
+        self._block()
+        done = threading.Event()
+        self.worker.request("b", done.set)
+        # "b" completes while "a" is still running.
+        self.assertTrue(done.wait(5))
+        self.assertTrue(self.worker.is_busy("a"))
+        self.release.set()
+        self.worker.join()
+
+    def test_request_returns_immediately(self):
+        self._block()
+        t0 = time.perf_counter()
+        self.worker.request("a")
+        self.assertLess(time.perf_counter() - t0, 0.1)
+
+    def test_failing_run_does_not_drop_later_requests(self):
+        worker = xeno_jobs.KeyedWorker(lambda key, callbacks: 1 / 0 if key == "bad" else callbacks[0]())
+        done = []
+        with self.assertLogs("xeno_jobs", level="ERROR"):
+            worker.request("bad")
+            worker.join()
+        worker.request("bad")
+        worker.request("good", lambda: done.append(True))
+        worker.join()
+        self.assertEqual(done, [True])
+        worker.stop()
+
+    def test_stop_drops_pending_requests(self):
+        self._block()
+        self.worker.request("a")
+        self.worker.stop(wait=False)
+        self.release.set()
+        self.worker.join()
+        self.assertEqual(self.runs, [("a", 0)])
+        with self.assertRaises(RuntimeError):
+            self.worker.request("a")
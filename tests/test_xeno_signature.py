@@ -0,0 +1,93 @@
+# tests/test_xeno_signature.py
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import xeno_signature
+
+
+def _reference_signature(encoded, n_bins=40, precision=4):
+    """Original per-channel / per-bin loop of xeno_osc.save_code_signature()."""
+    arr = (encoded[0] if encoded.ndim == 4 else encoded).astype(np.float32)
+    vmin, vmax = arr.min(), arr.max()
+    if vmax > vmin:
+        arr = (arr - vmin) / (vmax - vmin)
+    def _r(v): return round(float(v), precision)
+    if arr.ndim == 3:
+        H, W, C = arr.shape
+        spatial = arr.reshape(H * W, C)
+        def _peak(ch_map):
+            vmax = ch_map.max()
+            rows, cols = np.where(ch_map == vmax)
+            return [int(round(rows.mean())), int(round(cols.mean()))]
+        data = {"model": "m", "encoder_layer": 3, "encoder_shape": list(arr.shape), "n_values": int(arr.size)}
+        data.update({
+            "min": [_r(v) for v in spatial.min(axis=0)],
+            "max": [_r(v) for v in spatial.max(axis=0)],
+            "avg": [_r(v) for v in spatial.mean(axis=0)],
+            "std": [_r(v) for v in spatial.std(axis=0)],
+            "q25": [_r(v) for v in np.percentile(spatial, 25, axis=0)],
+            "q50": [_r(v) for v in np.percentile(spatial, 50, axis=0)],
+            "q75": [_r(v) for v in np.percentile(spatial, 75, axis=0)],
+            "peak": [_peak(arr[:, :, c]) for c in range(C)],
+        })
+        return data
+    flat = arr.flatten()
+    bins = np.array_split(flat, n_bins)
+    data = {"model": "m", "encoder_layer": 3, "encoder_shape": list(arr.shape), "n_values": int(flat.size)}
+    data.update({
+        "min": [_r(b.min()) for b in bins],
+        "max": [_r(b.max()) for b in bins],
+        "avg": [_r(b.mean()) for b in bins],
+        "std": [_r(b.std()) for b in bins],
+        "q25": [_r(np.percentile(b, 25)) for b in bins],
+        "q50": [_r(np.percentile(b, 50)) for b in bins],
+        "q75": [_r(np.percentile(b, 75)) for b in bins],
+    })
+    return data
+
+
+class TestSignature(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = np.random.RandomState(0)
+
+    def test_convolutional_matches_reference(self):
+        for shape in ((1, 14, 14, 32), (1, 7, 7, 20)):
+            encoded = np.maximum(self.rng.normal(size=shape), 0).astype(np.float32)
+            self.assertEqual(xeno_signature.signatures(encoded, "m", 3)[0], _reference_signature(encoded))
+
+    def test_dense_matches_reference_with_uneven_bins(self):
+        for size in (40, 64, 100, 1207):
+            encoded = self.rng.random_sample((1, size)).astype(np.float32)
+            self.assertEqual(xeno_signature.signatures(encoded, "m", 3)[0], _reference_signature(encoded))
+
+    def test_batch_matches_single_frames(self):
+        batch = self.rng.random_sample((6, 7, 7, 16)).astype(np.float32)
+        batch[2] = 0.5  # constant frame: not normalized
+        batch[4, 3, 3, :] = 10.0  # single peak per channel
+        signatures = xeno_signature.signatures(batch, "m", 3)
+        for i in range(len(batch)):
+            self.assertEqual(signatures[i], _reference_signature(batch[i:i + 1]))
+        self.assertEqual(signatures[4]["peak"], [[3, 3]] * 16)
+
+    def test_batch_stats_shapes(self):
+        stats = xeno_signature.batch_stats(self.rng.random_sample((5, 7, 7, 16)))
+        self.assertEqual(stats["q50"].shape, (5, 16))
+        self.assertEqual(stats["peak"].shape, (5, 16, 2))
+        stats = xeno_signature.batch_stats(self.rng.random_sample((5, 100)), n_bins=8)
+        self.assertEqual(stats["avg"].shape, (5, 8))
+        self.assertNotIn("peak", stats)
+
+    def test_save_signature(self):
+        encoded = self.rng.random_sample((1, 7, 7, 4)).astype(np.float32)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "snapshot_0001_raw_code_signature.json")
+            xeno_signature.save_signature(encoded, path, "m", 3)
+            with open(path) as f:
+                self.assertEqual(json.load(f), _reference_signature(encoded))
+            xeno_signature.save_signature(None, path + ".none")
+            self.assertFalse(os.path.exists(path + ".none"))
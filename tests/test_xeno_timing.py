@@ -0,0 +1,87 @@
+# tests/test_xeno_timing.py
+import csv
+import os
+import tempfile
+import threading
+import unittest
+
+import xeno_timing
+
+
+class TestStepTiming(unittest.TestCase):
+
+    def test_repeated_stage_is_summed_and_counted(self):
+        timing = xeno_timing.StepTiming("snapshot_0001_raw")
+        for seconds in (0.001, 0.002, 0.003):
+            timing.add("iteration", seconds)
+        timing.add("postprocess", 0.010)
+        self.assertAlmostEqual(timing.durations["iteration"], 0.006)
+        self.assertEqual(timing.counts["iteration"], 3)
+        self.assertEqual(timing.samples["iteration"], [0.001, 0.002, 0.003])
+        row = timing.row()
+        self.assertEqual(row["step"], "snapshot_0001_raw")
+        self.assertEqual(row["n_iterations"], 3)
+        self.assertAlmostEqual(row["postprocess"], 10.0)
+
+    def test_measure_records_even_on_exception(self):
+        timing = xeno_timing.StepTiming()
+        with self.assertRaises(ZeroDivisionError):
+            with timing.measure("load"):
+                1 / 0
+        self.assertEqual(timing.counts["load"], 1)
+
+    def test_timed_wrapper_from_another_thread(self):
+        timing = xeno_timing.StepTiming()
+        result = []
+        thread = threading.Thread(target=timing.timed("save_3ann", result.append), args=(42,))
+        thread.start()
+        thread.join()
+        self.assertEqual(result, [42])
+        self.assertIn("save_3ann", timing.durations)
+
+    def test_end_records_total(self):
+        timing = xeno_timing.StepTiming()
+        timing.end()
+        self.assertGreaterEqual(timing.durations["total"], 0.0)
+
+
+class TestStageStats(unittest.TestCase):
+
+    def test_rolling_window_percentiles(self):
+        stats = xeno_timing.StageStats(window=10)
+        for i in range(20):
+            timing = xeno_timing.StepTiming()
+            timing.add("total", i / 1000.0)
+            stats.record(timing)
+        p50, p95, max_ms = stats.summary()["total"]
+        # Only the last 10 samples (10..19 ms) are kept.
+        self.assertAlmostEqual(p50, 14.5)
+        self.assertAlmostEqual(max_ms, 19.0)
+        self.assertTrue(p50 <= p95 <= max_ms)
+
+    def test_every_iteration_is_a_sample(self):
+        stats = xeno_timing.StageStats()
+        timing = xeno_timing.StepTiming()
+        for seconds in (0.001, 0.001, 0.009):
+            timing.add("iteration", seconds)
+        stats.record(timing)
+        self.assertAlmostEqual(stats.summary()["iteration"][0], 1.0)
+
+
+class TestAppendCsv(unittest.TestCase):
+
+    def test_header_once_and_fixed_columns(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "step_timings.csv")
+            for name in ("snapshot_0001_raw", "snapshot_0002_raw"):
+                timing = xeno_timing.StepTiming(name)
+                timing.add("load", 0.002)
+                timing.add("unlisted", 0.001)
+                timing.end()
+                xeno_timing.append_csv(path, timing, ["total", "load", "postprocess"])
+            with open(path, newline="") as f:
+                rows = list(csv.DictReader(f))
+        self.assertEqual([row["step"] for row in rows], ["snapshot_0001_raw", "snapshot_0002_raw"])
+        self.assertEqual(list(rows[0].keys()), ["step", "time", "n_iterations", "total", "load", "postprocess"])
+        self.assertEqual(rows[0]["load"], "2.0")
+        self.assertEqual(rows[0]["postprocess"], "")
@@ -0,0 +1,99 @@
+# tests/test_xeno_transfer.py
+import os
+import subprocess
+import tempfile
+import time
+import unittest
+
+import xeno_transfer
+
+
+class TestLocalSync(unittest.TestCase):
+    """A local directory stands in for the XenoPi snapshots directory."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.remote = os.path.join(self.tmp.name, "remote", "2024-06-01_12-00-00_abcd")
+        self.local = os.path.join(self.tmp.name, "local", "2024-06-01_12-00-00_abcd")
+        os.makedirs(self.remote)
+        self.source = xeno_transfer.LocalSource()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _write(self, name, data, mtime=None):
+        path = os.path.join(self.remote, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+
+    def test_only_new_and_changed_files_are_copied(self):
+        self._write("snapshot_0001_raw.png", b"a" * 100)
+        self._write("snapshot_0001_raw_4prj.png", b"b" * 50)
+        result = self.source.sync(self.remote, self.local)
+        self.assertEqual((result.n_files, result.n_bytes, result.ok), (2, 150, True))
+        self.assertGreaterEqual(result.seconds, 0)
+
+        # Nothing changed: nothing copied.
+        self.assertEqual(self.source.sync(self.remote, self.local).n_files, 0)
+
+        # A new step and a rewritten file.
+        self._write("snapshot_0002_raw.png", b"c" * 30)
+        self._write("snapshot_0001_raw_4prj.png", b"d" * 60, mtime=time.time() + 5)
+        result = self.source.sync(self.remote, self.local)
+        self.assertEqual((result.n_files, result.n_bytes), (2, 90))
+        with open(os.path.join(self.local, "snapshot_0001_raw_4prj.png"), "rb") as f:
+            self.assertEqual(f.read(), b"d" * 60)
+
+    def test_subdirectories_and_missing_source(self):
+        self._write(os.path.join("sub", "step_timings.csv"), b"x")
+        result = self.source.sync(self.remote, self.local)
+        self.assertEqual(result.n_files, 1)
+        self.assertTrue(os.path.exists(os.path.join(self.local, "sub", "step_timings.csv")))
+        result = self.source.sync(os.path.join(self.tmp.name, "missing"), self.local)
+        self.assertEqual((result.n_files, result.ok), (0, True))
+
+    def test_changed_files_compares_size_and_mtime(self):
+        os.makedirs(self.local)
+        path = os.path.join(self.local, "a.png")
+        with open(path, "wb") as f:
+            f.write(b"12345")
+        os.utime(path, (1000.25, 1000.25))
+        listing = {"a.png": (1000.75, 5), "b.png": (1000.0, 1)}
+        self.assertEqual(xeno_transfer.changed_files(listing, self.local), ["b.png"])
+        listing["a.png"] = (1000.0, 6)
+        self.assertEqual(xeno_transfer.changed_files(listing, self.local), ["a.png", "b.png"])
+
+
+class TestSshSource(unittest.TestCase):
+
+    def test_listing_command_runs_in_a_posix_shell(self):
+        """The remote listing command, run locally, gives the same listing as LocalSource."""
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = os.path.join(tmp, "it's a dir")
+            os.makedirs(os.path.join(directory, "sub"))
+            for name in ("snapshot 0001.png", os.path.join("sub", "b.json")):
+                with open(os.path.join(directory, name), "wb") as f:
+                    f.write(b"xyz")
+            output = subprocess.run(["sh", "-c", xeno_transfer.SshSource.listing_command(directory)],
+                                    stdout=subprocess.PIPE, universal_newlines=True, check=True).stdout
+            listing = xeno_transfer.SshSource.parse_listing(output)
+            expected = xeno_transfer.LocalSource().list_files(directory)
+            self.assertEqual(set(listing), set(expected))
+            for path, (mtime, size) in listing.items():
+                self.assertEqual(size, expected[path][1])
+                self.assertAlmostEqual(mtime, expected[path][0], places=3)
+            output = subprocess.run(["sh", "-c", xeno_transfer.SshSource.listing_command(os.path.join(tmp, "missing"))],
+                                    stdout=subprocess.PIPE, universal_newlines=True, check=True).stdout
+            self.assertEqual(xeno_transfer.SshSource.parse_listing(output), {})
+
+    def test_ssh_command_uses_control_master_and_hides_password(self):
+        source = xeno_transfer.SshSource("192.168.0.101", "pi", password="xenolalia")
+        command = source.ssh_command()
+        self.assertEqual(command[:2], ["sshpass", "-e"])
+        self.assertIn("ControlMaster=auto", command)
+        self.assertNotIn("xenolalia", " ".join(command))
+        self.assertEqual(source._env()["SSHPASS"], "xenolalia")
+        self.assertEqual(xeno_transfer.SshSource("host", "pi").ssh_command()[0], "ssh")
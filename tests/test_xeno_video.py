@@ -0,0 +1,260 @@
+# tests/test_xeno_video.py
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from PIL import Image, ImageSequence
+
+import xeno_image
+import xeno_video
+
+INPUT_QUAD = [0.1, 0.1, 0.9, 0.12, 0.88, 0.9, 0.12, 0.86]
+
+
+class TestRenderDisplayImages(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.folder = self.tmp.name
+        self.rng = np.random.RandomState(0)
+        self.n_snapshots = 0
+        with open(os.path.join(self.folder, "settings.json"), "w") as f:
+            json.dump({"camera_quad": INPUT_QUAD}, f)
+        Image.fromarray((self.rng.rand(48, 64, 3) * 255).astype(np.uint8)).save(os.path.join(self.folder, "base_image.png"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _add_snapshots(self, n, raw=True):
+        for _ in range(n):
+            i = self.n_snapshots
+            prefix = os.path.join(self.folder, "2024-06-01_12:00:{:02d}_{:06d}".format(i, 100000 + i))
+            Image.fromarray((self.rng.rand(28, 28) * 255).astype(np.uint8)).save(prefix + "_4prj.png")
+            if raw:
+                Image.fromarray((self.rng.rand(48, 64, 3) * 255).astype(np.uint8)).save(prefix + "_raw.png")
+            self.n_snapshots += 1
+
+    def _render(self, mode):
+        pattern = os.path.join(self.folder, "u_{}_%d.png".format(mode[:3]))
+        return xeno_video.render_display_images(self.folder, pattern, mode, gif_file_side=32, fit_in_circle=True)
+
+    def _image(self, name):
+        return np.asarray(Image.open(os.path.join(self.folder, name)))
+
+    def test_images_match_full_render(self):
+        self._add_snapshots(3)
+        self._render("ann_all")
+        self._render("bio_all")
+        ann_frames = xeno_video.get_ann_images(self.folder, 32, fit_in_circle=True)
+        _, bio_frames = xeno_video.get_raw_images(self.folder, 32, INPUT_QUAD, fit_in_circle=True)
+        for i in range(3):
+            np.testing.assert_array_equal(self._image("u_ann_{:02d}.png".format(i)), np.asarray(ann_frames[i]))
+            np.testing.assert_array_equal(self._image("u_bio_{:02d}.png".format(i)), np.asarray(bio_frames[i]))
+
+    def test_only_new_snapshots_are_rendered(self):
+        self._add_snapshots(2)
+        self.assertEqual(len(self._render("bio_all")), 2)
+        self.assertEqual(self._render("bio_all"), [])
+        self._add_snapshots(1)
+        written = self._render("bio_all")
+        self.assertEqual([os.path.basename(f) for f in written], ["u_bio_02.png"])
+        manifest = xeno_video.load_display_manifest(self.folder)
+        self.assertEqual(manifest["u_bio_02.png"], "2024-06-01_12:00:02_100002_raw.png")
+
+    def test_bio_images_follow_first_ann_image(self):
+        # The experiment starts with an ann image: bio images are numbered from 1.
+        self._add_snapshots(1)
+        self._add_snapshots(1, raw=False)
+        self._render("ann_all")
+        self._render("bio_all")
+        self.assertTrue(os.path.exists(os.path.join(self.folder, "u_ann_01.png")))
+        self.assertTrue(os.path.exists(os.path.join(self.folder, "u_bio_01.png")))
+        self.assertFalse(os.path.exists(os.path.join(self.folder, "u_bio_00.png")))
+
+    def test_existing_images_are_kept_unless_overwriting(self):
+        self._add_snapshots(1)
+        Image.new("RGB", (32, 32)).save(os.path.join(self.folder, "u_ann_00.png"))
+        self.assertEqual(self._render("ann_all"), [])
+        self.assertEqual(self._image("u_ann_00.png").max(), 0)
+        # Rendered before the manifest: recorded with the snapshot it is numbered after.
+        self.assertEqual(xeno_video.load_display_manifest(self.folder),
+                         {"u_ann_00.png": "2024-06-01_12:00:00_100000_4prj.png"})
+        pattern = os.path.join(self.folder, "u_ann_%d.png")
+        xeno_video.render_display_images(self.folder, pattern, "ann_all", gif_file_side=32, overwrite=True)
+        self.assertGreater(self._image("u_ann_00.png").max(), 0)
+
+    def test_images_from_another_snapshot_are_rerendered(self):
+        self._add_snapshots(2)
+        self._render("bio_all")
+        manifest = xeno_video.load_display_manifest(self.folder)
+        manifest["u_bio_01.png"] = "2024-06-01_11:00:00_000000_raw.png"
+        xeno_video.save_display_manifest(self.folder, manifest)
+        Image.new("RGB", (32, 32)).save(os.path.join(self.folder, "u_bio_01.png"))
+        written = self._render("bio_all")
+        self.assertEqual([os.path.basename(f) for f in written], ["u_bio_01.png"])
+        self.assertGreater(self._image("u_bio_01.png").max(), 0)
+        self.assertEqual(xeno_video.load_display_manifest(self.folder)["u_bio_01.png"],
+                         "2024-06-01_12:00:01_100001_raw.png")
+
+    def test_renumbered_images_are_rerendered(self):
+        # Bio images are renumbered from 1 once the experiment has an extra ann image:
+        # u_bio_00.png is then no longer current and u_bio_01.png comes from the first snapshot.
+        self._add_snapshots(2)
+        self._render("bio_all")
+        self._add_snapshots(1, raw=False)
+        written = self._render("bio_all")
+        self.assertEqual([os.path.basename(f) for f in written], ["u_bio_01.png", "u_bio_02.png"])
+        manifest = xeno_video.load_display_manifest(self.folder)
+        self.assertEqual(manifest["u_bio_01.png"], "2024-06-01_12:00:00_100000_raw.png")
+        self.assertEqual(manifest["u_bio_02.png"], "2024-06-01_12:00:01_100001_raw.png")
+
+
+class TestBioFrames(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        rng = np.random.RandomState(1)
+        for i in range(5):
+            path = os.path.join(self.tmp.name, "2024-06-01_12:00:{:02d}_{:06d}_raw.png".format(i, 100000 + i))
+            Image.fromarray((rng.rand(48, 64, 3) * 255).astype(np.uint8)).save(path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_bio_frame_is_pipeline_raw_transformed(self):
+        img = Image.open(xeno_video.get_ordered_snapshot_files(self.tmp.name, "*_raw.png")[0])
+        quad = xeno_video.input_quad_fit_in_circle(INPUT_QUAD)
+        expected = xeno_image.ImagePipeline(img, False, input_quad=quad).raw_transformed.resize((32, 32), Image.LANCZOS)
+        np.testing.assert_array_equal(np.asarray(xeno_video.bio_frame(img, 32, quad)), np.asarray(expected))
+
+    def test_workers_keep_order_and_output(self):
+        serial = xeno_video.get_raw_images(self.tmp.name, 32, INPUT_QUAD, fit_in_circle=True, workers=1)
+        pooled = xeno_video.get_raw_images(self.tmp.name, 32, INPUT_QUAD, fit_in_circle=True, workers=3)
+        for frames, pooled_frames in zip(serial, pooled):
+            self.assertEqual(len(frames), 5)
+            for frame, pooled_frame in zip(frames, pooled_frames):
+                np.testing.assert_array_equal(np.asarray(frame), np.asarray(pooled_frame))
+
+    def test_bio_animation(self):
+        path = os.path.join(self.tmp.name, "bio.gif")
+        xeno_video.experiment_to_gif(self.tmp.name, path, "bio", gif_file_side=32, input_quad=INPUT_QUAD,
+                                     fit_in_circle=True, workers=2)
+        with Image.open(path) as im:
+            self.assertEqual(im.n_frames, 5)
+            self.assertEqual(im.size, (32, 32))
+
+
+class TestStreamingAnimation(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.rng = np.random.RandomState(2)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _read_gif(self, path):
+        with Image.open(path) as im:
+            return [(np.asarray(frame.convert("RGB")).copy(), frame.info.get("duration")) for frame in ImageSequence.Iterator(im)]
+
+    def test_gif_writer_matches_pil(self):
+        images = [Image.fromarray((self.rng.rand(24, 24, 3) * 255).astype(np.uint8)) for _ in range(3)]
+        images.insert(2, images[1].copy())  # identical frames are merged
+        images.append(Image.new("L", (24, 24), 128))
+        expected = os.path.join(self.tmp.name, "pil.gif")
+        images[0].save(expected, format="GIF", append_images=images[1:], save_all=True, duration=100, loop=0)
+        path = os.path.join(self.tmp.name, "stream.gif")
+        xeno_video.save_images_as_animation(iter(images), path, fps=10)
+        frames, expected_frames = self._read_gif(path), self._read_gif(expected)
+        self.assertEqual(len(frames), 4)
+        self.assertEqual(frames[1][1], 200)
+        for (frame, duration), (expected_frame, expected_duration) in zip(frames, expected_frames):
+            np.testing.assert_array_equal(frame, expected_frame)
+            self.assertEqual(duration, expected_duration)
+        with Image.open(path) as im:
+            self.assertEqual(im.info.get("loop"), 0)
+
+    def _read_apng(self, path):
+        with Image.open(path) as im:
+            return [(np.asarray(frame.convert("RGBA")).copy(), frame.info.get("duration")) for frame in ImageSequence.Iterator(im)]
+
+    def test_apng_writer_round_trip(self):
+        images = [Image.fromarray((self.rng.rand(16, 16, 4) * 255).astype(np.uint8)) for _ in range(3)]
+        images.insert(1, images[0].copy())  # identical frames are merged
+        path = os.path.join(self.tmp.name, "anim.png")
+        xeno_video.save_images_as_animation(iter(images), path, fps=5)
+        frames = self._read_apng(path)
+        self.assertEqual([duration for _, duration in frames], [400, 200, 200])
+        for (frame, _), img in zip(frames, [images[0], images[2], images[3]]):
+            np.testing.assert_array_equal(frame, np.asarray(img))
+        path = os.path.join(self.tmp.name, "all_frames.png")
+        xeno_video.save_images_as_animation(images, path, fps=5, deduplicate=False)
+        self.assertEqual(len(self._read_apng(path)), 4)
+
+    def test_apng_writer_shared_palette(self):
+        # Frames with the same few colors are reproduced exactly by the first frame's palette.
+        colors = np.array([[0, 0, 0], [255, 0, 255], [255, 255, 255]], dtype=np.uint8)
+        images = [Image.fromarray(colors[self.rng.randint(0, 3, (16, 16))]) for _ in range(3)]
+        path = os.path.join(self.tmp.name, "palette.png")
+        xeno_video.save_images_as_animation(images, path, fps=5, palette=True)
+        with Image.open(path) as im:
+            self.assertEqual(im.mode, "P")
+        for (frame, _), img in zip(self._read_apng(path), images):
+            np.testing.assert_array_equal(frame[:, :, :3], np.asarray(img))
+
+    def test_apng_writer_rejects_size_change(self):
+        writer = xeno_video.ApngWriter(os.path.join(self.tmp.name, "sizes.png"), 100)
+        writer.append(Image.new("RGB", (8, 8)))
+        with self.assertRaises(ValueError):
+            writer.append(Image.new("RGB", (9, 8)))
+        writer.close()
+
+    def test_gif_writer_requires_frames(self):
+        with self.assertRaises(ValueError):
+            xeno_video.save_images_as_animation([], os.path.join(self.tmp.name, "empty.gif"))
+
+    def test_iter_frames_is_lazy_and_ordered(self):
+        consumed = []
+
+        def items():
+            for i in range(100):
+                consumed.append(i)
+                yield i
+
+        frames = xeno_video.iter_frames(lambda i: i * 2, items(), workers=2)
+        self.assertEqual([next(frames) for _ in range(3)], [0, 2, 4])
+        # At most two items per worker are read ahead.
+        self.assertLessEqual(len(consumed), 8)
+        self.assertEqual(list(frames), [i * 2 for i in range(3, 100)])
+
+    def test_iter_crossfade(self):
+        images = [Image.new("RGB", (4, 4), (v, v, v)) for v in (0, 100, 200)]
+        frames = list(xeno_video.iter_crossfade(iter(images), 4))
+        self.assertEqual(len(frames), 8)
+        self.assertEqual(frames[2].getpixel((0, 0)), (50, 50, 50, 255))
+        self.assertEqual(len(xeno_video.crossfade(images, 4)), 8)
+
+    def test_linear_crossfade_matches_blend(self):
+        rng = np.random.RandomState(0)
+        img_from, img_to = (Image.fromarray(rng.randint(0, 256, (8, 8, 3), dtype=np.uint8)) for _ in range(2))
+        frames = xeno_video.crossfade([img_from, img_to], 20)
+        for j, frame in enumerate(frames):
+            expected = Image.blend(img_from.convert("RGBA"), img_to.convert("RGBA"), float(j) / 20)
+            self.assertEqual(frame.tobytes(), expected.tobytes())
+
+    def test_crossfade_easings(self):
+        for easing in xeno_video.EASINGS:
+            factors = xeno_video.crossfade_factors(10, easing)
+            self.assertEqual(len(factors), 10)
+            self.assertEqual(factors[0], 0)
+            self.assertEqual(factors, sorted(factors))
+            self.assertTrue(all(0 <= factor < 1 for factor in factors))
+        self.assertAlmostEqual(xeno_video.crossfade_factors(2, "smoothstep")[1], 0.5)
+        self.assertEqual(xeno_video.crossfade_factors(4, lambda t: t / 2), [0, 0.125, 0.25, 0.375])
+        with self.assertRaises(ValueError):
+            xeno_video.crossfade_factors(10, "bounce")
+        images = [Image.new("RGB", (4, 4), (v, v, v)) for v in (0, 200)]
+        frames = xeno_video.crossfade(images, 4, "ease_in")
+        self.assertEqual(frames[2].getpixel((0, 0)), (50, 50, 50, 255))
@@ -0,0 +1,73 @@
+# tests/test_xeno_writer.py
+import os
+import tempfile
+import threading
+import unittest
+
+import numpy as np
+from PIL import Image
+
+import xeno_writer
+
+
+class TestArtifactWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_close_writes_pending_images(self):
+        writer = xeno_writer.ArtifactWriter()
+        image = Image.fromarray(np.arange(28 * 28, dtype=np.uint8).reshape(28, 28), mode='L')
+        paths = [os.path.join(self.tmp.name, "snapshot_{}_3ann.png".format(i)) for i in range(5)]
+        for path in paths:
+            writer.save_image(image, path)
+        writer.close()
+        for path in paths:
+            np.testing.assert_array_equal(np.asarray(Image.open(path)), np.asarray(image))
+
+    def test_jobs_run_in_order_and_flush_waits(self):
+        writer = xeno_writer.ArtifactWriter()
+        order = []
+        for i in range(10):
+            writer.submit(order.append, i)
+        writer.flush()
+        self.assertEqual(order, list(range(10)))
+        self.assertEqual(writer.pending(), 0)
+        writer.close()
+
+    def test_failing_job_does_not_stop_writer(self):
+        writer = xeno_writer.ArtifactWriter()
+        done = []
+        with self.assertLogs("xeno_writer", level="ERROR"):
+            writer.submit(lambda: 1 / 0)
+            writer.submit(done.append, True)
+            writer.flush()
+        self.assertEqual(done, [True])
+        writer.close()
+
+    def test_queue_is_bounded(self):
+        """submit() blocks once max_pending jobs are waiting."""
+        writer = xeno_writer.ArtifactWriter(max_pending=2)
+        started, release = threading.Event(), threading.Event()
+        writer.submit(lambda: (started.set(), release.wait()))  # occupies the thread
+        started.wait(5)
+        writer.submit(lambda: None)
+        writer.submit(lambda: None)           # queue now full
+        blocked = threading.Thread(target=writer.submit, args=(lambda: None,))
+        with self.assertLogs("xeno_writer", level="WARNING"):
+            blocked.start()
+            blocked.join(0.2)
+        self.assertTrue(blocked.is_alive())
+        release.set()
+        blocked.join(5)
+        self.assertFalse(blocked.is_alive())
+        writer.close()
+
+    def test_submit_after_close_raises(self):
+        writer = xeno_writer.ArtifactWriter()
+        writer.close()
+        with self.assertRaises(RuntimeError):
+            writer.submit(lambda: None)
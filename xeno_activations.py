@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+xeno_activations.py — Compact binary storage of encoder activations.
+
+Each step, xeno_osc saves the encoder activations next to the snapshot. The
+historical format (_code.json) is indented JSON with 6-digit rounding, which
+is slow to write and to reload and large on the SD card. The binary format
+(_code.npy) is a standard NumPy .npy file: a small header with dtype and shape
+followed by the raw float16 buffer, in the same channel-major layout as the
+JSON ((C, H, W) for convolutional encoders, flat for dense ones). It can be
+memory-mapped, so reading one channel does not load the whole file.
+
+Usage:
+    import xeno_activations
+    xeno_activations.save_activations(encoded, "snapshot_0001_raw_code.npy")
+    codes = xeno_activations.load_activations("snapshot_0001_raw_code.npy")   # memory-mapped
+    codes = xeno_activations.load_activations("snapshot_0001_raw_code.json")  # JSON also accepted
+
+Converting existing experiments (_code.json -> _code.npy):
+    python xeno_activations.py contents/experiments
+    python xeno_activations.py contents/experiments/2024-06-01_12-00-00_abcd --remove-json
+"""
+
+import argparse
+import glob
+import json
+import os
+
+import numpy as np
+
+# File name suffixes of the binary and JSON formats.
+NPY_SUFFIX = "_code.npy"
+JSON_SUFFIX = "_code.json"
+
+# Storage type of the binary format.
+DTYPE = np.float16
+
+
+def channel_major(activations):
+    """Return activations without batch dimension, channels first ((C, H, W); dense: flat)."""
+    activations = np.asarray(activations)
+    if activations.ndim == 4:
+        activations = activations[0]
+    if activations.ndim == 3:
+        return np.transpose(activations, (2, 0, 1))
+    return activations.reshape(-1)
+
+
+def save_activations(activations, filepath):
+    """Save encoder activations (as output by the model) to a float16 .npy file."""
+    np.save(filepath, np.ascontiguousarray(channel_major(activations), dtype=DTYPE))
+
+
+def load_activations(filepath, mmap=True):
+    """Load activations saved by save_activations() (memory-mapped by default) or a _code.json file.
+
+    Returns a channel-major array ((C, H, W); dense: flat). JSON files are
+    read into memory as float32.
+    """
+    if filepath.endswith(".json"):
+        with open(filepath) as f:
+            return np.array(json.load(f), dtype=np.float32)
+    return np.load(filepath, mmap_mode="r" if mmap else None)
+
+
+def find_json_files(path):
+    """Return the sorted _code.json files at path (a file, or a directory scanned recursively)."""
+    if os.path.isfile(path):
+        return [path]
+    return sorted(glob.glob(os.path.join(path, "**", "*" + JSON_SUFFIX), recursive=True))
+
+
+def convert(json_file, remove_json=False, overwrite=False):
+    """Convert a _code.json file to _code.npy; returns (npy file, bytes before, bytes after) or None if skipped."""
+    npy_file = json_file[:-len(JSON_SUFFIX)] + NPY_SUFFIX
+    if os.path.exists(npy_file) and not overwrite:
+        return None
+    json_size = os.path.getsize(json_file)
+    np.save(npy_file, load_activations(json_file).astype(DTYPE))
+    if remove_json:
+        os.remove(json_file)
+    return npy_file, json_size, os.path.getsize(npy_file)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+                                     description="Convert encoder activations from _code.json to _code.npy.")
+    parser.add_argument("paths", type=str, nargs="+", help="_code.json files or directories (scanned recursively)")
+    parser.add_argument("--remove-json", default=False, action='store_true', help="Delete each JSON file once converted")
+    parser.add_argument("-f", "--overwrite", default=False, action='store_true', help="Overwrite existing .npy files")
+    args = parser.parse_args()
+
+    n_converted, n_skipped, bytes_before, bytes_after = 0, 0, 0, 0
+    for path in args.paths:
+        for json_file in find_json_files(path):
+            result = convert(json_file, args.remove_json, args.overwrite)
+            if result is None:
+                n_skipped += 1
+                continue
+            n_converted += 1
+            bytes_before += result[1]
+            bytes_after += result[2]
+    print("Converted {} files ({} skipped, .npy already present): {:.1f} MB -> {:.1f} MB".format(
+        n_converted, n_skipped, bytes_before / 1e6, bytes_after / 1e6))
@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+"""Micro-benchmarks for the Xenolalia hot paths.
+
+Each sub-command times one part of the pipeline and prints the per-call cost
+(mean / median / min in milliseconds), so changes can be compared on the Pi.
+
+Usage:
+    python xeno_benchmark.py squircle
+    python xeno_benchmark.py squircle --sizes 224,480 -n 200
+    python xeno_benchmark.py mask
+    python xeno_benchmark.py transform -C XenoPi/settings.json
+    python xeno_benchmark.py postprocess --output-size 448
+    python xeno_benchmark.py inference -C XenoPi/settings.json
+    python xeno_benchmark.py numpy-model -C XenoPi/settings.json
+    python xeno_benchmark.py pipeline -i snapshot_raw.png -b base_image.png -C XenoPi/settings.json
+    python xeno_benchmark.py apng --frames 100
+    python xeno_benchmark.py crossfade --steps 20
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+import xeno_image
+import xeno_video
+
+
+def time_calls(fn, n_repeat=100, n_warmup=3):
+    """Call fn() n_repeat times and return per-call durations in milliseconds."""
+    for _ in range(n_warmup):
+        fn()
+    durations = np.empty(n_repeat, dtype=np.float64)
+    for i in range(n_repeat):
+        t0 = time.perf_counter()
+        fn()
+        durations[i] = (time.perf_counter() - t0) * 1000.0
+    return durations
+
+
+def report(label, durations, reference=None):
+    """Print one result line; reference is the baseline durations for speedup."""
+    line = "{:<40} mean={:8.3f} ms  median={:8.3f} ms  min={:8.3f} ms".format(
+        label, durations.mean(), np.median(durations), durations.min())
+    if reference is not None:
+        line += "  speedup={:5.1f}x".format(np.median(reference) / np.median(durations))
+    print(line)
+
+
+# ---------------------------------------------------------------------------
+# Squircle remap grids
+# ---------------------------------------------------------------------------
+
+def bench_squircle(args):
+    functions = [
+        ("to_circle_inside",  xeno_image.to_circle_inside),
+        ("to_circle_outside", xeno_image.to_circle_outside),
+        ("to_square_inside",  xeno_image.to_square_inside),
+        ("to_square_outside", xeno_image.to_square_outside),
+    ]
+    for n in args.sizes:
+        img = Image.fromarray(np.random.randint(0, 256, (n, n), dtype=np.uint8), mode='L')
+        print("n={}".format(n))
+        for name, fn in functions:
+            def uncached():
+                xeno_image.clear_squircle_cache()
+                fn(img)
+            before = time_calls(uncached, args.n_repeat)
+            report("  {} (recompute grid)".format(name), before)
+
+            xeno_image.use_fixed_point_maps = False
+            after = time_calls(lambda: fn(img), args.n_repeat)
+            report("  {} (cached grid)".format(name), after, before)
+
+            xeno_image.use_fixed_point_maps = True
+            fixed = time_calls(lambda: fn(img), args.n_repeat)
+            report("  {} (cached fixed-point)".format(name), fixed, before)
+            xeno_image.use_fixed_point_maps = False
+
+
+# ---------------------------------------------------------------------------
+# Mask cache
+# ---------------------------------------------------------------------------
+
+def bench_mask(args):
+    for n in args.sizes:
+        img = Image.fromarray(np.random.randint(0, 256, (n, n), dtype=np.uint8), mode='L')
+        print("n={}".format(n))
+        for invert in (False, True):
+            def uncached():
+                xeno_image._load_mask_file.cache_clear()
+                xeno_image.mask_variants.cache_clear()
+                xeno_image.add_mask(img, invert)
+            before = time_calls(uncached, args.n_repeat)
+            report("  add_mask(invert={}) (reload mask)".format(invert), before)
+            after = time_calls(lambda: xeno_image.add_mask(img, invert), args.n_repeat)
+            report("  add_mask(invert={}) (cached mask)".format(invert), after, before)
+
+
+# ---------------------------------------------------------------------------
+# Perspective transform
+# ---------------------------------------------------------------------------
+
+def bench_transform(args):
+    input_quad = [0.1, 0.05, 0.12, 0.95, 0.9, 0.93, 0.88, 0.07]
+    if args.configuration_file:
+        with open(args.configuration_file) as f:
+            input_quad = json.load(f)['camera_quad']
+    raw, base = synthetic_capture(args.width, args.height)
+    w, h = raw.size
+    quad_abs = tuple(v * (w if i % 2 == 0 else h) for i, v in enumerate(input_quad))
+    side = max(w, h)
+    base = base.convert('L')
+    print("capture {}x{}".format(w, h))
+    for label, img in (("RGB", raw), ("L", base)):
+        before = time_calls(lambda: img.transform((side, side), Image.QUAD, quad_abs), args.n_repeat)
+        report("  {} Image.QUAD".format(label), before)
+        def uncached():
+            xeno_image.clear_transformer_cache()
+            xeno_image.transform(img, input_quad)
+        report("  {} transform (rebuild table)".format(label), time_calls(uncached, args.n_repeat), before)
+        after = time_calls(lambda: xeno_image.transform(img, input_quad), args.n_repeat)
+        report("  {} transform (cached table)".format(label), after, before)
+
+
+# ---------------------------------------------------------------------------
+# Autoencoder output post-processing
+# ---------------------------------------------------------------------------
+
+def bench_postprocess(args):
+    rng = np.random.RandomState(0)
+    # Uniform noise: the higher the threshold, the more (small) components.
+    img = Image.fromarray((rng.rand(28, 28) * 255).astype(np.uint8), mode='L')
+    print("output_size={}".format(args.output_size))
+    for threshold in args.thresholds:
+        def run(vectorized):
+            return xeno_image.postprocess_output(img, output_size=args.output_size, threshold=threshold,
+                                                 stroke_width=args.stroke_width, boundary_px=args.boundary_px,
+                                                 vectorized=vectorized)
+        before = time_calls(lambda: run(False), args.n_repeat)
+        report("  threshold={} (component loop)".format(threshold), before)
+        after = time_calls(lambda: run(True), args.n_repeat)
+        report("  threshold={} (vectorized)".format(threshold), after, before)
+
+
+# ---------------------------------------------------------------------------
+# Autoencoder inference
+# ---------------------------------------------------------------------------
+
+def model_settings(args):
+    """Return (model_name, encoder_layer, input_shape) from the arguments or settings.json."""
+    model_name, encoder_layer, use_convolutional = args.model_name, args.encoder_layer, True
+    if args.configuration_file:
+        with open(args.configuration_file) as f:
+            data = json.load(f)
+        model_name = data['model_name']
+        encoder_layer = data['encoder_layer']
+        use_convolutional = data['use_convolutional']
+    input_shape = (1, 28, 28, 1) if use_convolutional else (1, 28 * 28)
+    return model_name, encoder_layer, input_shape
+
+
+def bench_inference(args):
+    import xeno_inference
+    model_name, encoder_layer, input_shape = model_settings(args)
+    model = xeno_inference.load_feedback_model("{}/{}.hdf5".format(args.model_directory, model_name), encoder_layer)
+    inference = xeno_inference.InferenceFunction(model, input_shape)
+    print("model={} backend={} warm-up={:.3f} s".format(model_name, inference.backend, inference.warmup()))
+
+    frame = np.random.random(input_shape).astype(np.float32)
+    before = time_calls(lambda: model.predict(frame, verbose=0), args.n_repeat)
+    report("  model.predict (per iteration)", before)
+    after = time_calls(lambda: inference(frame), args.n_repeat)
+    report("  InferenceFunction (per iteration)", after, before)
+    diff = max(np.abs(a - b).max() for a, b in zip(model.predict(frame, verbose=0), inference(frame)))
+    print("max abs difference: {}".format(diff))
+
+
+def run_engine(args):
+    """Measure one engine in this (fresh) process; prints a JSON result line."""
+    import resource
+    model_name, encoder_layer, input_shape = model_settings(args)
+    t0 = time.perf_counter()
+    import xeno_inference
+    if args.engine == "numpy":
+        inference = xeno_inference.NumpyModel("{}/{}.npz".format(args.model_directory, model_name), encoder_layer, input_shape)
+    else:
+        import keras
+        model = xeno_inference.load_feedback_model("{}/{}.hdf5".format(args.model_directory, model_name), encoder_layer)
+        inference = xeno_inference.InferenceFunction(model, input_shape)
+    inference.warmup(n_calls=1)
+    startup = time.perf_counter() - t0
+    frame = np.random.RandomState(0).random_sample(input_shape).astype(np.float32)
+    durations = time_calls(lambda: inference(frame), args.n_repeat)
+    np.savez(args.outputs_file, *inference(frame))
+    # ru_maxrss is in kilobytes on Linux.
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    print(json.dumps({"startup": startup, "durations": durations.tolist(), "peak_rss": peak_rss}))
+
+
+def bench_numpy_model(args):
+    """Keras vs NumPy runtime, each measured in its own process (imports and memory do not mix)."""
+    import os
+    import subprocess
+    import sys
+    import tempfile
+    if args.engine:
+        return run_engine(args)
+    model_name, encoder_layer, input_shape = model_settings(args)
+    print("model={} encoder_layer={}".format(model_name, encoder_layer))
+    results, outputs = {}, {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for engine in ("keras", "numpy"):
+            outputs_file = os.path.join(tmp, engine + ".npz")
+            command = [sys.executable, os.path.abspath(__file__), "-n", str(args.n_repeat), "numpy-model",
+                       "--engine", engine, "--outputs-file", outputs_file,
+                       "-M", args.model_directory, "-m", model_name, "-l", str(encoder_layer)]
+            if args.configuration_file:
+                command += ["-C", args.configuration_file]
+            output = subprocess.run(command, check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+            results[engine] = json.loads(output.strip().splitlines()[-1])
+            with np.load(outputs_file) as data:
+                outputs[engine] = [data[key] for key in sorted(data.files)]
+    for engine in ("keras", "numpy"):
+        print("  {}: startup (import + load + warm-up) {:.3f} s, peak RSS {:.1f} MB".format(
+            engine, results[engine]["startup"], results[engine]["peak_rss"]))
+    keras_durations = np.array(results["keras"]["durations"])
+    report("  keras InferenceFunction (per iteration)", keras_durations)
+    report("  NumpyModel (per iteration)", np.array(results["numpy"]["durations"]), keras_durations)
+    diff = max(np.abs(a - b).max() for a, b in zip(outputs["keras"], outputs["numpy"]))
+    print("max abs difference: {}".format(diff))
+
+
+# ---------------------------------------------------------------------------
+# Capture -> 28x28 image pipeline engines
+# ---------------------------------------------------------------------------
+
+def synthetic_capture(width=640, height=480, seed=0):
+    """Return (raw, base) RGB PIL images resembling a petri dish capture."""
+    rng = np.random.RandomState(seed)
+    base = (rng.rand(height, width, 3) * 60 + 150).astype(np.uint8)
+    raw = base.astype(np.int32)
+    y, x = np.mgrid[:height, :width]
+    for _ in range(12):
+        cx, cy, r = rng.randint(0, width), rng.randint(0, height), rng.randint(5, 50)
+        raw[(x - cx) ** 2 + (y - cy) ** 2 < r * r] -= rng.randint(20, 80)
+    raw = np.clip(raw + rng.randint(-10, 10, raw.shape), 0, 255).astype(np.uint8)
+    return Image.fromarray(raw), Image.fromarray(base)
+
+def bench_pipeline(args):
+    if args.image:
+        raw = Image.open(args.image)
+        raw.load()
+        base = Image.open(args.base_image) if args.base_image else False
+    else:
+        raw, base = synthetic_capture()
+        if args.no_base_image:
+            base = False
+    input_quad = [0, 0, 0, 1, 1, 1, 1, 0]
+    squircle_mode = args.squircle_mode
+    if args.configuration_file:
+        with open(args.configuration_file) as f:
+            data = json.load(f)
+        input_quad = data['camera_quad']
+        squircle_mode = data.get('squircle_mode', squircle_mode)
+
+    # Stages in computation order; each is timed with its dependencies already computed.
+    stages = ("raw_transformed", "transformed", "masked", "enhanced", "simplified", "resized")
+    results = {}
+    for engine in xeno_image.PIPELINE_ENGINES:
+        per_stage = {stage: [] for stage in stages}
+        total = []
+        for _ in range(args.n_repeat):
+            pipeline = xeno_image.create_pipeline(raw, base, 28, input_quad, squircle_mode, engine=engine)
+            t_start = time.perf_counter()
+            for stage in stages:
+                t0 = time.perf_counter()
+                pipeline.get(stage)
+                per_stage[stage].append((time.perf_counter() - t0) * 1000.0)
+            total.append((time.perf_counter() - t_start) * 1000.0)
+        results[engine] = ({k: np.array(v) for k, v in per_stage.items()}, np.array(total))
+
+    print("capture {}x{}, squircle_mode={}, base_image={}".format(raw.width, raw.height, squircle_mode, bool(base)))
+    reference_stages, reference_total = results["pil"]
+    for engine, (per_stage, total) in results.items():
+        print("engine={}".format(engine))
+        for stage in stages:
+            report("  " + stage, per_stage[stage], reference_stages[stage] if engine != "pil" else None)
+        report("  total", total, reference_total if engine != "pil" else None)
+    diffs = xeno_image.compare_engines(raw, base, 28, input_quad, squircle_mode)
+    print("max abs difference numpy vs pil: {}".format(diffs))
+
+
+
+# ---------------------------------------------------------------------------
+# Animated PNG writer
+# ---------------------------------------------------------------------------
+
+def save_apng_legacy(frames, file_name, delay):
+    """Previous APNG path of save_images_as_animation(): apng package, each frame written to and re-read from a file."""
+    from apng import APNG
+    file = APNG()
+    tmp_file_name = file_name + ".frame.png"
+    for img in frames:
+        img.save(tmp_file_name, format="png")
+        file.append_file(tmp_file_name, delay=delay)
+    file.save(file_name)
+    os.remove(tmp_file_name)
+
+def bench_apng(args):
+    # Crossfade between synthetic captures, 20 steps per pair (as the ann_bio_seq mode).
+    keyframes = [synthetic_capture(seed=seed)[0].resize((args.side, args.side), Image.LANCZOS)
+                 for seed in range(args.frames // 20 + 1)]
+    frames = list(xeno_video.iter_crossfade(keyframes, 20))[:args.frames]
+    fps = 100
+    variants = []
+    try:
+        import apng
+        variants.append(("apng package, temporary files", lambda path: save_apng_legacy(frames, path, int(1000 / fps))))
+    except ImportError:
+        print("apng package not installed: previous path not measured")
+    variants.append(("ApngWriter", lambda path: xeno_video.save_images_as_animation(frames, path, fps)))
+    variants.append(("ApngWriter, shared palette", lambda path: xeno_video.save_images_as_animation(frames, path, fps, palette=True)))
+
+    print("{} frames {}x{}".format(len(frames), args.side, args.side))
+    reference = None
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, save in variants:
+            path = os.path.join(tmp, "animation.png")
+            durations = time_calls(lambda: save(path), args.repeat, n_warmup=0)
+            report("  {} ({:.1f} MB)".format(label, os.path.getsize(path) / 1e6), durations, reference)
+            if reference is None:
+                reference = durations
+
+
+
+# ---------------------------------------------------------------------------
+# Crossfade
+# ---------------------------------------------------------------------------
+
+def crossfade_numpy(img_from, img_to, factors):
+    """All frames of a transition in one broadcasted float32 interpolation (same values as Image.blend)."""
+    a = np.asarray(img_from.convert('RGBA'), dtype=np.float32)
+    b = np.asarray(img_to.convert('RGBA'), dtype=np.float32)
+    factors = np.asarray(factors, dtype=np.float32)[:, np.newaxis, np.newaxis, np.newaxis]
+    return [Image.fromarray(frame, 'RGBA') for frame in (a + factors * (b - a)).astype(np.uint8)]
+
+def bench_crossfade(args):
+    img_from, img_to = (synthetic_capture(seed=seed)[0].resize((args.side, args.side), Image.LANCZOS) for seed in (0, 1))
+    print("{} steps {}x{}".format(args.steps, args.side, args.side))
+    factors = xeno_video.crossfade_factors(args.steps)
+    # A first large allocation raises glibc's mmap threshold, after which every frame allocation is faster: do it
+    # before any timing so that all variants run in the same (steady) state.
+    crossfade_numpy(img_from, img_to, factors)
+    reference = time_calls(lambda: xeno_video.crossfade([img_from, img_to], args.steps), args.n_repeat)
+    report("  Image.blend per frame (linear)", reference)
+    report("  NumPy, all steps broadcast", time_calls(lambda: crossfade_numpy(img_from, img_to, factors), args.n_repeat), reference)
+    for easing in sorted(xeno_video.EASINGS):
+        if easing != "linear":
+            durations = time_calls(lambda: xeno_video.crossfade([img_from, img_to], args.steps, easing), args.n_repeat)
+            report("  Image.blend per frame ({})".format(easing), durations, reference)
+
+
+if __name__ == "__main__":
+
+    def int_list(str):
+        return [int(x) for x in str.split(",")]
+
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter, description=__doc__)
+    parser.add_argument("-n", "--n-repeat", type=int, default=100, help="Number of timed calls per measurement")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    squircle_parser = subparsers.add_parser("squircle", help="Squircle remap with and without cached grids")
+    squircle_parser.add_argument("--sizes", type=int_list, default="224,480", help="Comma-separated image sides")
+    squircle_parser.set_defaults(func=bench_squircle)
+
+    mask_parser = subparsers.add_parser("mask", help="add_mask with and without the in-memory mask cache")
+    mask_parser.add_argument("--sizes", type=int_list, default="28,480", help="Comma-separated image sides")
+    mask_parser.set_defaults(func=bench_mask)
+
+    transform_parser = subparsers.add_parser("transform", help="Perspective transform with and without the cached table")
+    transform_parser.add_argument("-C", "--configuration-file", type=str, default=None, help="settings.json with camera_quad")
+    transform_parser.add_argument("--width", type=int, default=640, help="Capture width")
+    transform_parser.add_argument("--height", type=int, default=480, help="Capture height")
+    transform_parser.set_defaults(func=bench_transform)
+
+    postprocess_parser = subparsers.add_parser("postprocess", help="postprocess_output, component loop vs vectorized")
+    postprocess_parser.add_argument("--output-size", type=int, default=224, help="Output side in pixels")
+    postprocess_parser.add_argument("--stroke-width", type=int, default=20, help="Opening radius")
+    postprocess_parser.add_argument("--boundary-px", type=int, default=22, help="Inward contour width")
+    postprocess_parser.add_argument("--thresholds", type=lambda str: [float(x) for x in str.split(",")], default="0.3,0.5,0.7",
+                                    help="Comma-separated binarisation thresholds")
+    postprocess_parser.set_defaults(func=bench_postprocess)
+
+    inference_parser = subparsers.add_parser("inference", help="Per-iteration autoencoder latency, model.predict vs compiled function")
+    inference_parser.add_argument("-C", "--configuration-file", type=str, default=None, help="settings.json with model_name, encoder_layer and use_convolutional")
+    inference_parser.add_argument("-M", "--model-directory", type=str, default="results", help="Directory where to find model files")
+    inference_parser.add_argument("-m", "--model-name", type=str, default="model", help="Model file name (without .hdf5)")
+    inference_parser.add_argument("-l", "--encoder-layer", type=int, default=5, help="Encoder layer index")
+    inference_parser.set_defaults(func=bench_inference)
+
+    numpy_model_parser = subparsers.add_parser("numpy-model", help="Startup, latency and memory of the keras vs NumPy inference runtimes")
+    numpy_model_parser.add_argument("-C", "--configuration-file", type=str, default=None, help="settings.json with model_name, encoder_layer and use_convolutional")
+    numpy_model_parser.add_argument("-M", "--model-directory", type=str, default="results", help="Directory where to find model files (.hdf5 and exported .npz)")
+    numpy_model_parser.add_argument("-m", "--model-name", type=str, default="model", help="Model file name (without extension)")
+    numpy_model_parser.add_argument("-l", "--encoder-layer", type=int, default=5, help="Encoder layer index")
+    numpy_model_parser.add_argument("--engine", type=str, default=None, choices=["keras", "numpy"], help=argparse.SUPPRESS)
+    numpy_model_parser.add_argument("--outputs-file", type=str, default=None, help=argparse.SUPPRESS)
+    numpy_model_parser.set_defaults(func=bench_numpy_model)
+
+    pipeline_parser = subparsers.add_parser("pipeline", help="Per-stage latency of the capture -> 28x28 engines")
+    pipeline_parser.add_argument("-i", "--image", type=str, default=None, help="Raw snapshot (default: synthetic capture)")
+    pipeline_parser.add_argument("-b", "--base-image", type=str, default=None, help="Base image to subtract")
+    pipeline_parser.add_argument("--no-base-image", default=False, action='store_true', help="Do not subtract the synthetic base image")
+    pipeline_parser.add_argument("-C", "--configuration-file", type=str, default=None, help="settings.json with camera_quad and squircle_mode")
+    pipeline_parser.add_argument("--squircle-mode", type=str, default="none", choices=["none", "inside", "outside"])
+    pipeline_parser.set_defaults(func=bench_pipeline)
+
+    apng_parser = subparsers.add_parser("apng", help="Animated PNG of a crossfade, apng package with temporary files vs in-memory writer")
+    apng_parser.add_argument("--frames", type=int, default=100, help="Number of crossfade frames")
+    apng_parser.add_argument("--side", type=int, default=480, help="Frame side in pixels")
+    apng_parser.add_argument("-r", "--repeat", type=int, default=3, help="Number of timed animations per writer")
+    apng_parser.set_defaults(func=bench_apng)
+
+    crossfade_parser = subparsers.add_parser("crossfade", help="Crossfade between two frames, Image.blend per frame vs NumPy broadcast, easing curves")
+    crossfade_parser.add_argument("--steps", type=int, default=20, help="Frames per transition")
+    crossfade_parser.add_argument("--side", type=int, default=480, help="Frame side in pixels")
+    crossfade_parser.set_defaults(func=bench_crossfade)
+
+    args = parser.parse_args()
+    args.func(args)
@@ -0,0 +1,139 @@
+"""
+xeno_feedback.py — Autoencoder feedback loop of xeno_osc.
+
+Each step, xeno_osc runs the autoencoder on its own output several times.
+With a convergence tolerance, the loop stops as soon as the frames stop
+changing (mean (l1) or max (linf) absolute change between two iterations at
+most the tolerance), within max_feedback_steps iterations; without one, it
+always runs n_feedback_steps iterations. A batch of frames (several
+candidates) only stops once every frame has converged.
+
+With n_candidates > 1, generate_candidates() runs a batch of candidate
+starting frames (the starting frame, its merge with the previous frame and
+jittered variants) through a single loop and keeps the best validated one.
+
+The functions take the inference function, the frame helpers of xeno_osc
+(random frame, mask, validation) and the settings as arguments, so they do
+not depend on the model or the OSC server.
+
+Usage:
+    import xeno_feedback
+    n_steps = xeno_feedback.feedback_steps(n_feedback_steps, convergence_tolerance, max_feedback_steps)
+    encoded, frame, n_iterations = xeno_feedback.feedback_loop(inference, frame, n_steps,
+                                                                tolerance=0.01, norm="linf", timing=step_timing)
+    encoded, frame = xeno_feedback.generate_candidates(inference, n_steps, starting_frame, prev_frame,
+                                                       generate_random, validate, n_candidates=4, mask=mask_frame)
+"""
+
+import contextlib
+import logging
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+# Norms of frame_change().
+NORMS = ("l1", "linf")
+
+# Candidate scores of candidate_scores().
+SCORES = ("first", "density", "novelty")
+
+
+def frame_change(frame, prev, norm="linf"):
+    """Return the change between two frames (or batches of frames, one value per frame).
+
+    Mean (l1) or max (linf) absolute difference.
+    """
+    diff = np.abs(frame - prev).reshape(len(frame), -1)
+    return diff.mean(axis=1) if norm == "l1" else diff.max(axis=1)
+
+
+def feedback_steps(n_steps, tolerance=None, max_steps=None):
+    """Return the maximum number of iterations: max_steps with early exit enabled (tolerance set), else n_steps."""
+    if tolerance is not None and max_steps is not None:
+        return max_steps
+    return n_steps
+
+
+def feedback_loop(inference, frame, n_steps, tolerance=None, norm="linf", timing=None):
+    """Run inference (frame -> (encoded, next frame)) on frame (or a batch of frames) up to n_steps times.
+
+    Stops early once the change of every frame is at most tolerance (never if
+    tolerance is None). Each iteration is recorded as the "iteration" stage
+    of timing (a xeno_timing.StepTiming) if given. Returns encoded, frame and
+    the number of iterations run.
+    """
+    encoded = None
+    for t in range(n_steps):
+        log.debug("t={t} ======".format(t=t))
+        with timing.measure("iteration") if timing is not None else contextlib.nullcontext():
+            encoded, next_frame = inference(frame)
+        converged = tolerance is not None and frame_change(next_frame, frame, norm).max() <= tolerance
+        frame = next_frame
+        if converged:
+            return encoded, frame, t + 1
+    return encoded, frame, n_steps
+
+
+def candidate_frames(n, starting_frame, prev_frame, random_frame, jitter=0.05, mask=None):
+    """Return a batch of n candidate starting frames.
+
+    The starting frame, its max-merge with the previous frame (if any) and
+    variants of the starting frame with Gaussian noise of standard deviation
+    jitter (passed through mask if given). Without a starting frame, n frames
+    returned by random_frame().
+    """
+    if starting_frame is None:
+        return np.concatenate([random_frame() for _ in range(n)])
+    candidates = [starting_frame]
+    if prev_frame is not None:
+        candidates.append(np.maximum(starting_frame, prev_frame))
+    while len(candidates) < n:
+        noise = np.random.normal(0, jitter, starting_frame.shape)
+        candidate = np.clip(starting_frame + noise, 0, 1)
+        candidates.append(mask(candidate) if mask is not None else candidate)
+    return np.concatenate(candidates[:n])
+
+
+def candidate_scores(frames, prev_frame, score="first"):
+    """Return the score of each frame in a batch (higher is better) for candidate selection.
+
+    - first   : order of the candidates (starting frame, then merge, then jittered variants)
+    - density : average closest to the middle of the validation range
+    - novelty : largest change from the previously projected frame (first without one)
+    """
+    averages = frames.reshape(len(frames), -1).mean(axis=1)
+    if score == "density":
+        return -np.abs(averages - 0.5)
+    elif score == "novelty" and prev_frame is not None:
+        return frame_change(frames, prev_frame, "l1")
+    else:
+        return -np.arange(len(frames), dtype=np.float64)
+
+
+def generate_candidates(inference, n_steps, starting_frame, prev_frame, random_frame, validate,
+                        n_candidates=1, jitter=0.05, score="first", mask=None, tolerance=None, norm="linf",
+                        timing=None):
+    """Run n_candidates candidate frames (see candidate_frames()) through one batched feedback loop.
+
+    Returns encoded and frame (each with a batch dimension of 1) of the best
+    candidate that validate() accepts, according to candidate_scores(). If
+    none validates, returns the encoding of the best candidate and prev_frame
+    (projected again), or retries with new random frames if there is no
+    starting frame.
+    """
+    while True:
+        frames = candidate_frames(n_candidates, starting_frame, prev_frame, random_frame, jitter, mask)
+        encoded, frames, n_iterations = feedback_loop(inference, frames, n_steps, tolerance, norm, timing)
+        valid = np.array([validate(frame) for frame in frames])
+        scores = candidate_scores(frames, prev_frame, score)
+        log.info("Feedback: {} iterations, {} of {} candidates validated".format(n_iterations, valid.sum(), len(frames)))
+        if valid.any():
+            best = int(np.argmax(np.where(valid, scores, -np.inf)))
+            log.info("Validated : candidate {}".format(best))
+            return encoded[best:best+1], frames[best:best+1]
+        # Needs more time, just keep projecting.
+        elif starting_frame is not None:
+            log.info("Not validated : resend")
+            best = int(np.argmax(scores))
+            return encoded[best:best+1], prev_frame
@@ -14,6 +14,7 @@ Usage:
     python xeno_generate_display_images.py XenoPi/snapshots/
     python xeno_generate_display_images.py XenoPi/snapshots/ --force
     python xeno_generate_display_images.py XenoPi/snapshots/ --min-year 2025
+    python xeno_generate_display_images.py XenoPi/snapshots/ --workers 4
 """
 
 import argparse
@@ -25,7 +26,7 @@ import numpy as np
 from PIL import Image
 
 import xeno_image
-from xeno_video import experiment_to_gif
+from xeno_video import RENDER_WORKERS, render_display_images
 
 
 # ---------------------------------------------------------------------------
@@ -70,18 +71,20 @@ def _can_generate_display(exp_dir):
     )
 
 
-def generate_display_images(exp_dir, force=False):
+def generate_display_images(exp_dir, force=False, workers=None):
     """Generate {uid}_ann_N.png and {uid}_bio_N.png.  Returns (n_ann, n_bio)."""
     uid = exp_dir.name
     ann_pattern = str(exp_dir / f"{uid}_ann_%d.png")
     bio_pattern = str(exp_dir / f"{uid}_bio_%d.png")
-    experiment_to_gif(
+    render_display_images(
         str(exp_dir), ann_pattern, "ann_all",
         fit_in_circle=True,
         ann_background=(0, 0, 0),
         ann_foreground=(255, 255, 255),
+        overwrite=force,
+        workers=workers,
     )
-    experiment_to_gif(str(exp_dir), bio_pattern, "bio_all", fit_in_circle=True)
+    render_display_images(str(exp_dir), bio_pattern, "bio_all", fit_in_circle=True, overwrite=force, workers=workers)
     return (
         len(list(exp_dir.glob(f"{uid}_ann_*.png"))),
         len(list(exp_dir.glob(f"{uid}_bio_*.png"))),
@@ -199,6 +202,8 @@ if __name__ == "__main__":
                         help="Skip generating {uid}_ann / _bio display images")
     parser.add_argument("--skip-pipeline", action="store_true",
                         help="Skip generating per-snapshot _col / _bsb / _net images")
+    parser.add_argument("--workers", type=int, default=RENDER_WORKERS,
+                        help="Number of display images rendered in parallel")
     args = parser.parse_args()
 
     # Load optional global config.
@@ -237,7 +242,7 @@ if __name__ == "__main__":
                 parts.append("display:ok")
             else:
                 try:
-                    n_ann, n_bio = generate_display_images(exp_dir, args.force)
+                    n_ann, n_bio = generate_display_images(exp_dir, args.force, args.workers)
                     parts.append(f"display:{n_ann}ann+{n_bio}bio")
                     stats["display"] += 1
                 except Exception as e:
@@ -5,6 +5,7 @@ import numpy as np
 
 import argparse
 
+import logging
 import os
 
 from PIL import Image, ImageOps, ImageFilter, ImageChops
@@ -14,11 +15,14 @@ from skimage.morphology import thin
 from skimage import img_as_bool, img_as_ubyte
 
 from collections import namedtuple
+from functools import lru_cache
 
 from skimage import __version__ as skimage_version
 from skimage.morphology import thin
 from packaging import version
 
+log = logging.getLogger(__name__)
+
 # equalizes levels to a certain average accross points
 def equalize(arr, average=0.5):
     return arr * (average * arr.size) / arr.sum()
@@ -34,16 +38,55 @@ def image_to_array(img, input_shape):
 def array_to_image(arr, width, height):
     return Image.fromarray(arr.reshape((width, height)) * 255.0).convert('L')
 
-def create_mask(image, invert=False):
+# Precomputed variants of xeno_mask.png at one image size.
+#   rgba / rgba_array         : mask as RGBA (as composited by add_mask)
+#   gray / gray_array         : mask converted to grayscale
+#   inverted / inverted_array : inverted grayscale mask (histogram mask used by enhance)
+#   blend_src / blend_coef    : alpha_composite() terms, so that add_mask is a single
+#                               integer blend reproducing PIL's rounding exactly
+MaskVariants = namedtuple('MaskVariants', ['rgba', 'rgba_array', 'gray', 'gray_array',
+                                           'inverted', 'inverted_array', 'blend_src', 'blend_coef'])
+
+# Number of mask sizes kept in memory (camera resolution, 28x28, a few display sizes).
+MASK_CACHE_SIZE = 8
+
+@lru_cache(maxsize=1)
+def _load_mask_file():
     script_path = os.path.abspath(__file__) # i.e. /path/to/dir/xeno_image.py
     script_dir = os.path.split(script_path)[0] #i.e. /path/to/dir/
     absolute_file_mask_path = os.path.join(script_dir, "xeno_mask.png")
-    return Image.open(absolute_file_mask_path).convert('RGBA').resize(image.size)
+    with Image.open(absolute_file_mask_path) as mask:
+        return mask.convert('RGBA')
+
+@lru_cache(maxsize=MASK_CACHE_SIZE)
+def mask_variants(size):
+    """Return the MaskVariants of xeno_mask.png resized to size (w, h).
+
+    The mask file is decoded once and every size is cached (LRU), so masking
+    does no file I/O after the first call.
+    """
+    rgba = _load_mask_file().resize(size)
+    gray = rgba.convert('L')
+    inverted = ImageOps.invert(gray)
+    rgba_array = np.asarray(rgba)
+    # Image.alpha_composite() over an opaque image reduces to
+    # out = (src * a * 128 + dst * (255 - a) * 128 + rounding) / (255 * 128).
+    alpha = rgba_array[:, :, 3:4].astype(np.uint32)
+    blend_src = rgba_array[:, :, :3].astype(np.uint32) * alpha * 128 + (0x80 << 7)
+    blend_coef = (255 - alpha) * 128
+    return MaskVariants(rgba, rgba_array, gray, np.asarray(gray), inverted, np.asarray(inverted),
+                        blend_src, blend_coef)
+
+def create_mask(image, invert=False):
+    return mask_variants(image.size).rgba.copy()
 
 # Returns image resulting from subtraction of image from base_image.
 # scale=0.1 amplifies the difference x10 for the CV pipeline (high contrast).
 def remove_base(image, base_image):
-    return ImageChops.subtract(image.convert('RGB'), base_image.convert('RGB'), scale=0.1, offset=127)
+    return ImageChops.subtract(_as_rgb(image), _as_rgb(base_image), scale=0.1, offset=127)
+
+def _as_rgb(image):
+    return image if image.mode == 'RGB' else image.convert('RGB')
 
 def remove_base_natural(image, base_image):
     """Subtract base at natural scale (no amplification).
@@ -58,35 +101,159 @@ def remove_base_natural(image, base_image):
     diff = np.clip(raw_arr - base_arr + 128.0, 0, 255).astype(np.uint8)
     return Image.fromarray(diff, mode='L')
 
+class QuadTransformer:
+    """Perspective correction of frames of one size for one camera quad.
+
+    Built once from input_quad and the frame size (w, h): the sampling table of
+    PIL's Image.QUAD warp (a bilinear quad mapping with nearest sampling) is
+    precomputed, so each frame is corrected by a single cv2.remap and the
+    result is identical to Image.transform(). Pixels that fall outside the
+    frame are black.
+    """
+
+    def __init__(self, input_quad, size):
+        self.input_quad = tuple(float(v) for v in input_quad)
+        self.size = tuple(size)
+        w, h = self.size
+        self.side = max(w, h)
+        q = self.input_quad
+        nw, sw, se, ne = (q[0] * w, q[1] * h), (q[2] * w, q[3] * h), (q[4] * w, q[5] * h), (q[6] * w, q[7] * h)
+        # Same bilinear coefficients as PIL (Image.transform with Transform.QUAD).
+        step = 1.0 / self.side
+        a = (nw[0], (ne[0] - nw[0]) * step, (sw[0] - nw[0]) * step, (se[0] - sw[0] - ne[0] + nw[0]) * step * step,
+             nw[1], (ne[1] - nw[1]) * step, (sw[1] - nw[1]) * step, (se[1] - sw[1] - ne[1] + nw[1]) * step * step)
+        # PIL samples output pixel centres.
+        coords = np.arange(self.side, dtype=np.float64) + 0.5
+        x, y = np.meshgrid(coords, coords)
+        xin = a[0] + a[1] * x + a[2] * y + a[3] * x * y
+        yin = a[4] + a[5] * x + a[6] * y + a[7] * x * y
+        # PIL truncates towards zero and maps any negative coordinate outside.
+        ix = np.where(xin < 0, -1, np.clip(xin, -1, w).astype(np.int64))
+        iy = np.where(yin < 0, -1, np.clip(yin, -1, h).astype(np.int64))
+        self.sample_map = np.dstack([ix, iy]).astype(np.int16)
+
+    def matches(self, input_quad, size):
+        return tuple(float(v) for v in input_quad) == self.input_quad and tuple(size) == self.size
+
+    def apply_array(self, arr):
+        """Warp a uint8 array (H x W or H x W x C) of the transformer's size."""
+        return cv2.remap(arr, self.sample_map, None, cv2.INTER_NEAREST,
+                         borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+
+    def apply(self, *images):
+        """Warp any number of 'L' / 'RGB' PIL images of the transformer's size.
+
+        Returns a list of PIL images (same modes), like transform() on each.
+        """
+        return [Image.fromarray(self.apply_array(np.asarray(img))) for img in images]
+
+    def __call__(self, image):
+        return self.apply(image)[0]
+
+# Number of (camera quad, frame size) transformers kept in memory.
+TRANSFORMER_CACHE_SIZE = 8
+
+@lru_cache(maxsize=TRANSFORMER_CACHE_SIZE)
+def _cached_transformer(input_quad, size):
+    return QuadTransformer(input_quad, size)
+
+def get_transformer(input_quad, size):
+    """Return the cached QuadTransformer for input_quad and frame size (w, h)."""
+    return _cached_transformer(tuple(float(v) for v in input_quad), tuple(size))
+
+def clear_transformer_cache():
+    """Drop cached transformers (e.g. after camera_quad was recalibrated)."""
+    _cached_transformer.cache_clear()
+
 # Returns square image picked from area in image defined by input_quad.
 def transform(image, input_quad):
+    if image.mode in ('L', 'RGB'):
+        return get_transformer(input_quad, image.size)(image)
     w, h = image.size
     input_quad_abs = (input_quad[0] * w, input_quad[1] * h, input_quad[2] * w, input_quad[3] * h, input_quad[4] * w, input_quad[5] * h, input_quad[6] * w, input_quad[7] * h)
     square_side = max(w, h)
     return image.transform((square_side, square_side), Image.QUAD, input_quad_abs)
 
+class BaseImage:
+    """Base image (empty petri dish) of an experiment, decoded once.
+
+    Holds the full-resolution RGB image and array (used for base subtraction)
+    and, per camera quad, the perspective-corrected grayscale version.
+    """
+
+    def __init__(self, path, mtime=None):
+        self.path = path
+        self.mtime = os.path.getmtime(path) if mtime is None else mtime
+        with Image.open(path) as img:
+            self.image = img.convert('RGB')
+        self.array = np.asarray(self.image)
+        self._transformed = {}
+
+    def transformed(self, input_quad):
+        """Return the base transformed with input_quad, as an 'L' image."""
+        key = tuple(float(v) for v in input_quad)
+        if key not in self._transformed:
+            # Only the current calibration is kept.
+            self._transformed = { key: transform(self.image.convert('L'), input_quad) }
+        return self._transformed[key]
+
+    def transformed_array(self, input_quad):
+        return np.asarray(self.transformed(input_quad))
+
+# Number of base images kept in memory (one per experiment).
+BASE_IMAGE_CACHE_SIZE = 2
+
+@lru_cache(maxsize=BASE_IMAGE_CACHE_SIZE)
+def _cached_base_image(path, mtime):
+    return BaseImage(path, mtime)
+
+def get_base_image(path):
+    """Return the cached BaseImage for path, reloading it if the file changed."""
+    path = os.path.abspath(path)
+    return _cached_base_image(path, os.path.getmtime(path))
+
+def clear_base_image_cache():
+    _cached_base_image.cache_clear()
+
+# Composite the (cached) mask over an RGB/grayscale uint8 array; returns an RGB array.
+def _blend_mask(arr, variants):
+    if arr.ndim == 2:
+        arr = arr[:, :, np.newaxis]
+    blended = variants.blend_src + arr.astype(np.uint32) * variants.blend_coef
+    return ((((blended >> 8) + blended) >> 8) >> 7).astype(np.uint8)
+
 # Apply mask to alleviate border flares / artefacts.
 def add_mask(image, invert=False):
+    if image.mode not in ('L', 'RGB'):
+        # Images with their own alpha (or exotic modes) go through PIL compositing.
+        if invert:
+            return ImageOps.invert(add_mask(ImageOps.invert(image.convert('RGB'))))
+        return Image.alpha_composite(image.convert('RGBA'), create_mask(image)).convert('RGB')
+    variants = mask_variants(image.size)
+    arr = np.asarray(image)
     if invert:
-        return ImageOps.invert(add_mask(ImageOps.invert(image)))
+        return Image.fromarray(255 - _blend_mask(255 - arr, variants), mode='RGB')
     else:
-        return Image.alpha_composite(image.convert('RGBA'), create_mask(image)).convert('RGB')
+        return Image.fromarray(_blend_mask(arr, variants), mode='RGB')
 
-def _fgs_to_circle(image, scale):
-    """FGS square-to-disc remap via cv2.remap (inverse mapping).
+# Cache of squircle remap grids keyed by (n, scale, direction). The grids only
+# depend on the image side and disc scale, so they are computed once per size.
+_squircle_maps_cache = {}
 
-    The canvas spans [-scale, scale] in normalised coords, so:
-      scale=1        -> inscribed disc  (radius = n/2, corners are black)
-      scale=sqrt(2)  -> circumscribed disc (radius = n*sqrt(2)/2, no black corners)
+# Optional .npz file where computed grids are persisted across runs (see
+# set_squircle_cache_file()).
+_squircle_maps_file = None
 
-    Args:
-        image: Grayscale PIL Image (must be square).
-        scale: Disc radius in normalised canvas units.
-    Returns:
-        Grayscale PIL Image of the same size.
+# Use cv2.convertMaps() fixed-point maps in cv2.remap(). Faster on the Pi, but
+# bilinear weights are quantized so results may differ by a few grey levels.
+use_fixed_point_maps = False
+
+def _fgs_circle_grid(n, scale):
+    """Compute FGS square-to-disc inverse remap grid for an n x n image.
+
+    Returns (map_x, map_y, outside) where outside is a boolean array of the
+    canvas pixels that fall outside the disc.
     """
-    arr = np.array(image.convert('L'), dtype=np.uint8)
-    n = arr.shape[0]
     coords = (np.arange(n, dtype=np.float32) + 0.5) / n * 2.0 - 1.0
     cx, cy = np.meshgrid(coords, coords)
     # Normalise canvas coords to unit-disc space for FGS inverse.
@@ -105,10 +272,132 @@ def _fgs_to_circle(image, scale):
     y = np.clip(y, -1.0, 1.0)
     map_x = ((x + 1.0) * 0.5 * n).astype(np.float32)
     map_y = ((y + 1.0) * 0.5 * n).astype(np.float32)
-    result = cv2.remap(arr, map_x, map_y, cv2.INTER_LINEAR)
-    result[~inside] = 0
+    return map_x, map_y, ~inside
+
+def _fgs_square_grid(n, scale):
+    """Compute FGS disc-to-square forward remap grid for an n x n image.
+
+    Returns (map_x, map_y, None): every canvas pixel is populated.
+    """
+    coords = (np.arange(n, dtype=np.float32) + 0.5) / n * 2.0 - 1.0
+    x, y = np.meshgrid(coords, coords)
+    x2, y2 = x * x, y * y
+    r2 = x2 + y2
+    rad = np.sqrt(np.maximum(r2 - x2 * y2, 0.0))
+    inv_sqrt_r2 = np.where(r2 > 1e-10, 1.0 / np.sqrt(r2), 0.0)
+    u = x * rad * inv_sqrt_r2 * scale
+    v = y * rad * inv_sqrt_r2 * scale
+    map_x = np.clip((u + 1.0) * 0.5 * n, 0, n - 1).astype(np.float32)
+    map_y = np.clip((v + 1.0) * 0.5 * n, 0, n - 1).astype(np.float32)
+    return map_x, map_y, None
+
+def _squircle_cache_key(n, scale, direction):
+    return "{}_{}_{!r}".format(direction, int(n), float(scale))
+
+def squircle_maps(n, scale, direction):
+    """Return cached (map1, map2, outside) remap grids for cv2.remap.
+
+    Args:
+        n:         Image side in pixels.
+        scale:     Disc radius in normalised canvas units.
+        direction: "circle" (square -> disc) or "square" (disc -> square).
+    Returns:
+        (map1, map2, outside): float32 x/y maps, or fixed-point maps from
+        cv2.convertMaps() if use_fixed_point_maps is set. outside is a boolean
+        array of pixels to blank (None if none).
+    """
+    key = _squircle_cache_key(n, scale, direction)
+    entry = _squircle_maps_cache.get(key)
+    if entry is None:
+        if direction == "circle":
+            map_x, map_y, outside = _fgs_circle_grid(n, scale)
+        elif direction == "square":
+            map_x, map_y, outside = _fgs_square_grid(n, scale)
+        else:
+            raise ValueError("Unknown squircle direction: {}".format(direction))
+        entry = { "float": (map_x, map_y), "outside": outside }
+        _squircle_maps_cache[key] = entry
+        if _squircle_maps_file:
+            # The cache only saves startup time: failing to write it (SD card full or read-only) must not fail a step.
+            try:
+                save_squircle_cache(_squircle_maps_file)
+            except OSError as e:
+                log.warning("Could not save squircle remap grids to {}: {}".format(_squircle_maps_file, e))
+    if use_fixed_point_maps:
+        if "fixed" not in entry:
+            entry["fixed"] = cv2.convertMaps(entry["float"][0], entry["float"][1], cv2.CV_16SC2)
+        map1, map2 = entry["fixed"]
+    else:
+        map1, map2 = entry["float"]
+    return map1, map2, entry["outside"]
+
+def clear_squircle_cache():
+    """Empty the in-memory squircle remap grid cache."""
+    _squircle_maps_cache.clear()
+
+def save_squircle_cache(path):
+    """Save all cached squircle remap grids to an .npz file."""
+    arrays = {}
+    for key, entry in _squircle_maps_cache.items():
+        arrays[key + "_x"], arrays[key + "_y"] = entry["float"]
+        if entry["outside"] is not None:
+            arrays[key + "_outside"] = entry["outside"]
+    tmp_path = path + ".tmp.npz"
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+
+def load_squircle_cache(path):
+    """Load squircle remap grids saved by save_squircle_cache() into the cache.
+
+    Returns the number of grids loaded (0 if the file is missing or unreadable).
+    """
+    if not os.path.exists(path):
+        return 0
+    try:
+        with np.load(path) as data:
+            keys = [k[:-2] for k in data.files if k.endswith("_x")]
+            for key in keys:
+                outside = data[key + "_outside"] if key + "_outside" in data.files else None
+                _squircle_maps_cache[key] = { "float": (data[key + "_x"], data[key + "_y"]), "outside": outside }
+    except (OSError, ValueError):
+        return 0
+    return len(keys)
+
+def set_squircle_cache_file(path):
+    """Persist squircle remap grids to path (typically next to settings.json).
+
+    Grids already saved there are loaded immediately; grids computed later are
+    appended to the file. Pass None to disable persistence.
+    """
+    global _squircle_maps_file
+    _squircle_maps_file = path
+    if path:
+        return load_squircle_cache(path)
+    return 0
+
+def _fgs_remap(image, scale, direction):
+    arr = np.array(image.convert('L'), dtype=np.uint8)
+    map1, map2, outside = squircle_maps(arr.shape[0], scale, direction)
+    result = cv2.remap(arr, map1, map2, cv2.INTER_LINEAR)
+    if outside is not None:
+        result[outside] = 0
     return Image.fromarray(result, mode='L')
 
+def _fgs_to_circle(image, scale):
+    """FGS square-to-disc remap via cv2.remap (inverse mapping).
+
+    The canvas spans [-scale, scale] in normalised coords, so:
+      scale=1        -> inscribed disc  (radius = n/2, corners are black)
+      scale=sqrt(2)  -> circumscribed disc (radius = n*sqrt(2)/2, no black corners)
+
+    Args:
+        image: Grayscale PIL Image (must be square).
+        scale: Disc radius in normalised canvas units.
+    Returns:
+        Grayscale PIL Image of the same size.
+    """
+    return _fgs_remap(image, scale, "circle")
+
 
 def _fgs_to_square(image, scale):
     """FGS disc-to-square remap via cv2.remap (forward mapping).
@@ -122,20 +411,7 @@ def _fgs_to_square(image, scale):
     Returns:
         Grayscale PIL Image of the same size.
     """
-    arr = np.array(image.convert('L'), dtype=np.uint8)
-    n = arr.shape[0]
-    coords = (np.arange(n, dtype=np.float32) + 0.5) / n * 2.0 - 1.0
-    x, y = np.meshgrid(coords, coords)
-    x2, y2 = x * x, y * y
-    r2 = x2 + y2
-    rad = np.sqrt(np.maximum(r2 - x2 * y2, 0.0))
-    inv_sqrt_r2 = np.where(r2 > 1e-10, 1.0 / np.sqrt(r2), 0.0)
-    u = x * rad * inv_sqrt_r2 * scale
-    v = y * rad * inv_sqrt_r2 * scale
-    map_x = np.clip((u + 1.0) * 0.5 * n, 0, n - 1).astype(np.float32)
-    map_y = np.clip((v + 1.0) * 0.5 * n, 0, n - 1).astype(np.float32)
-    result = cv2.remap(arr, map_x, map_y, cv2.INTER_LINEAR)
-    return Image.fromarray(result, mode='L')
+    return _fgs_remap(image, scale, "square")
 
 
 def to_circle_inside(image):
@@ -162,7 +438,7 @@ def enhance(image):
 
     # Convert to grayscale.
     filtered = image.convert('L')
-    image_mask = ImageOps.invert(create_mask(image).convert('L'))
+    image_mask = mask_variants(image.size).inverted
 
     # Image filters to enhance contrasts.
 
@@ -288,7 +564,59 @@ def compute_visibility(bio_image, raw_image=None, projected=None,
         return 1
     return 0
 
-def postprocess_output(image, output_size=224, threshold=0.5, stroke_width=20, boundary_px=22, area_max=None, supersample=2):
+def _thick_contour_layer(comp_u8, thickness):
+    """Draw the external contours of a binary component with the given thickness."""
+    _fc = cv2.findContours(comp_u8, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    contours = _fc[0] if len(_fc) == 2 else _fc[1]
+    layer = np.zeros_like(comp_u8)
+    cv2.drawContours(layer, contours, -1, 255, thickness=thickness)
+    return layer
+
+def _render_components_loop(binary, k_open, bp):
+    """Reference renderer: one full-frame pass per connected component."""
+    opened = cv2.morphologyEx(binary, cv2.MORPH_OPEN, k_open)
+    num_labels, labels = cv2.connectedComponents(binary)
+    result = np.zeros_like(binary)
+    for label_id in range(1, num_labels):
+        comp = (labels == label_id)
+        comp_u8 = comp.astype(np.uint8) * 255
+        if opened[comp].any():
+            # Thick: draw inward contour of width boundary_px.
+            layer = _thick_contour_layer(comp_u8, bp * 2)
+            result = cv2.add(result, cv2.bitwise_and(layer, comp_u8))
+        else:
+            # Thin: keep all pixels solid.
+            result[comp] = 255
+    return result
+
+def _render_components(binary, k_open, bp):
+    """Vectorized renderer, identical to _render_components_loop().
+
+    A component is thick iff the opening leaves some of its pixels, i.e. iff
+    the erosion does (the kernel is convex and contains its centre, so every
+    opened pixel lies in the component of an eroded one): the dilation half
+    of the opening is skipped. Thick components are found with one bincount
+    and all thin components are filled at once. Only thick components are
+    contoured, each within its own bounding box (plus a 1-pixel margin so
+    findContours sees the same neighbourhood as on the full frame).
+    """
+    eroded = cv2.erode(binary, k_open)
+    num_labels, labels, stats, _ = cv2.connectedComponentsWithStats(binary)
+    is_thick = np.bincount(labels[eroded > 0], minlength=num_labels) > 0
+    is_thick[0] = False
+    # Thin: keep all pixels solid.
+    result = binary.copy()
+    # Thick: replace with the inward contour of width boundary_px.
+    h, w = binary.shape
+    for label_id in np.flatnonzero(is_thick):
+        x, y, bw, bh = stats[label_id, :4]
+        x0, y0, x1, y1 = max(x - 1, 0), max(y - 1, 0), min(x + bw + 1, w), min(y + bh + 1, h)
+        comp = labels[y0:y1, x0:x1] == label_id
+        layer = _thick_contour_layer(comp.astype(np.uint8) * 255, bp * 2)
+        result[y0:y1, x0:x1][comp] = layer[comp]
+    return result
+
+def postprocess_output(image, output_size=224, threshold=0.5, stroke_width=20, boundary_px=22, area_max=None, supersample=2, vectorized=True):
     """Post-process an autoencoder output image for projection.
 
     Transforms the raw 28x28 (or any size) grayscale PIL image into a
@@ -317,6 +645,9 @@ def postprocess_output(image, output_size=224, threshold=0.5, stroke_width=20, b
         supersample:  Render scale factor (default 2). All drawing happens at
                       output_size*supersample; the result is downsampled with
                       LANCZOS for clean antialiased edges.
+        vectorized:   Use the vectorized component renderer (default). False
+                      selects the original per-component loop, kept for
+                      validation; both give identical results.
 
     Returns:
         Grayscale PIL Image of size output_size x output_size.
@@ -336,78 +667,309 @@ def postprocess_output(image, output_size=224, threshold=0.5, stroke_width=20, b
     else:
         _, binary = cv2.threshold(arr, int(float(threshold) * 255), 255, cv2.THRESH_BINARY)
 
-    # 3. Morphological opening to classify thick vs thin components.
+    # 3-4. Classify components as thick / thin with an opening of radius
+    # stroke_width, then render each component.
     k_open = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * sw + 1, 2 * sw + 1))
-    opened = cv2.morphologyEx(binary, cv2.MORPH_OPEN, k_open)
-
-    # 4. Per-component processing.
-    num_labels, labels = cv2.connectedComponents(binary)
-    result = np.zeros_like(binary)
-    for label_id in range(1, num_labels):
-        comp = (labels == label_id)
-        comp_u8 = comp.astype(np.uint8) * 255
-        if opened[comp].any():
-            # Thick: draw inward contour of width boundary_px.
-            _fc = cv2.findContours(comp_u8, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            contours = _fc[0] if len(_fc) == 2 else _fc[1]
-            layer = np.zeros_like(binary)
-            cv2.drawContours(layer, contours, -1, 255, thickness=bp * 2)
-            result = cv2.add(result, cv2.bitwise_and(layer, comp_u8))
-        else:
-            # Thin: keep all pixels solid.
-            result[comp] = 255
+    if vectorized:
+        result = _render_components(binary, k_open, bp)
+    else:
+        result = _render_components_loop(binary, k_open, bp)
 
     # 5. Downsample to output_size - LANCZOS averaging gives antialiased edges.
     return Image.fromarray(result, mode='L').resize((output_size, output_size), Image.LANCZOS)
 
-# Processes raw image.
-def process_image(image, base_image=False, image_side=28, input_quad=[0, 0, 0, 1, 1, 1, 1, 0], squircle_mode="none"):
-    # Transform image using input quad.
-    raw_transformed = transform(image.convert('RGB'), input_quad)
+class ImagePipeline:
+    """Lazily computes the stages of process_image() for one raw image.
 
-    # Remove averaged background file from image.
-    if base_image:
-        prefiltered = remove_base(image, base_image)
-    else:
-        prefiltered = image.convert('RGB')
+    Each stage is computed on first access and memoized, together with the
+    stages it depends on. Callers that only need e.g. the perspective-corrected
+    colour frame (raw_transformed) skip base subtraction, masking, filtering,
+    thinning and erosion entirely.
 
-    # Transform image using input quad.
-    transformed = transform(prefiltered, input_quad).convert('L')
+    Stages (in process_image() return order): resized, simplified, enhanced,
+    masked, transformed, raw_transformed.
+    """
 
-    # Apply mask to alleviate border flares / artefacts.
-    # Outside mode captures the full circumscribed disc, so masking is skipped.
-    if squircle_mode != "outside":
-        masked = add_mask(transformed)
-    else:
-        masked = transformed
+    STAGES = ("resized", "simplified", "enhanced", "masked", "transformed", "raw_transformed")
+
+    def __init__(self, image, base_image=False, image_side=28, input_quad=[0, 0, 0, 1, 1, 1, 1, 0], squircle_mode="none"):
+        self.image = image
+        self.base_image = base_image
+        self.image_side = image_side
+        self.input_quad = input_quad
+        self.squircle_mode = squircle_mode
+        self._stages = {}
+
+    def get(self, stage):
+        """Return stage by name, computing it (and its dependencies) if needed."""
+        if stage not in self._stages:
+            if stage not in self.STAGES:
+                raise ValueError("Unknown pipeline stage: {}".format(stage))
+            self._stages[stage] = getattr(self, "_compute_" + stage)()
+        return self._stages[stage]
+
+    def stages(self, *names):
+        """Return a tuple with the requested stages (all stages if none given)."""
+        return tuple(self.get(name) for name in (names or self.STAGES))
+
+    def is_computed(self, stage):
+        return stage in self._stages
+
+    @property
+    def raw_transformed(self):
+        return self.get("raw_transformed")
+
+    @property
+    def transformed(self):
+        return self.get("transformed")
+
+    @property
+    def masked(self):
+        return self.get("masked")
+
+    @property
+    def enhanced(self):
+        return self.get("enhanced")
+
+    @property
+    def simplified(self):
+        return self.get("simplified")
+
+    @property
+    def resized(self):
+        return self.get("resized")
+
+    def _compute_raw_transformed(self):
+        # Transform image using input quad.
+        return transform(self.image.convert('RGB'), self.input_quad)
+
+    def _compute_transformed(self):
+        # Remove averaged background file from image.
+        if self.base_image:
+            prefiltered = remove_base(self.image, self.base_image)
+        else:
+            prefiltered = self.image.convert('RGB')
 
-    # Squircle remapping: map circular disc content to fill the square.
-    if squircle_mode == "inside":
-        masked = to_square_inside(masked)
-    elif squircle_mode == "outside":
-        masked = to_square_outside(masked)
+        # Transform image using input quad.
+        return transform(prefiltered, self.input_quad).convert('L')
 
-    # Image filters to enhance contrasts.
-    enhanced = enhance(masked)
+    def _compute_masked(self):
+        # Apply mask to alleviate border flares / artefacts.
+        # Outside mode captures the full circumscribed disc, so masking is skipped.
+        if self.squircle_mode != "outside":
+            masked = add_mask(self.transformed)
+        else:
+            masked = self.transformed
+
+        # Squircle remapping: map circular disc content to fill the square.
+        if self.squircle_mode == "inside":
+            masked = to_square_inside(masked)
+        elif self.squircle_mode == "outside":
+            masked = to_square_outside(masked)
+        return masked
+
+    def _compute_enhanced(self):
+        # Image filters to enhance contrasts.
+        return enhance(self.masked)
+
+    def _compute_simplified(self):
+        # Apply morphology enhancement.
+        return simplify(self.enhanced)
+
+    def _compute_resized(self):
+        # Resize to smaller image.
+        return resize(self.simplified, self.image_side)
+
+# Lookup tables of skimage's thin() (two sub-iterations of the Guo-Hall algorithm),
+# reused by the numpy engine so that its thinning is identical.
+try:
+    from skimage.morphology._skeletonize import G123_LUT as _THIN_LUT_1, G123P_LUT as _THIN_LUT_2
+except ImportError:
+    _THIN_LUT_1 = _THIN_LUT_2 = None
+
+# Neighbourhood weights used to index the thinning lookup tables.
+_THIN_KERNEL = np.array([[8, 4, 2], [16, 0, 1], [32, 64, 128]], dtype=np.float32)
+
+def _rgb_to_l_array(arr):
+    """Same rounding as PIL's convert('L') (ITU-R 601-2 luma, 16-bit fixed point)."""
+    rgb = arr.astype(np.uint32)
+    return ((rgb[:, :, 0] * 19595 + rgb[:, :, 1] * 38470 + rgb[:, :, 2] * 7471 + 0x8000) >> 16).astype(np.uint8)
+
+# ImageChops.subtract(scale=0.1, offset=127) evaluated in single precision for
+# every difference in [-255, 255], indexed by difference + 255.
+_REMOVE_BASE_LUT = np.clip(np.trunc(np.arange(-255, 256, dtype=np.float32) / np.float32(0.1) + np.float32(127)),
+                           0, 255).astype(np.uint8)
+
+def _remove_base_array(arr, base_arr):
+    """Numpy counterpart of remove_base() on RGB uint8 arrays."""
+    h = min(arr.shape[0], base_arr.shape[0])
+    w = min(arr.shape[1], base_arr.shape[1])
+    diff = arr[:h, :w].astype(np.int16) - base_arr[:h, :w].astype(np.int16)
+    diff += 255
+    return _REMOVE_BASE_LUT[diff]
+
+def _equalize_array(arr, mask_arr):
+    """Numpy counterpart of ImageOps.equalize(image, mask) on a grayscale array."""
+    hist = np.bincount(arr[mask_arr != 0], minlength=256)
+    used = hist[hist > 0]
+    if len(used) <= 1:
+        return arr.copy()
+    step = (int(used.sum()) - int(used[-1])) // 255
+    if not step:
+        return arr.copy()
+    cumulative = np.concatenate([[0], np.cumsum(hist[:-1])])
+    lut = np.clip((step // 2 + cumulative) // step, 0, 255).astype(np.uint8)
+    return lut[arr]
+
+def _thin_array(binary, max_num_iter=5):
+    """skimage.morphology.thin() on a 0/255 uint8 array, returned as 0/255 uint8."""
+    if _THIN_LUT_1 is None:
+        return img_as_ubyte(thin(binary > 0, max_num_iter))
+    skel = (binary > 0).astype(np.uint8)
+    n_pts_old, n_pts_new = None, np.count_nonzero(skel)
+    num_iter = 0
+    while n_pts_old != n_pts_new and num_iter < max_num_iter:
+        n_pts_old = n_pts_new
+        for lut in (_THIN_LUT_1, _THIN_LUT_2):
+            neighbours = cv2.filter2D(skel, -1, _THIN_KERNEL, borderType=cv2.BORDER_CONSTANT)
+            skel[lut[neighbours]] = 0
+        n_pts_new = np.count_nonzero(skel)
+        num_iter += 1
+    return skel * np.uint8(255)
+
+class NumpyImagePipeline(ImagePipeline):
+    """ImagePipeline engine that keeps a single uint8 ndarray end to end.
+
+    Uses cv2.remap (cached sampling map), numpy base subtraction, cv2.medianBlur,
+    masked histogram equalization and LUT-based thinning, instead of bouncing
+    between PIL and numpy at every stage. Every operation reproduces the
+    rounding of its PIL counterpart, so stages are expected to be identical to
+    ImagePipeline (see compare_engines()). Stages are returned as PIL images;
+    get_array() returns the underlying arrays without conversion.
+    """
 
-    # Apply morphology enhancement.
-    simplified = simplify(enhanced)
+    def __init__(self, *args, **kwargs):
+        ImagePipeline.__init__(self, *args, **kwargs)
+        self._arrays = {}
 
-    # Resize to smaller image.
-    resized = resize(simplified, image_side)
+    def get_array(self, stage):
+        """Return stage by name as a uint8 array (H x W or H x W x 3)."""
+        if stage not in self._arrays:
+            if stage not in self.STAGES and stage != "rgb":
+                raise ValueError("Unknown pipeline stage: {}".format(stage))
+            self._arrays[stage] = getattr(self, "_compute_array_" + stage)()
+        return self._arrays[stage]
 
-    return resized, simplified, enhanced, masked, transformed, raw_transformed
+    def _stage_image(self, stage):
+        arr = self.get_array(stage)
+        if stage == "masked" and self.squircle_mode == "none":
+            # add_mask() returns an RGB image: the mask is gray, so channels are equal.
+            return Image.fromarray(np.dstack([arr, arr, arr]), mode='RGB')
+        return Image.fromarray(arr, mode='RGB' if arr.ndim == 3 else 'L')
 
-# Loads image_path file, applies perspective transforms and returns it as
-# a numpy array formatted for the autoencoder.
-def load_image(image_path, base_image_path=False, image_side=28, input_quad=[0, 0, 0, 1, 1, 1, 1, 0], squircle_mode="none"):
-    # Open image as grayscale.
+    def _compute_raw_transformed(self):
+        return self._stage_image("raw_transformed")
+
+    def _compute_transformed(self):
+        return self._stage_image("transformed")
+
+    def _compute_masked(self):
+        return self._stage_image("masked")
+
+    def _compute_enhanced(self):
+        return self._stage_image("enhanced")
+
+    def _compute_simplified(self):
+        return self._stage_image("simplified")
+
+    def _compute_resized(self):
+        return self._stage_image("resized")
+
+    def _compute_array_rgb(self):
+        return np.asarray(self.image.convert('RGB'))
+
+    def _compute_array_raw_transformed(self):
+        return get_transformer(self.input_quad, self.image.size).apply_array(self.get_array("rgb"))
+
+    def _compute_array_transformed(self):
+        if self.base_image:
+            prefiltered = _remove_base_array(self.get_array("rgb"), np.asarray(_as_rgb(self.base_image)))
+        else:
+            prefiltered = self.get_array("rgb")
+        # Grayscale conversion commutes with nearest sampling: warp a single channel.
+        return get_transformer(self.input_quad, self.image.size).apply_array(_rgb_to_l_array(prefiltered))
+
+    def _compute_array_masked(self):
+        masked = self.get_array("transformed")
+        if self.squircle_mode != "outside":
+            variants = mask_variants((masked.shape[1], masked.shape[0]))
+            masked = _blend_mask(masked, variants)[:, :, 0]
+        if self.squircle_mode in ("inside", "outside"):
+            scale = 1.0 if self.squircle_mode == "inside" else np.sqrt(2)
+            map1, map2, outside = squircle_maps(masked.shape[0], scale, "square")
+            masked = cv2.remap(masked, map1, map2, cv2.INTER_LINEAR)
+            if outside is not None:
+                masked[outside] = 0
+        return masked
+
+    def _compute_array_enhanced(self):
+        masked = self.get_array("masked")
+        h, w = masked.shape
+        median_filter_size = round_up_to_odd(min(w, h) * 0.009375)
+        filtered = cv2.medianBlur(255 - masked, median_filter_size)
+        return _equalize_array(filtered, mask_variants((w, h)).inverted_array)
+
+    def _compute_array_simplified(self):
+        ___, img = cv2.threshold(self.get_array("enhanced"), 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        img = _thin_array(img, 5)
+        kernel = np.ones((3, 3), np.uint8)
+        return cv2.erode(img, kernel, iterations=5)
+
+    def _compute_array_resized(self):
+        # Kept on PIL's Lanczos filter so the 28x28 network input is unchanged.
+        simplified = Image.fromarray(self.get_array("simplified"), mode='L')
+        return np.asarray(resize(simplified, self.image_side))
+
+# Available image processing engines ("image_engine" in settings.json).
+PIPELINE_ENGINES = {
+    "pil":   ImagePipeline,
+    "numpy": NumpyImagePipeline,
+}
+
+def create_pipeline(image, base_image=False, image_side=28, input_quad=[0, 0, 0, 1, 1, 1, 1, 0], squircle_mode="none", engine="pil"):
+    """Return a lazy pipeline on image using the given engine ("pil" or "numpy")."""
+    if engine not in PIPELINE_ENGINES:
+        raise ValueError("Unknown image engine: {}".format(engine))
+    return PIPELINE_ENGINES[engine](image, base_image, image_side, input_quad, squircle_mode=squircle_mode)
+
+def compare_engines(image, base_image=False, image_side=28, input_quad=[0, 0, 0, 1, 1, 1, 1, 0], squircle_mode="none", engine="numpy"):
+    """Run the reference PIL engine and engine on image; return {stage: max abs difference}."""
+    reference = create_pipeline(image, base_image, image_side, input_quad, squircle_mode, engine="pil")
+    candidate = create_pipeline(image, base_image, image_side, input_quad, squircle_mode, engine=engine)
+    diffs = {}
+    for stage in ImagePipeline.STAGES:
+        a = np.asarray(reference.get(stage), dtype=np.int16)
+        b = np.asarray(candidate.get(stage), dtype=np.int16)
+        diffs[stage] = int(np.abs(a - b).max()) if a.shape == b.shape else 255
+    return diffs
+
+# Processes raw image.
+def process_image(image, base_image=False, image_side=28, input_quad=[0, 0, 0, 1, 1, 1, 1, 0], squircle_mode="none", engine="pil"):
+    return create_pipeline(image, base_image, image_side, input_quad, squircle_mode, engine).stages()
+
+# Opens image_path (and base_image_path) and returns an ImagePipeline on it.
+def load_pipeline(image_path, base_image_path=False, image_side=28, input_quad=[0, 0, 0, 1, 1, 1, 1, 0], squircle_mode="none", engine="pil"):
     image = Image.open(image_path)
     if base_image_path:
-        base_image = Image.open(base_image_path)
+        base_image = get_base_image(base_image_path).image
     else:
         base_image = False
-    return process_image(image, base_image, image_side, input_quad, squircle_mode=squircle_mode)
+    return create_pipeline(image, base_image, image_side, input_quad, squircle_mode, engine)
+
+# Loads image_path file, applies perspective transforms and returns it as
+# a numpy array formatted for the autoencoder.
+def load_image(image_path, base_image_path=False, image_side=28, input_quad=[0, 0, 0, 1, 1, 1, 1, 0], squircle_mode="none", engine="pil"):
+    return load_pipeline(image_path, base_image_path, image_side, input_quad, squircle_mode, engine).stages()
 
 if __name__ == "__main__":
 
@@ -420,6 +982,8 @@ if __name__ == "__main__":
     parser.add_argument("-C", "--configuration-file", type=str, default="XenoPi/settings.json", help="Configuration file containing camera input quad")
     parser.add_argument("-q", "--input-quad", type=str, default=None, help="Comma-separated list of numbers defining input quad (overrides configuration file)")
     parser.add_argument("-i", "--image-side", type=int, default=28, help="Image side value")
+    parser.add_argument("-e", "--engine", type=str, default=None, choices=list(PIPELINE_ENGINES.keys()),
+                        help="Image processing engine (overrides image_engine from configuration file)")
 
     parser.add_argument("-r", "--raw-image", default=False, action='store_true', help="Use raw image (ie. do not apply any transformations, just filterings)")
     parser.add_argument("-c", "--enable-color", default=False, action='store_true', help="Enable color when taking snapshot")
@@ -442,7 +1006,7 @@ if __name__ == "__main__":
     def load_settings():
         import json
         global args, data, input_quad, n_steps, squircle_mode, \
-               output_size, output_stroke_width, output_boundary_px, output_threshold, output_area_max
+               output_size, output_stroke_width, output_boundary_px, output_threshold, output_area_max, engine
         print("Loading settings")
         with open(args.configuration_file, "r") as f:
             data = json.load(f)
@@ -458,6 +1022,7 @@ if __name__ == "__main__":
             output_area_max     = data.get('output_area_max', None)
             if output_area_max is not None:
                 output_area_max = float(output_area_max)
+            engine              = str(data.get('image_engine', 'pil'))
 
     # Defaults (overwritten by load_settings).
     squircle_mode       = "none"
@@ -466,6 +1031,7 @@ if __name__ == "__main__":
     output_boundary_px  = 22
     output_threshold    = 0.5
     output_area_max     = None
+    engine              = "pil"
 
     # Load input quad
     if args.raw_image:
@@ -475,7 +1041,7 @@ if __name__ == "__main__":
     else:
         load_settings()
 
-    resized, simplified, enhanced, masked, transformed, raw_transformed = load_image(args.input_image, args.base_image, input_quad=input_quad, squircle_mode=squircle_mode)#, apply_transforms=(not args.raw_image))
+    resized, simplified, enhanced, masked, transformed, raw_transformed = load_image(args.input_image, args.base_image, input_quad=input_quad, squircle_mode=squircle_mode, engine=args.engine or engine)#, apply_transforms=(not args.raw_image))
     if args.show or args.save_pipeline:
         tile = transformed.size[0]
 
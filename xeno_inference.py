@@ -0,0 +1,402 @@
+"""
+xeno_inference.py — Fast single-sample inference for the Xenolalia autoencoder.
+
+Keras's model.predict() sets up a data adapter, callbacks and a progress bar
+on every call; for a single 1x28x28 frame that overhead dominates the actual
+convolutions. InferenceFunction calls the model directly instead, through a
+function compiled once for a fixed float32 input signature:
+
+  - TensorFlow 2 (eager): tf.function with an input_signature (no retracing),
+  - TensorFlow 1 / Keras 2.2 (graph mode, XenoPi): keras.backend.function,
+  - anything else: a direct model(x, training=False) call.
+
+NumpyModel runs the same autoencoders (the Conv2D / MaxPooling2D /
+UpSampling2D / Dense / Dropout layers built by deep_autoencoder.py) with NumPy
+only, from weights exported to a compact .npz file, so TensorFlow does not
+need to be imported at all. It can also run them post-training quantized:
+"float16" (weights and activations rounded to half precision) or "int8"
+(weights with per-output-channel scales, activations with a per-frame scale,
+integer products accumulated exactly).
+
+Usage:
+    import xeno_inference
+    model = xeno_inference.load_feedback_model("results/model.hdf5", encoder_layer=5)
+    inference = xeno_inference.InferenceFunction(model, input_shape=(1, 28, 28, 1))
+    inference.warmup()
+    encoded, frame = inference(frame)   # same outputs as model.predict(frame)
+
+    inference = xeno_inference.NumpyModel("results/model.npz", encoder_layer=5)
+    encoded, frame = inference(frame)
+    inference = xeno_inference.NumpyModel("results/model.npz", encoder_layer=5, precision="int8")
+
+Exporting models to .npz (requires keras):
+    python xeno_inference.py results/*.hdf5
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+
+def load_feedback_model(model_file, encoder_layer):
+    """Load an autoencoder and return a model outputting [encoder activations, decoded frame]."""
+    from keras.models import Model, load_model
+    autoencoder = load_model(model_file, compile=False)
+    return Model(
+        inputs=autoencoder.input,
+        outputs=[
+            autoencoder.layers[encoder_layer].output,  # encoder activations
+            autoencoder.outputs[0]                     # decoder activations (Keras 3 wraps .output in a list)
+        ]
+    )
+
+
+def _tensorflow():
+    try:
+        import tensorflow as tf
+    except ImportError:
+        return None
+    return tf
+
+
+class InferenceFunction:
+    """Compiled replacement for model.predict(frame) on small batches.
+
+    The batch dimension of input_shape is left free, so the same compiled
+    function serves single frames and batches of candidates. Inputs are cast
+    to float32; outputs are numpy arrays (a list for multi-output models),
+    as returned by model.predict().
+    """
+
+    def __init__(self, model, input_shape):
+        self.model = model
+        self.input_shape = tuple(input_shape)
+        self._multi_output = len(model.outputs) > 1
+        self._fn, self.backend = self._compile()
+        log.info("Inference function: {}".format(self.backend))
+
+    def _compile(self):
+        tf = _tensorflow()
+        if tf is not None and hasattr(tf, "function") and tf.executing_eagerly():
+            spec = tf.TensorSpec((None,) + self.input_shape[1:], tf.float32)
+            fn = tf.function(lambda x: self.model(x, training=False), input_signature=[spec])
+            return (lambda x: fn(tf.constant(x))), "tf.function"
+
+        from keras import backend as K
+        if hasattr(K, "function"):
+            # Graph mode: feed learning phase 0 (inference) if the model depends on it.
+            learning_phase = K.learning_phase()
+            if getattr(self.model, "uses_learning_phase", False) and not isinstance(learning_phase, int):
+                fn = K.function(self.model.inputs + [learning_phase], self.model.outputs)
+                return (lambda x: fn([x, 0])), "keras.backend.function"
+            fn = K.function(self.model.inputs, self.model.outputs)
+            return (lambda x: fn([x])), "keras.backend.function"
+
+        return (lambda x: self.model(x, training=False)), "direct call"
+
+    def __call__(self, frame):
+        outputs = self._fn(np.asarray(frame, dtype=np.float32))
+        if self._multi_output:
+            return [np.asarray(output) for output in outputs]
+        if isinstance(outputs, (list, tuple)):
+            outputs = outputs[0]
+        return np.asarray(outputs)
+
+    predict = __call__
+
+    def warmup(self, n_calls=3):
+        """Trace / build the function with dummy frames; returns the elapsed time in seconds."""
+        start = time.perf_counter()
+        frame = np.zeros(self.input_shape, dtype=np.float32)
+        for _ in range(n_calls):
+            self(frame)
+        elapsed = time.perf_counter() - start
+        log.info("Inference warm-up: {:.3f} s".format(elapsed))
+        return elapsed
+
+
+# ---------------------------------------------------------------------------
+# Pure-NumPy runtime
+# ---------------------------------------------------------------------------
+
+# Version of the .npz layout written by export_npz().
+NPZ_FORMAT_VERSION = 1
+
+ACTIVATIONS = {
+    "linear":  lambda x: x,
+    "relu":    lambda x: np.maximum(x, 0, out=x),
+    # Overflow-free form of 1 / (1 + exp(-x)).
+    "sigmoid": lambda x: 0.5 * (1.0 + np.tanh(0.5 * x)),
+    "tanh":    np.tanh,
+}
+
+
+def _activation_name(config):
+    activation = config.get("activation", "linear")
+    if not isinstance(activation, str):  # serialized activation object
+        activation = activation.get("config", {}).get("name", activation.get("class_name"))
+    if activation not in ACTIVATIONS:
+        raise ValueError("Unsupported activation: {}".format(activation))
+    return activation
+
+
+def _layer_spec(layer):
+    """Return the JSON description of a Keras layer supported by NumpyModel."""
+    kind = type(layer).__name__
+    config = layer.get_config()
+    if config.get("data_format", "channels_last") != "channels_last":
+        raise ValueError("{}: only channels_last is supported".format(layer.name))
+    if kind == "InputLayer":
+        return {"type": "input"}
+    elif kind == "Conv2D":
+        if tuple(config["strides"]) != (1, 1) or tuple(config.get("dilation_rate", (1, 1))) != (1, 1):
+            raise ValueError("{}: only strides and dilation of 1 are supported".format(layer.name))
+        return {"type": "conv2d", "padding": config["padding"], "activation": _activation_name(config)}
+    elif kind == "MaxPooling2D":
+        if tuple(config["pool_size"]) != tuple(config["strides"]):
+            raise ValueError("{}: pool_size must equal strides".format(layer.name))
+        return {"type": "maxpool", "pool_size": list(config["pool_size"]), "padding": config["padding"]}
+    elif kind == "UpSampling2D":
+        if config.get("interpolation", "nearest") != "nearest":
+            raise ValueError("{}: only nearest upsampling is supported".format(layer.name))
+        return {"type": "upsample", "size": list(config["size"])}
+    elif kind == "Dense":
+        return {"type": "dense", "activation": _activation_name(config)}
+    elif kind == "Dropout":
+        return {"type": "dropout"}
+    raise ValueError("Unsupported layer {} ({})".format(layer.name, kind))
+
+
+def export_npz(model_file, npz_file=None):
+    """Export a deep_autoencoder.py model (.hdf5) to a .npz file readable by NumpyModel.
+
+    Layer indices are preserved, so settings' encoder_layer applies unchanged.
+    Returns the path of the written file.
+    """
+    from keras.models import load_model
+    if npz_file is None:
+        npz_file = os.path.splitext(model_file)[0] + ".npz"
+    autoencoder = load_model(model_file, compile=False)
+    specs = []
+    arrays = {}
+    for i, layer in enumerate(autoencoder.layers):
+        specs.append(_layer_spec(layer))
+        weights = layer.get_weights()
+        if weights:
+            arrays["kernel_{}".format(i)] = np.asarray(weights[0], dtype=np.float32)
+            if len(weights) > 1:
+                arrays["bias_{}".format(i)] = np.asarray(weights[1], dtype=np.float32)
+    input_shape = (1,) + tuple(autoencoder.inputs[0].shape[1:])
+    np.savez(npz_file,
+             format_version=np.array(NPZ_FORMAT_VERSION),
+             layers=np.array(json.dumps(specs)),
+             input_shape=np.array(input_shape, dtype=np.int64),
+             **arrays)
+    return npz_file
+
+
+def _pad_same(size, window):
+    """TensorFlow 'same' padding (before, after) for stride 1."""
+    total = window - 1
+    return total // 2, total - total // 2
+
+
+def _im2col(x, kernel_size, padding):
+    """Return the (n*out_h*out_w, kh*kw*C) patch matrix of a stride-1 convolution and (n, out_h, out_w)."""
+    kh, kw = kernel_size
+    if padding == "same":
+        x = np.pad(x, ((0, 0), _pad_same(x.shape[1], kh), _pad_same(x.shape[2], kw), (0, 0)))
+    n, h, w, c = x.shape
+    out_h, out_w = h - kh + 1, w - kw + 1
+    sn, sh, sw, sc = x.strides
+    patches = np.lib.stride_tricks.as_strided(x, (n, out_h, out_w, kh, kw, c), (sn, sh, sw, sh, sw, sc))
+    return patches.reshape(n * out_h * out_w, kh * kw * c), (n, out_h, out_w)
+
+
+def _conv2d(x, kernel_matrix, kernel_size, bias, padding):
+    """2-D convolution (stride 1) as a single matrix product over im2col patches.
+
+    kernel_matrix is the Keras kernel (kh, kw, C, F) reshaped to (kh*kw*C, F).
+    """
+    cols, shape = _im2col(x, kernel_size, padding)
+    out = cols.dot(kernel_matrix)
+    if bias is not None:
+        out += bias
+    return out.reshape(shape + (-1,))
+
+
+def _max_pool(x, pool_size, padding):
+    """Max pooling with strides equal to pool_size ('same' pads with -inf, TensorFlow style)."""
+    ph, pw = pool_size
+    n, h, w, c = x.shape
+    if padding == "same":
+        out_h, out_w = -(-h // ph), -(-w // pw)
+        pad_h, pad_w = out_h * ph - h, out_w * pw - w
+        if pad_h or pad_w:
+            x = np.pad(x, ((0, 0), (pad_h // 2, pad_h - pad_h // 2), (pad_w // 2, pad_w - pad_w // 2), (0, 0)),
+                       mode="constant", constant_values=-np.inf)
+    else:
+        out_h, out_w = h // ph, w // pw
+        x = x[:, :out_h * ph, :out_w * pw]
+    return x.reshape(n, out_h, ph, out_w, pw, c).max(axis=(2, 4))
+
+
+PRECISIONS = ("float32", "float16", "int8")
+
+INT8_MAX = 127
+
+
+def quantize_int8(x, axis):
+    """Symmetric int8 quantization: returns (q, scale) with x ~= q * scale.
+
+    One scale per index of axis (axis=-1: per output channel of a kernel
+    matrix; axis=0: per frame of a batch). q is integer-valued float32, so
+    integer products can go through the BLAS matrix product.
+    """
+    reduce_axes = tuple(a for a in range(x.ndim) if a != axis % x.ndim)
+    scale = np.abs(x).max(axis=reduce_axes, keepdims=True) / INT8_MAX
+    scale[scale == 0] = 1
+    return np.round(x / scale).astype(np.float32), scale.astype(np.float32)
+
+
+def _int_dot(a, b):
+    """Exact product of integer-valued int8-range matrices (int32 accumulation).
+
+    float32 represents integers exactly up to 2**24: enough for
+    K * 127 * 127 (K <= 1040); larger products go through float64.
+    """
+    if a.shape[1] * INT8_MAX * INT8_MAX < 2 ** 24:
+        return a.dot(b)
+    return a.astype(np.float64).dot(b).astype(np.float32)
+
+
+class NumpyModel:
+    """Pure-NumPy feedback model loaded from an export_npz() file.
+
+    Drop-in replacement for InferenceFunction: calling it with a frame (or a
+    batch of frames) returns [encoder layer output, decoded frame] as float32
+    numpy arrays.
+
+    precision selects post-training quantization: "float32" (exact),
+    "float16" or "int8" (see the module docstring).
+    """
+
+    backend = "numpy"
+
+    def __init__(self, npz_file, encoder_layer, input_shape=None, precision="float32"):
+        if precision not in PRECISIONS:
+            raise ValueError("Unknown precision '{}' (expected one of {})".format(precision, ", ".join(PRECISIONS)))
+        with np.load(npz_file) as data:
+            version = int(data["format_version"])
+            if version != NPZ_FORMAT_VERSION:
+                raise ValueError("{}: unsupported format version {}".format(npz_file, version))
+            self.layers = json.loads(str(data["layers"]))
+            self.input_shape = tuple(input_shape) if input_shape is not None else tuple(int(v) for v in data["input_shape"])
+            weights = {key: data[key] for key in data.files if key.startswith(("kernel_", "bias_"))}
+        if not 0 <= encoder_layer < len(self.layers):
+            raise ValueError("encoder_layer {} out of range (model has {} layers)".format(encoder_layer, len(self.layers)))
+        self.encoder_layer = encoder_layer
+        self.precision = precision
+        # Per-layer (kernel matrix, kernel size, bias, kernel scales): conv kernels are pre-reshaped
+        # for the im2col product; int8 kernels are stored as int8 with one scale per output channel.
+        self._params = []
+        for i, spec in enumerate(self.layers):
+            kernel = weights.get("kernel_{}".format(i))
+            bias = weights.get("bias_{}".format(i))
+            kernel_size, scale = None, None
+            if kernel is not None:
+                if spec["type"] == "conv2d":
+                    kernel_size = kernel.shape[:2]
+                    kernel = kernel.reshape(-1, kernel.shape[-1])
+                if precision == "int8":
+                    kernel, scale = quantize_int8(kernel, axis=-1)
+                    kernel = kernel.astype(np.int8)
+                elif precision == "float16":
+                    kernel = kernel.astype(np.float16)
+            self._params.append((kernel, kernel_size, bias, scale))
+        log.info("Inference function: {} ({})".format(self.backend, self.precision))
+
+    def weight_bytes(self):
+        """Return the memory used by the kernels, scales and biases, in bytes."""
+        return sum(a.nbytes for params in self._params for a in (params[0], params[2], params[3]) if a is not None)
+
+    def _product(self, x, params, kind, padding=None):
+        """Conv (im2col) or dense matrix product of x with the layer kernel, plus bias."""
+        kernel, kernel_size, bias, kernel_scale = params
+        if self.precision == "int8":
+            x, x_scale = quantize_int8(x, axis=0)
+            x_scale = x_scale.reshape(-1, 1)
+        if kind == "conv2d":
+            cols, shape = _im2col(x, kernel_size, padding)
+        else:
+            cols, shape = x.reshape(len(x), -1), (len(x),)
+        if self.precision == "int8":
+            out = _int_dot(cols, kernel.astype(np.float32))
+            # Dequantize: one activation scale per frame, one weight scale per output channel.
+            out = out.reshape(len(x), -1, out.shape[-1]) * x_scale[:, :, np.newaxis] * kernel_scale
+        else:
+            out = cols.dot(kernel.astype(np.float32, copy=False))
+        if bias is not None:
+            out += bias
+        return out.reshape(shape + (-1,))
+
+    def _apply(self, spec, params, x):
+        kind = spec["type"]
+        if kind == "conv2d":
+            return ACTIVATIONS[spec["activation"]](self._product(x, params, kind, spec["padding"]))
+        elif kind == "maxpool":
+            return _max_pool(x, spec["pool_size"], spec["padding"])
+        elif kind == "upsample":
+            return x.repeat(spec["size"][0], axis=1).repeat(spec["size"][1], axis=2)
+        elif kind == "dense":
+            return ACTIVATIONS[spec["activation"]](self._product(x, params, kind))
+        # input, dropout (identity at inference time)
+        return x
+
+    def __call__(self, frame):
+        x = np.asarray(frame, dtype=np.float32)
+        half = self.precision == "float16"
+        if half:
+            x = x.astype(np.float16).astype(np.float32)
+        encoded = x
+        for i, (spec, params) in enumerate(zip(self.layers, self._params)):
+            x = self._apply(spec, params, x)
+            if half:
+                # Activations are stored in half precision between layers.
+                x = x.astype(np.float16).astype(np.float32)
+            if i == self.encoder_layer:
+                encoded = x
+        return [encoded, x]
+
+    predict = __call__
+
+    def warmup(self, n_calls=3):
+        """Run dummy frames; returns the elapsed time in seconds."""
+        start = time.perf_counter()
+        frame = np.zeros(self.input_shape, dtype=np.float32)
+        for _ in range(n_calls):
+            self(frame)
+        elapsed = time.perf_counter() - start
+        log.info("Inference warm-up: {:.3f} s".format(elapsed))
+        return elapsed
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+                                     description="Export Keras autoencoders (.hdf5) to .npz files for NumpyModel.")
+    parser.add_argument("model_files", type=str, nargs="+", help="Model files (.hdf5)")
+    parser.add_argument("-o", "--output", type=str, default=None, help="Output file (single model only; default: same name with .npz)")
+    args = parser.parse_args()
+
+    if args.output and len(args.model_files) > 1:
+        parser.error("--output requires a single model file")
+    for model_file in args.model_files:
+        npz_file = export_npz(model_file, args.output)
+        print("{} -> {} ({} bytes)".format(model_file, npz_file, os.path.getsize(npz_file)))
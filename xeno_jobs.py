@@ -0,0 +1,189 @@
+"""
+xeno_jobs.py — Background job workers for the OSC servers.
+
+The OSC receive thread must stay responsive (handshakes, settings updates)
+while a step runs the image pipeline and the autoencoder, which can take
+seconds. JobWorker runs jobs one at a time, in submission order, on a
+dedicated thread, so the OSC handlers only enqueue work. Jobs submitted with
+a key are coalesced: a job whose key is already pending or running is
+dropped (e.g. XenoPi re-sending the same step while it is being computed).
+Jobs that reload state (e.g. settings.json) are submitted with rerun: while
+one is running, a duplicate is queued to run once more after it, since what
+it reloads may have changed after the running job read it.
+
+KeyedWorker runs the same function per key (e.g. fetching and rendering an
+experiment in xeno_server) on one thread per key. Requests made while a run
+is in progress are merged into a single further run, so a burst of messages
+for one experiment costs at most one extra run.
+
+Usage:
+    import xeno_jobs
+    worker = xeno_jobs.JobWorker()
+    worker.submit(next_image, image_path, base_image_path, False, key=("step", image_path))
+    worker.submit(load_settings, key="settings", rerun=True)
+    ...
+    worker.stop()   # on shutdown: finish the running job, drop pending ones
+
+    fetcher = xeno_jobs.KeyedWorker(process_experiment)   # process_experiment(uid, callbacks)
+    fetcher.request(uid, callback)
+"""
+
+import collections
+import logging
+import threading
+
+log = logging.getLogger(__name__)
+
+
+class JobWorker:
+    """Runs submitted jobs sequentially on a daemon thread.
+
+    All jobs run on the same thread, so state they share (models, settings,
+    previous frame) needs no locking. Exceptions are logged and do not stop
+    the worker.
+    """
+
+    def __init__(self, name="job-worker"):
+        self._jobs = collections.deque()
+        self._keys = set()           # keys of pending jobs
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._running = None
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, *args, key=None, rerun=False):
+        """Queue fn(*args). Returns False if the job was coalesced with a pending/running one.
+
+        With rerun, a job is only coalesced with a pending one: if the same
+        key is running, the job is queued to run again after it.
+        """
+        with self._condition:
+            if self._stopped:
+                raise RuntimeError("JobWorker is stopped")
+            if key is not None:
+                running_key = self._running[2] if self._running is not None else None
+                if key in self._keys or (key == running_key and not rerun):
+                    log.info("Coalesced duplicate job: {}".format(key))
+                    return False
+                self._keys.add(key)
+            self._jobs.append((fn, args, key))
+            self._condition.notify()
+            return True
+
+    def pending(self):
+        """Return the number of queued jobs (not counting the running one)."""
+        with self._condition:
+            return len(self._jobs)
+
+    def is_busy(self):
+        """Return True if a job is running or queued."""
+        with self._condition:
+            return self._running is not None or len(self._jobs) > 0
+
+    def join(self):
+        """Wait until all queued jobs have completed."""
+        with self._condition:
+            while self._running is not None or self._jobs:
+                self._condition.wait()
+
+    def stop(self, wait=True):
+        """Drop pending jobs and stop the thread (after the running job if wait)."""
+        with self._condition:
+            self._stopped = True
+            if self._jobs:
+                log.info("Dropping {} pending jobs".format(len(self._jobs)))
+            self._jobs.clear()
+            self._condition.notify_all()
+        if wait:
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._jobs and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                fn, args, key = self._running = self._jobs.popleft()
+                self._keys.discard(key)
+            try:
+                fn(*args)
+            except Exception:
+                log.exception("Job failed: {}".format(key if key is not None else getattr(fn, "__name__", fn)))
+            finally:
+                with self._condition:
+                    self._running = None
+                    self._condition.notify_all()
+
+
+class KeyedWorker:
+    """Runs fn(key, callbacks) on a dedicated daemon thread per key, coalescing requests.
+
+    A request for a key without a thread starts one. Requests made while
+    fn runs for that key are merged into one further run, which receives the
+    callbacks of all of them (in request order) to call when it sees fit.
+    A thread exits once no request is pending for its key; different keys
+    run concurrently. Exceptions are logged and do not drop later requests.
+    """
+
+    def __init__(self, fn, name="keyed-worker"):
+        self._fn = fn
+        self._name = name
+        self._pending = {}           # key -> callbacks of the next run
+        self._threads = {}           # key -> thread running or about to run fn
+        self._condition = threading.Condition()
+        self._stopped = False
+
+    def request(self, key, callback=None):
+        """Request a run of fn for key. Returns False if merged with an already pending request."""
+        with self._condition:
+            if self._stopped:
+                raise RuntimeError("KeyedWorker is stopped")
+            merged = key in self._pending
+            callbacks = self._pending.setdefault(key, [])
+            if callback is not None:
+                callbacks.append(callback)
+            if key not in self._threads:
+                thread = threading.Thread(target=self._run, args=(key,),
+                                          name="{}-{}".format(self._name, key), daemon=True)
+                self._threads[key] = thread
+                thread.start()
+            elif merged:
+                log.info("Coalesced request: {}".format(key))
+            return not merged
+
+    def is_busy(self, key=None):
+        """Return True if a run is in progress or pending (for key, or for any key)."""
+        with self._condition:
+            return key in self._threads if key is not None else len(self._threads) > 0
+
+    def join(self):
+        """Wait until all requests have completed."""
+        with self._condition:
+            while self._threads:
+                self._condition.wait()
+
+    def stop(self, wait=True):
+        """Drop pending requests and stop (after the running ones if wait)."""
+        with self._condition:
+            self._stopped = True
+            if self._pending:
+                log.info("Dropping {} pending requests".format(len(self._pending)))
+            self._pending.clear()
+            self._condition.notify_all()
+        if wait:
+            self.join()
+
+    def _run(self, key):
+        while True:
+            with self._condition:
+                if self._stopped or key not in self._pending:
+                    del self._threads[key]
+                    self._condition.notify_all()
+                    return
+                callbacks = self._pending.pop(key)
+            try:
+                self._fn(key, callbacks)
+            except Exception:
+                log.exception("Job failed: {}".format(key))
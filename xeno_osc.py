@@ -8,7 +8,6 @@ import signal
 import time
 import math
 import argparse
-import traceback
 import json
 
 logging.basicConfig(
@@ -18,15 +17,23 @@ logging.basicConfig(
 )
 log = logging.getLogger(__name__)
 
+# Reference time for startup timings.
+process_start = time.perf_counter()
+
 from pythonosc import dispatcher
 from pythonosc import osc_server
 
 from pythonosc import osc_message_builder
 from pythonosc import udp_client
 
-from PIL import Image, ImageOps
-
+import xeno_activations
+import xeno_feedback
 import xeno_image
+import xeno_inference
+import xeno_jobs
+import xeno_signature
+import xeno_timing
+import xeno_writer
 
 USE_RPI = os.uname()[4].startswith('arm')
 
@@ -51,25 +58,40 @@ parser.add_argument("-is", "---server-ip", default="192.168.0.100",
 parser.add_argument("-ss", "--server-send-port", default="7000",
                     type=int, help="The port number used to send data to the server.")
 
+parser.add_argument("-im", "--monitor-ip", default=None,
+                    help="The IP address of the OSC monitor (Open Stage Control) receiving step timings (default: --server-ip).")
+parser.add_argument("-sm", "--monitor-send-port", default="7003",
+                    type=int, help="The port number used to send step timings to the OSC monitor.")
+parser.add_argument("--timing-window", default=xeno_timing.ROLLING_WINDOW,
+                    type=int, help="Number of samples per stage used for the rolling step timing percentiles.")
+
 parser.add_argument("-r", "--receive-port", default="7000",
                     type=int, help="The port number to listen on.")
 
-args = parser.parse_args()
+parser.add_argument("--wait-for-model", default=False, action='store_true',
+                    help="Load and warm up the model before listening (default: listen immediately, load in the background).")
 
-from keras.models import Model, load_model
+args = parser.parse_args()
 
 # Load calibration settings from .json file.
 def load_settings():
     global args, data, input_quad, n_feedback_steps, use_base_image, \
            use_convolutional, model_name, encoder_layer, \
            output_size, output_stroke_width, output_boundary_px, output_threshold, output_area_max, \
-           squircle_mode, visibility_threshold_cv, visibility_threshold_human
+           squircle_mode, visibility_threshold_cv, visibility_threshold_human, image_engine, \
+           convergence_tolerance, convergence_norm, max_feedback_steps, \
+           n_candidates, candidate_jitter, candidate_score, inference_engine, inference_precision, code_format
     log.info("Loading settings")
     with open(args.configuration_file, "r") as f:
         data = json.load(f)
         log.debug(str(data))
 
-        input_quad = tuple( data['camera_quad'] )
+        new_input_quad = tuple( data['camera_quad'] )
+        if input_quad is not None and new_input_quad != input_quad:
+            # Camera was recalibrated: drop perspective transformers built for the old quad.
+            log.info("Camera quad changed: rebuilding perspective transform")
+            xeno_image.clear_transformer_cache()
+        input_quad = new_input_quad
         n_feedback_steps = data['n_feedback_steps']
         use_base_image = data['use_base_image']
         use_convolutional = data['use_convolutional']
@@ -91,8 +113,46 @@ def load_settings():
             squircle_mode = "none"
         visibility_threshold_cv    = float(data.get('visibility_threshold_cv',    0.1))
         visibility_threshold_human = float(data.get('visibility_threshold_human', 0.3))
+        xeno_image.use_fixed_point_maps = bool(data.get('squircle_fixed_point', False))
+        image_engine = str(data.get('image_engine', 'pil'))
+        # Feedback loop early exit (null tolerance = always run n_feedback_steps).
+        convergence_tolerance = data.get('convergence_tolerance', None)
+        if convergence_tolerance is not None:
+            convergence_tolerance = float(convergence_tolerance)
+        convergence_norm = str(data.get('convergence_norm', 'linf'))
+        if convergence_norm not in xeno_feedback.NORMS:
+            log.warning("Unknown convergence_norm '{}': using 'linf'".format(convergence_norm))
+            convergence_norm = 'linf'
+        max_feedback_steps = data.get('max_feedback_steps', None)
+        max_feedback_steps = n_feedback_steps if max_feedback_steps is None else int(max_feedback_steps)
+        # Batched multi-candidate generation (1 = single chain, merge on failure).
+        n_candidates = max(1, int(data.get('n_candidates', 1)))
+        candidate_jitter = float(data.get('candidate_jitter', 0.05))
+        candidate_score = str(data.get('candidate_score', 'first'))
+        if candidate_score not in xeno_feedback.SCORES:
+            log.warning("Unknown candidate_score '{}': using 'first'".format(candidate_score))
+            candidate_score = 'first'
+        # Autoencoder runtime: "keras" (TensorFlow) or "numpy" (exported .npz, no TensorFlow import).
+        inference_engine = str(data.get('inference_engine', 'keras'))
+        if inference_engine not in ('keras', 'numpy'):
+            log.warning("Unknown inference_engine '{}': using 'keras'".format(inference_engine))
+            inference_engine = 'keras'
+        # Post-training quantization of the NumPy runtime: "float32", "float16" or "int8".
+        inference_precision = str(data.get('inference_precision', 'float32'))
+        if inference_precision not in xeno_inference.PRECISIONS:
+            log.warning("Unknown inference_precision '{}': using 'float32'".format(inference_precision))
+            inference_precision = 'float32'
+        # Encoder activation files: "npy" (_code.npy, float16), "json" (_code.json) or "both".
+        code_format = str(data.get('code_format', 'npy'))
+        if code_format not in ('npy', 'json', 'both'):
+            log.warning("Unknown code_format '{}': using 'npy'".format(code_format))
+            code_format = 'npy'
+        if inference_precision != 'float32' and inference_engine != 'numpy':
+            log.warning("inference_precision '{}' requires inference_engine 'numpy': using 'float32'".format(inference_precision))
+            inference_precision = 'float32'
 
 # Defaults — overwritten by load_settings().
+input_quad                 = None
 output_size                = 224
 output_stroke_width        = 20
 output_boundary_px         = 22
@@ -101,10 +161,23 @@ output_area_max            = None
 squircle_mode              = "none"
 visibility_threshold_cv    = 0.1
 visibility_threshold_human = 0.3
+image_engine               = "pil"
+convergence_tolerance      = None
+convergence_norm           = "linf"
+max_feedback_steps         = None
+inference_engine           = "keras"
+inference_precision        = "float32"
+code_format                = "npy"
+n_candidates               = 1
+candidate_jitter           = 0.05
+candidate_score            = "first"
 
 # Load settings.
 load_settings()
 
+# Persist squircle remap grids next to settings.json so they are not recomputed at startup.
+xeno_image.set_squircle_cache_file(os.path.join(os.path.dirname(os.path.abspath(args.configuration_file)), "squircle_maps.npz"))
+
 # This is the size of our encoded representations.
 image_side = 28
 image_dim = image_side*image_side
@@ -121,10 +194,14 @@ def validate(frame, min=0.1, max=0.9):
     return min <= np.average(frame) <= max
 
 def generate_random():
-    global input_shape, image_side
+    global input_shape
 
     # Generate random frame.
-    frame = np.random.random(input_shape)
+    return mask_frame(np.random.random(input_shape))
+
+# Applies the (inverted) petri dish mask to a frame.
+def mask_frame(frame):
+    global input_shape, image_side
 
     # Convert to image.
     image = xeno_image.array_to_image(frame, image_side, image_side)
@@ -135,36 +212,52 @@ def generate_random():
     # Convert back to frame.
     return xeno_image.image_to_array(image, input_shape)
 
+# Runs the autoencoder on frame (or a batch of frames) up to n_steps times, stopping early once the
+# frames stop changing (see xeno_feedback). Returns encoded, frame and the number of iterations run.
+def feedback_loop(frame, n_steps):
+    global convergence_tolerance, convergence_norm
+    return xeno_feedback.feedback_loop(inference, frame, n_steps, convergence_tolerance, convergence_norm, step_timing)
+
 # Generates frame from starting frame mixed with previous frame.
 def generate_merge(n_steps, starting_frame, prev_frame):
     if n_steps <= 0:
         return None, prev_frame
     else:
         frame = np.maximum(starting_frame, prev_frame)
-        for t in range(n_steps-1):
-            encoded, frame = model.predict(frame)
+        encoded, frame, n_iterations = feedback_loop(frame, n_steps-1)
+        log.info("Merge feedback: {} iterations".format(n_iterations))
         return encoded, frame
 
+# Generates frame from starting frame by running n_candidates candidates in a single batched feedback
+# loop and keeping the best validated one (see xeno_feedback.generate_candidates()).
+def generate_candidates(n_steps, starting_frame, prev_frame):
+    global n_candidates, candidate_jitter, candidate_score, convergence_tolerance, convergence_norm
+    return xeno_feedback.generate_candidates(inference, n_steps, starting_frame, prev_frame, generate_random, validate,
+                                             n_candidates=n_candidates, jitter=candidate_jitter, score=candidate_score,
+                                             mask=mask_frame, tolerance=convergence_tolerance, norm=convergence_norm,
+                                             timing=step_timing)
+
 # Generates frame from starting frame.
 def generate(n_steps, starting_frame, prev_frame):
-    global input_shape, seed_image
+    global input_shape, seed_image, convergence_tolerance, max_feedback_steps, n_candidates
 
-    while True:
-        # Iterate.
-        for t in range(n_steps):
+    # With early exit enabled, iterate at most max_feedback_steps times.
+    n_steps = xeno_feedback.feedback_steps(n_steps, convergence_tolerance, max_feedback_steps)
 
-            log.debug("t={t} ======".format(t=t))
+    if n_candidates > 1:
+        return generate_candidates(n_steps, starting_frame, prev_frame)
 
-            # special case for first frame (init)
-            if t == 0:
-                if starting_frame is None:
-                    # Generate first image as random.
-                    frame = generate_random()
-                else:
-                    frame = starting_frame
+    while True:
+        # Special case for first frame (init).
+        if starting_frame is None:
+            # Generate first image as random.
+            frame = generate_random()
+        else:
+            frame = starting_frame
 
-            # generate next frame.
-            encoded, frame = model.predict(frame)
+        # Iterate.
+        encoded, frame, n_iterations = feedback_loop(frame, n_steps)
+        log.info("Feedback: {} iterations".format(n_iterations))
 
         # See if frame validates.
         if validate(frame):
@@ -221,67 +314,34 @@ def save_encoded_json(
     with open(filepath, "w") as f:
         json.dump(channels, f, indent=2)
     
-def save_code_signature(encoded, filepath, n_bins=40, precision=4):
-    """Save a compact code signature of encoder activations to a JSON file.
-
-    For convolutional encoders (3-D output H×W×C): one bin per channel,
-    summarising the H×W spatial values with per-channel min/max/avg.
-    For dense encoders (1-D output): splits the flattened vector into n_bins
-    equal-sized bins and computes per-bin min/max/avg.
-    The format is intentionally open-ended: vector length and structure may
-    vary across signature types.
-    """
-    if encoded is None:
-        return
-    # Remove batch dim if present.
-    arr = (encoded[0] if encoded.ndim == 4 else encoded).astype(np.float32)
-    # Normalize globally to [0, 1].
-    vmin, vmax = arr.min(), arr.max()
-    if vmax > vmin:
-        arr = (arr - vmin) / (vmax - vmin)
-    def _r(v): return round(float(v), precision)
-    if arr.ndim == 3:
-        # Convolutional: shape (H, W, C) — one bin per channel.
-        H, W, C = arr.shape
-        spatial = arr.reshape(H * W, C)  # (H*W, C)
-        def _peak(ch_map):
-            vmax = ch_map.max()
-            rows, cols = np.where(ch_map == vmax)
-            return [int(round(rows.mean())), int(round(cols.mean()))]
-        peak_rc = [_peak(arr[:, :, c]) for c in range(C)]
-        data = {
-            "model": model_name,
-            "encoder_layer": encoder_layer,
-            "encoder_shape": list(arr.shape),
-            "n_values": int(arr.size),
-            "min":  [_r(v) for v in spatial.min(axis=0)],
-            "max":  [_r(v) for v in spatial.max(axis=0)],
-            "avg":  [_r(v) for v in spatial.mean(axis=0)],
-            "std":  [_r(v) for v in spatial.std(axis=0)],
-            "q25":  [_r(v) for v in np.percentile(spatial, 25, axis=0)],
-            "q50":  [_r(v) for v in np.percentile(spatial, 50, axis=0)],
-            "q75":  [_r(v) for v in np.percentile(spatial, 75, axis=0)],
-            "peak": peak_rc,
-        }
-    else:
-        # Dense: split flat vector into n_bins equal-sized bins.
-        flat = arr.flatten()
-        bins = np.array_split(flat, n_bins)
-        data = {
-            "model": model_name,
-            "encoder_layer": encoder_layer,
-            "encoder_shape": list(arr.shape),
-            "n_values": int(flat.size),
-            "min":  [_r(b.min())  for b in bins],
-            "max":  [_r(b.max())  for b in bins],
-            "avg":  [_r(b.mean()) for b in bins],
-            "std":  [_r(b.std())  for b in bins],
-            "q25":  [_r(np.percentile(b, 25)) for b in bins],
-            "q50":  [_r(np.percentile(b, 50)) for b in bins],
-            "q75":  [_r(np.percentile(b, 75)) for b in bins],
-        }
-    with open(filepath, "w") as f:
-        json.dump(data, f, indent=2)
+# Stage timing of the current step (see next_image()) and rolling statistics over the last steps.
+step_timing = xeno_timing.StepTiming()
+stage_stats = None
+
+# Step timing CSV, written in the experiment directory.
+TIMING_CSV = "step_timings.csv"
+
+# Stage columns of the step timing CSV, in step order. The save_* stages except save_4prj run on the
+# artifact writer, in parallel with the next stages; "total" is the time until XenoPi is answered.
+TIMING_STAGES = ["total", "load", "raw_transformed", "transformed", "masked", "enhanced", "simplified", "resized",
+                 "visibility", "generate", "iteration", "postprocess", "squircle", "save_4prj", "osc_send",
+                 "save_col", "base_transformed", "save_bsb", "save_0trn", "save_1fil", "save_2res", "save_3ann",
+                 "save_code", "save_code_json", "save_signature"]
+
+# Records a finished step timing: rolling statistics, CSV row and OSC monitor update.
+# Runs on the artifact writer after the background saves of the step (jobs run in order).
+def finish_step_timing(timing, csv_path):
+    stage_stats.record(timing)
+    xeno_timing.append_csv(csv_path, timing, TIMING_STAGES)
+    summary = stage_stats.summary()
+    for stage, values in summary.items():
+        monitor_client.send_message("/xeno/neurons/timing/{}".format(stage), [round(v, 3) for v in values])
+    log.info("Step timing: total {:.1f} ms (p50 {:.1f} ms, p95 {:.1f} ms), {} iterations".format(
+        timing.durations["total"] * 1000.0, summary["total"][0], summary["total"][1], timing.counts.get("iteration", 0)))
+
+# Saves the natural-scale base subtraction of perspective-corrected raw and base images.
+def save_natural_difference(raw_transformed, base_transformed, filepath):
+    xeno_image.remove_base_natural(raw_transformed, base_transformed).save(filepath)
 
 # Processes next image based on image path and sends an OSC message back to the XenoPi program.
 # At each step, this function will save the following images:
@@ -289,14 +349,22 @@ def save_code_signature(encoded, filepath, n_bins=40, precision=4):
 # - (basename)_1fil.png : filtered image
 # - (basename)_2res.png : original starting point image
 # - (basename)_3ann.png : image generated by the autoencoder
-# - (basename)_code.png : features generated by the encoder (encoded as json array)
+# - (basename)_code.npy : features generated by the encoder (float16 array, see xeno_activations;
+#                          _code.json with code_format "json" or "both")
+# The duration of each stage is appended to step_timings.csv in the same directory.
 def next_image(image_path, base_image_path, starting_frame_random):
     global n_feedback_steps, input_quad, input_shape, image_side, use_base_image, prev_frame, \
            output_size, output_stroke_width, output_boundary_px, output_threshold, output_area_max, \
-           squircle_mode, visibility_threshold_cv, visibility_threshold_human
+           squircle_mode, visibility_threshold_cv, visibility_threshold_human, image_engine, code_format, step_timing
+
+    # Steps queued while the model was loading run after the load job, which may have failed.
+    if model_state != "ready":
+        skip_step(image_path)
+        return
 
     dirname = os.path.dirname(image_path)
     basename = os.path.splitext(os.path.basename(image_path))[0]
+    timing = step_timing = xeno_timing.StepTiming(basename)
 
     if starting_frame_random:
         starting_frame = None
@@ -305,103 +373,190 @@ def next_image(image_path, base_image_path, starting_frame_random):
         if not use_base_image:
             base_image_path = False
 
-        starting_image, filtered_image, ___, ___, transformed_image, raw_transformed = xeno_image.load_image(image_path, base_image_path, image_side, input_quad, squircle_mode=squircle_mode)
+        with timing.measure("load"):
+            pipeline = xeno_image.load_pipeline(image_path, base_image_path, image_side, input_quad, squircle_mode=squircle_mode, engine=image_engine)
+            pipeline.image.load()
+        # Pipeline stages in computation order, each timed with its dependencies already computed.
+        for stage in ("raw_transformed", "transformed", "masked", "enhanced", "simplified", "resized"):
+            with timing.measure(stage):
+                pipeline.get(stage)
+        starting_image, filtered_image, ___, ___, transformed_image, raw_transformed = pipeline.stages()
         starting_frame = xeno_image.image_to_array(starting_image, input_shape)
-        raw_transformed.save("{}/{}_col.png".format(dirname, basename))
+        # Diagnostic images are written in the background (off the critical path).
+        artifact_writer.submit(timing.timed("save_col", raw_transformed.save), "{}/{}_col.png".format(dirname, basename))
         if base_image_path:
-            base_img = Image.open(base_image_path)
-            base_tf  = xeno_image.transform(base_img.convert('L'), input_quad)
-            xeno_image.remove_base_natural(raw_transformed, base_tf).save("{}/{}_bsb.png".format(dirname, basename))
-        transformed_image.save("{}/{}_0trn.png".format(dirname, basename))
-        filtered_image.save("{}/{}_1fil.png".format(dirname, basename))
-        starting_image.save("{}/{}_2res.png".format(dirname, basename))
+            with timing.measure("base_transformed"):
+                base_tf = xeno_image.get_base_image(base_image_path).transformed(input_quad)
+            artifact_writer.submit(timing.timed("save_bsb", save_natural_difference), raw_transformed, base_tf, "{}/{}_bsb.png".format(dirname, basename))
+        artifact_writer.submit(timing.timed("save_0trn", transformed_image.save), "{}/{}_0trn.png".format(dirname, basename))
+        artifact_writer.submit(timing.timed("save_1fil", filtered_image.save), "{}/{}_1fil.png".format(dirname, basename))
+        artifact_writer.submit(timing.timed("save_2res", starting_image.save), "{}/{}_2res.png".format(dirname, basename))
         # Compute and broadcast visibility class (correlation with previous projected glyph).
-        vis_class = xeno_image.compute_visibility(
-            starting_image,
-            raw_image=raw_transformed,
-            projected=prev_frame,
-            threshold_cv=visibility_threshold_cv,
-            threshold_human=visibility_threshold_human,
-        )
-        send_message("/xeno/neurons/visibility", [vis_class], client=xenopi_client)
+        with timing.measure("visibility"):
+            vis_class = xeno_image.compute_visibility(
+                starting_image,
+                raw_image=raw_transformed,
+                projected=prev_frame,
+                threshold_cv=visibility_threshold_cv,
+                threshold_human=visibility_threshold_human,
+            )
+        with timing.measure("osc_send"):
+            send_message("/xeno/neurons/visibility", [vis_class], client=xenopi_client)
     # Generate new image.
-    encoded, frame = generate(n_feedback_steps, starting_frame, prev_frame)
+    with timing.measure("generate"):
+        encoded, frame = generate(n_feedback_steps, starting_frame, prev_frame)
     prev_frame = np.copy(frame)
     # Save raw AE output (before postprocessing).
     image = xeno_image.array_to_image(frame, image_side, image_side)
-    image.save("{}/{}_3ann.png".format(dirname, basename))
+    artifact_writer.submit(timing.timed("save_3ann", image.save), "{}/{}_3ann.png".format(dirname, basename))
     # Postprocess: distance transform, threshold, stroke widening.
-    image = xeno_image.postprocess_output(
-        image,
-        output_size=output_size,
-        threshold=output_threshold,
-        stroke_width=output_stroke_width,
-        boundary_px=output_boundary_px,
-        area_max=output_area_max,
-    )
+    with timing.measure("postprocess"):
+        image = xeno_image.postprocess_output(
+            image,
+            output_size=output_size,
+            threshold=output_threshold,
+            stroke_width=output_stroke_width,
+            boundary_px=output_boundary_px,
+            area_max=output_area_max,
+        )
     # Squircle remapping: map square output to circular disc for projection.
-    if squircle_mode == "inside":
-        image = xeno_image.to_circle_inside(image)
-    elif squircle_mode == "outside":
-        image = xeno_image.to_circle_outside(image)
-    # Save postprocessed projected image.
+    with timing.measure("squircle"):
+        if squircle_mode == "inside":
+            image = xeno_image.to_circle_inside(image)
+        elif squircle_mode == "outside":
+            image = xeno_image.to_circle_outside(image)
+    # Save postprocessed projected image (the only file XenoPi waits for).
     nn_image_path = "{}/{}_4prj.png".format(dirname, basename)
-    image.save(nn_image_path)
+    with timing.measure("save_4prj"):
+        image.save(nn_image_path)
     # Save encoded data (only when encoder output is available).
     if encoded is not None:
-        save_encoded_json(encoded, "{}/{}_code.json".format(dirname, basename))
-        save_code_signature(encoded, "{}/{}_code_signature.json".format(dirname, basename))
+        if code_format in ("npy", "both"):
+            artifact_writer.submit(timing.timed("save_code", xeno_activations.save_activations), encoded, "{}/{}{}".format(dirname, basename, xeno_activations.NPY_SUFFIX))
+        if code_format in ("json", "both"):
+            artifact_writer.submit(timing.timed("save_code_json", save_encoded_json), encoded, "{}/{}{}".format(dirname, basename, xeno_activations.JSON_SUFFIX))
+        artifact_writer.submit(timing.timed("save_signature", xeno_signature.save_signature), encoded, "{}/{}_code_signature.json".format(dirname, basename), model_name, encoder_layer)
     # Return back OSC message.
-    send_message("/xeno/neurons/step", [nn_image_path])
+    with timing.measure("osc_send"):
+        send_message("/xeno/neurons/step", [nn_image_path])
+    timing.end()
+    artifact_writer.submit(finish_step_timing, timing, os.path.join(dirname, TIMING_CSV))
 
 # Handler for new experiment..
 def handle_new(addr):
     send_message("/xeno/neurons/new")
 
-# Handler for first image step.
+# Handlers below run on the OSC receive thread: anything heavier than a reply is queued on
+# job_worker, which runs steps, settings reloads and camera tests one at a time, in order.
+# Repeated requests for a step (or test) already queued or running are coalesced.
+
+# Skips a step that cannot run without the model: logs it and answers /xeno/neurons/loading with the model state.
+def skip_step(image_path):
+    log.warning("Model not ready ({}): skipping step {}".format(model_state, image_path))
+    send_message("/xeno/neurons/loading", [model_state], client=xenopi_client)
+
+# Handler for first image step (queued behind the model while it loads, skipped if it failed to load).
 def handle_begin(addr, image_path, base_image_path):
-    try:
-        next_image(image_path, base_image_path, True)
-    except Exception as e:
-        traceback.print_exc()
+    if model_state == "error":
+        skip_step(image_path)
+    else:
+        job_worker.submit(next_image, image_path, base_image_path, True, key=("step", image_path))
 
 # Handler for one image step.
 def handle_step(addr, image_path, base_image_path):
-    try:
-        next_image(image_path, base_image_path, False)
-    except Exception as e:
-        traceback.print_exc()
+    if model_state == "error":
+        skip_step(image_path)
+    else:
+        job_worker.submit(next_image, image_path, base_image_path, False, key=("step", image_path))
 
-# Handler for XenoPi handshake.
+# Handler for XenoPi handshake (answered immediately, even while a step is computing).
+# While the model is loading, answers /xeno/neurons/loading with the current phase instead.
 def handle_handshake(addr):
-    send_message("/xeno/neurons/handshake",client=xenopi_client)
+    if model_state == "ready":
+        send_message("/xeno/neurons/handshake",client=xenopi_client)
+    else:
+        send_message("/xeno/neurons/loading", [model_state], client=xenopi_client)
 
-# Handler for settings updated.
+# Handler for settings updated (applied between steps). If settings are being loaded, they are loaded
+# once more afterwards: settings.json may have changed after it was read.
 def handle_settings_updated(addr):
-    load_settings()
+    job_worker.submit(load_settings, key="settings", rerun=True)
 
 # Handler for camera test.
 def handle_test_camera(addr, image_path):
-    global input_quad, image_side, squircle_mode
+    job_worker.submit(test_camera, image_path, key=("test-camera", image_path))
+
+def test_camera(image_path):
+    global input_quad, image_side, squircle_mode, image_engine
     dirname = os.path.dirname(image_path)
     basename = os.path.splitext(os.path.basename(image_path))[0]
-    starting_image, filtered_image, ___, ___, transformed_image, ___ = xeno_image.load_image(image_path, False, image_side, input_quad, squircle_mode=squircle_mode)
+    starting_image, filtered_image, ___, ___, transformed_image, ___ = xeno_image.load_image(image_path, False, image_side, input_quad, squircle_mode=squircle_mode, engine=image_engine)
     transformed_image_path = "{}/{}_0trn.png".format(dirname, basename)
     transformed_image.save(transformed_image_path.format(dirname, basename))
     filtered_image.save("{}/{}_1fil.png".format(dirname, basename))
     starting_image.save("{}/{}_2res.png".format(dirname, basename))
     send_message("/xeno/neurons/test-camera", [transformed_image_path], client=xenopi_client)
 
-# Load model.
-model_file = "{}/{}.hdf5".format(args.model_directory, model_name)
-autoencoder_model = load_model(model_file)
-model = Model(
-    inputs = autoencoder_model.input,
-    outputs = [
-        autoencoder_model.layers[encoder_layer].output, # encoder activations
-        autoencoder_model.output # decoder activations
-    ]
-)
+# Model loading state: "import", "load", "warm-up", "ready" or "error".
+model_state = "import"
+startup_timings = {}
+
+# Imports keras and loads the model (or loads the exported .npz with inference_engine "numpy"),
+# then warms up inference (one forward pass at the real input shape).
+# Logs the duration of each phase and sends them as /xeno/neurons/timings [import, load, warm-up]
+# (seconds), then /xeno/neurons/begin once the model is ready.
+def load_network():
+    global model, inference, model_state, startup_timings
+    try:
+        if inference_engine == "numpy":
+            # Pure-NumPy runtime on the exported weights: nothing to import.
+            startup_timings["import"] = 0.0
+            model_state = "load"
+            t = time.perf_counter()
+            npz_file = "{}/{}.npz".format(args.model_directory, model_name)
+            if not os.path.exists(npz_file):
+                raise FileNotFoundError("{} not found: export it with 'python xeno_inference.py {}/{}.hdf5'".format(
+                    npz_file, args.model_directory, model_name))
+            inference = xeno_inference.NumpyModel(npz_file, encoder_layer, input_shape, precision=inference_precision)
+            startup_timings["load"] = time.perf_counter() - t
+        else:
+            t = time.perf_counter()
+            import keras
+            startup_timings["import"] = time.perf_counter() - t
+
+            model_state = "load"
+            t = time.perf_counter()
+            model_file = "{}/{}.hdf5".format(args.model_directory, model_name)
+            model = xeno_inference.load_feedback_model(model_file, encoder_layer)
+            startup_timings["load"] = time.perf_counter() - t
+
+            # Compiled single-frame inference (avoids model.predict() overhead), traced once at startup.
+            inference = xeno_inference.InferenceFunction(model, input_shape)
+
+        model_state = "warm-up"
+        t = time.perf_counter()
+        inference.warmup(n_calls=1)
+        startup_timings["warm-up"] = time.perf_counter() - t
+    except Exception:
+        model_state = "error"
+        log.exception("Could not load model")
+        send_message("/xeno/neurons/loading", [model_state])
+        return
+
+    model_state = "ready"
+    timings = [round(startup_timings[phase], 3) for phase in ("import", "load", "warm-up")]
+    log.info("Model ready: import {:.3f} s, load {:.3f} s, warm-up {:.3f} s (total since start {:.3f} s)".format(
+        *timings, time.perf_counter() - process_start))
+    send_message("/xeno/neurons/timings", timings)
+    # Indicates that the network is ready.
+    log.info("Program ready. You can now start XenoPi generative mode.")
+    send_message("/xeno/neurons/begin")
+
+# Background writer for the diagnostic artifacts of each step.
+artifact_writer = xeno_writer.ArtifactWriter()
+
+# Inference worker: runs the jobs queued by the OSC handlers.
+job_worker = xeno_jobs.JobWorker("inference-worker")
 
 # Create OSC dispatcher.
 dispatcher = dispatcher.Dispatcher()
@@ -416,19 +571,33 @@ dispatcher.map("/xeno/euglenas/test-camera", handle_test_camera)
 server = osc_server.BlockingOSCUDPServer(("0.0.0.0", args.receive_port), dispatcher)
 xenopi_client = udp_client.SimpleUDPClient(args.xenopi_ip, args.xenopi_send_port)
 orbiter_client = udp_client.SimpleUDPClient(args.orbiter_ip, args.orbiter_send_port)
+monitor_client = udp_client.SimpleUDPClient(args.monitor_ip or args.server_ip, args.monitor_send_port)
+stage_stats = xeno_timing.StageStats(args.timing_window)
 
 # Allows program to end cleanly on a CTRL-C command.
 def interrupt(signup, frame):
     global xenopi_client, orbiter_client, server
-    # print("Exiting program... {}".format(np.mean(perf_measurements)))
     send_message("/xeno/neurons/end")
     server.server_close()
+    # Let the running job finish (pending ones are dropped).
+    job_worker.stop()
+    # Write pending artifacts before exiting.
+    log.info("Flushing {} pending artifact writes".format(artifact_writer.pending()))
+    artifact_writer.close()
+    for stage, (p50, p95, max_ms) in stage_stats.summary().items():
+        log.info("Timing {:<16} p50 {:8.2f} ms  p95 {:8.2f} ms  max {:8.2f} ms".format(stage, p50, p95, max_ms))
     sys.exit()
 
 signal.signal(signal.SIGINT, interrupt)
 
-# Indicates that server is ready.
-log.info("Serving on {}. Program ready. You can now start XenoPi generative mode.".format(server.server_address))
-send_message("/xeno/neurons/begin")
+# Load the model: on the inference worker while already serving (steps received meanwhile wait
+# for it), or before serving with --wait-for-model (exiting if it cannot be loaded).
+if args.wait_for_model:
+    load_network()
+    if model_state != "ready":
+        sys.exit(1)
+else:
+    job_worker.submit(load_network, key="load-network")
 
+log.info("Serving on {} (model: {}).".format(server.server_address, model_state))
 server.serve_forever()
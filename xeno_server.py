@@ -1,5 +1,6 @@
 import numpy as np
 
+import functools
 import logging
 import os
 import os.path
@@ -9,16 +10,16 @@ import argparse
 
 import yaml
 
-from subprocess import Popen, PIPE
-
 from pythonosc import dispatcher
 from pythonosc import osc_server
 
 from pythonosc import osc_message_builder
 from pythonosc import udp_client
 
-from xeno_video import experiment_to_gif
+from xeno_video import render_display_images
 import xeno_adapter
+import xeno_jobs
+import xeno_transfer
 
 logging.basicConfig(
     level=logging.INFO,
@@ -64,6 +65,10 @@ parser.add_argument("-dx", "--xenopi-snapshots-dir", default="/home/pi/xenolalia
 
 parser.add_argument("-dl", "--local-snapshots-dir", default="./contents",
                     help="Path to local snapshots folder.")
+parser.add_argument("--transfer", default="ssh", choices=["ssh", "local"],
+                    help="How to fetch experiments: over SSH from XenoPi, or from a local/mounted XenoPi snapshots folder (replays, tests).")
+parser.add_argument("--notify-after", default="render", choices=["receive", "fetch", "render"],
+                    help="When NEW/STEP/END are forwarded to XenoProjection and the monitor: on receipt, once the experiment is fetched, or once its images are rendered.")
 
 parser.add_argument("-ix", "--xenopi-ip", default="192.168.0.101",
                     help="The IP address where the XenoPi program runs.")
@@ -111,43 +116,74 @@ def xenopi_experiment_path(uid):
 def local_experiment_path(uid):
     return "{}/{}".format(args.local_snapshots_dir, uid)
 
-# Performs a recursive rsync from source (on XenoPi) to destination (on local host)
-def rsync(src_dir, dst_dir):
-    # Build commandline.
-    cmd = "/usr/bin/rsync -ratlz\
-        --rsh=\"/usr/bin/sshpass -p {password} \
-        ssh -o StrictHostKeyChecking=no -l {username}\" \
-        {xenopi_ip}:{src_dir} {dst_dir}".format(
-            password=args.xenopi_password, username=args.xenopi_username, 
-            xenopi_ip=args.xenopi_ip, src_dir=src_dir.rstrip("/") + "/", dst_dir=dst_dir)
-
-    # Execute command
-    p = Popen(cmd, shell=True, stdout=PIPE, stderr=PIPE)
-    stdout, stderr = p.communicate()  # block until finished
-    
-    # Check return code
-    if p.returncode != 0:
-        print("rsync failed with return code:", p.returncode)
-        print("Error output:", stderr.decode())
+# Fetches experiment files from XenoPi: only files new or changed since the last sync, over one
+# persistent (multiplexed) SSH connection.
+if args.transfer == "local":
+    transfer = xeno_transfer.LocalSource()
+else:
+    transfer = xeno_transfer.SshSource(args.xenopi_ip, args.xenopi_username, args.xenopi_password)
 
-    return p.returncode
-    
 def fetch_experiment(uid, update_images=True):
     # First create directory.
     local_path = local_experiment_path(uid)
     if not os.path.exists(local_path):
         os.mkdir(local_path)
         
-    # Then fetch all data using rsync.
-    rsync(xenopi_experiment_path(uid), local_path)
+    # Then fetch new data.
+    result = transfer.sync(xenopi_experiment_path(uid), local_path)
+    monitor_client.send_message("/xeno/server/sync", [uid, result.n_files, result.n_bytes, round(result.seconds, 3)])
     
     if (update_images):
         update_experiment_images(uid)
     
+# Renders the display images of the snapshots fetched since the last update.
 def update_experiment_images(uid):
     experiment_path = local_experiment_path(uid)
-    experiment_to_gif(experiment_path, "{}/{}_ann_%d.png".format(experiment_path, uid), "ann_all", fit_in_circle=True, ann_background=(0,0,0), ann_foreground=(255,255,255))
-    experiment_to_gif(experiment_path, "{}/{}_bio_%d.png".format(experiment_path, uid), "bio_all", fit_in_circle=True)
+    n_ann = len(render_display_images(experiment_path, "{}/{}_ann_%d.png".format(experiment_path, uid), "ann_all", fit_in_circle=True, ann_background=(0,0,0), ann_foreground=(255,255,255)))
+    n_bio = len(render_display_images(experiment_path, "{}/{}_bio_%d.png".format(experiment_path, uid), "bio_all", fit_in_circle=True))
+    logging.getLogger(__name__).info("Rendered {}: {} ann, {} bio images".format(uid, n_ann, n_bio))
+
+# Fetches and renders an experiment, calling the notifications of the requests it serves
+# at the --notify-after point (also if fetching or rendering fails).
+def process_experiment(uid, notifications):
+    try:
+        fetch_experiment(uid, update_images=False)
+        if args.notify_after == "fetch":
+            for notify in notifications:
+                notify()
+            notifications = []
+        update_experiment_images(uid)
+    finally:
+        for notify in notifications:
+            notify()
+
+# One worker thread per experiment: the OSC handlers return at once, and messages arriving
+# while an experiment is processed are served together by one more fetch and render.
+experiment_worker = xeno_jobs.KeyedWorker(process_experiment, "experiment-worker")
+
+def request_experiment(uid, notify):
+    if args.notify_after == "receive":
+        notify()
+        experiment_worker.request(uid)
+    else:
+        experiment_worker.request(uid, notify)
+
+def notify_new(uid):
+    send_message("/xeno/server/new", uid)
+    monitor_client.send_message("/xeno/exp/new", uid)
+
+def notify_step(uid):
+    send_message("/xeno/server/step", uid)
+    monitor_client.send_message("/xeno/exp/step", uid)
+
+def notify_last_step(uid):
+    send_message("/xeno/server/step", uid)
+    send_message("/xeno/server/last_glyph")
+    monitor_client.send_message("/xeno/exp/last_step", uid)
+
+def notify_end(uid, visibility_class):
+    send_message("/xeno/server/end", uid)
+    monitor_client.send_message("/xeno/exp/end", [uid, visibility_class])
 
 
 # Tracks whether an experiment is currently active, to avoid forwarding
@@ -160,9 +196,7 @@ def handle_new(addr, uid):
     global experiment_active
     experiment_active = True
     print("** Received NEW {}".format(uid))
-    fetch_experiment(uid)
-    send_message("/xeno/server/new", uid)
-    monitor_client.send_message("/xeno/exp/new", uid)
+    request_experiment(uid, functools.partial(notify_new, uid))
 
 # # Handler for first image step.
 # def handle_begin(addr, uid):
@@ -173,24 +207,17 @@ def handle_new(addr, uid):
 # # Handler for first image step.
 def handle_step(addr, uid):
     print("** Received STEP {}".format(uid))
-    fetch_experiment(uid)
-    send_message("/xeno/server/step", uid)
-    monitor_client.send_message("/xeno/exp/step", uid)
+    request_experiment(uid, functools.partial(notify_step, uid))
 
 def handle_last_step(addr, uid):
     print("** Received LAST_STEP {}".format(uid))
-    fetch_experiment(uid)
-    send_message("/xeno/server/step", uid)
-    send_message("/xeno/server/last_glyph")
-    monitor_client.send_message("/xeno/exp/last_step", uid)
+    request_experiment(uid, functools.partial(notify_last_step, uid))
 
 def handle_end(addr, uid, visibility_class=0):
     global experiment_active
     experiment_active = False
     print("** Received END {} (visibility={})".format(uid, visibility_class))
-    fetch_experiment(uid)
-    send_message("/xeno/server/end", uid)
-    monitor_client.send_message("/xeno/exp/end", [uid, visibility_class])
+    request_experiment(uid, functools.partial(notify_end, uid, visibility_class))
 
 def handle_state(addr, state):
     print("** Received STATE {}".format(state))
@@ -260,6 +287,8 @@ def interrupt(signup, frame):
         adapter.shutdown()
     send_message("/xeno/server/end")
     server.server_close()
+    experiment_worker.stop(wait=False)
+    transfer.close()
     sys.exit()
 
 signal.signal(signal.SIGINT, interrupt)
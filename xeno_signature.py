@@ -0,0 +1,128 @@
+"""
+xeno_signature.py — Compact code signatures of encoder activations.
+
+A code signature summarises the encoder activations of one frame (globally
+normalized to [0, 1]) as a few short vectors sent to the sonoscope and saved
+as _code_signature.json:
+- convolutional encoders (H x W x C): one bin per channel, i.e. statistics
+  over the H x W spatial values, plus the (row, col) of each channel's peak;
+- dense encoders: the flattened vector split into n_bins bins (as
+  np.array_split does).
+
+Statistics are computed for a whole batch of frames at once: one reduction
+per statistic, a single np.quantile call for all quantiles, reshape-based
+binning and array-level rounding.
+
+Usage:
+    import xeno_signature
+    xeno_signature.save_signature(encoded, "snapshot_0001_raw_code_signature.json", model=model_name, encoder_layer=5)
+    stats = xeno_signature.batch_stats(encodeds)    # {"min": (N, C), ..., "peak": (N, C, 2)}
+    data = xeno_signature.signatures(encodeds)      # one signature dict per frame
+"""
+
+import json
+
+import numpy as np
+
+# Default number of bins of dense signatures.
+N_BINS = 40
+
+# Statistics of a signature, in file order.
+STATS = ("min", "max", "avg", "std", "q25", "q50", "q75")
+QUANTILES = (0.25, 0.5, 0.75)
+
+
+def as_batch(encoded):
+    """Return encoded as a float32 batch: (N, H, W, C) for convolutional, (N, D) for dense encoders."""
+    arr = np.asarray(encoded, dtype=np.float32)
+    if arr.ndim in (1, 3):
+        arr = arr[np.newaxis]
+    return arr
+
+
+def normalize(batch):
+    """Normalize each frame of a batch globally to [0, 1] (constant frames are left unchanged)."""
+    axes = tuple(range(1, batch.ndim))
+    vmin = batch.min(axis=axes, keepdims=True)
+    vmax = batch.max(axis=axes, keepdims=True)
+    scale = vmax - vmin
+    constant = scale == 0
+    return np.where(constant, batch, (batch - vmin) / np.where(constant, 1, scale))
+
+
+def _bin_stats(groups, stats):
+    """Append the statistics over the last axis of groups (N, n_groups, size) to stats."""
+    stats["min"].append(groups.min(axis=-1))
+    stats["max"].append(groups.max(axis=-1))
+    stats["avg"].append(groups.mean(axis=-1))
+    stats["std"].append(groups.std(axis=-1))
+    for q, values in zip(QUANTILES, np.quantile(groups, QUANTILES, axis=-1)):
+        stats["q{}".format(int(q * 100))].append(values)
+
+
+def batch_stats(encoded, n_bins=N_BINS):
+    """Return the signature statistics of a batch of encodings.
+
+    Returns a dict of (N, n_values) arrays for STATS (n_values = C for
+    convolutional encoders, n_bins for dense ones) and, for convolutional
+    encoders, "peak": (N, C, 2) integer (row, col) of each channel's maximum
+    (average position if the maximum is reached several times).
+    """
+    batch = normalize(as_batch(encoded))
+    n = len(batch)
+    stats = {stat: [] for stat in STATS}
+    if batch.ndim == 4:
+        _, h, w, c = batch.shape
+        # (N, C, H*W): one group of spatial values per channel.
+        _bin_stats(batch.reshape(n, h * w, c).transpose(0, 2, 1), stats)
+        is_peak = batch == batch.max(axis=(1, 2), keepdims=True)
+        counts = is_peak.sum(axis=(1, 2))
+        rows = (is_peak * np.arange(h)[:, np.newaxis, np.newaxis]).sum(axis=(1, 2)) / counts
+        cols = (is_peak * np.arange(w)[np.newaxis, :, np.newaxis]).sum(axis=(1, 2)) / counts
+        peak = np.stack([np.round(rows), np.round(cols)], axis=-1).astype(int)
+    else:
+        flat = batch.reshape(n, -1)
+        # np.array_split sizes: the first (size % n_bins) bins hold one more value.
+        size, n_larger = divmod(flat.shape[1], n_bins)
+        split = n_larger * (size + 1)
+        if n_larger:
+            _bin_stats(flat[:, :split].reshape(n, n_larger, size + 1), stats)
+        _bin_stats(flat[:, split:].reshape(n, n_bins - n_larger, size), stats)
+        peak = None
+    stats = {stat: np.concatenate(values, axis=1) for stat, values in stats.items()}
+    if peak is not None:
+        stats["peak"] = peak
+    return stats
+
+
+def signatures(encoded, model=None, encoder_layer=None, n_bins=N_BINS, precision=4):
+    """Return the signature dict (as saved in _code_signature.json) of each frame of a batch."""
+    batch = as_batch(encoded)
+    stats = batch_stats(batch, n_bins)
+    # Shape of one frame as saved: (H, W, C), or (1, D) for dense encoders.
+    encoder_shape = list(batch.shape[1:]) if batch.ndim == 4 else [1, batch.shape[1]]
+    rounded = {stat: np.round(stats[stat].astype(np.float64), precision).tolist() for stat in STATS}
+    peaks = stats["peak"].tolist() if "peak" in stats else None
+    result = []
+    for i in range(len(batch)):
+        data = {
+            "model": model,
+            "encoder_layer": encoder_layer,
+            "encoder_shape": encoder_shape,
+            "n_values": int(batch[i].size),
+        }
+        for stat in STATS:
+            data[stat] = rounded[stat][i]
+        if peaks is not None:
+            data["peak"] = peaks[i]
+        result.append(data)
+    return result
+
+
+def save_signature(encoded, filepath, model=None, encoder_layer=None, n_bins=N_BINS, precision=4):
+    """Save the signature of a single encoding (with or without batch dimension) to a JSON file."""
+    if encoded is None:
+        return
+    data = signatures(encoded, model, encoder_layer, n_bins, precision)[0]
+    with open(filepath, "w") as f:
+        json.dump(data, f, indent=2)
@@ -86,18 +86,17 @@ def _process_one(args_tuple):
     result = {"path": raw_path_str, "exp_dir": str(raw_path.parent)}
 
     try:
+        # Stages are computed lazily: only those not found on disk are run.
+        pipeline = xeno_image.load_pipeline(str(raw_path), False, image_side=28,
+                                            input_quad=input_quad,
+                                            squircle_mode=squircle_mode)
+
         # ---- resized: use pre-computed *_2res.png if available ----
         precomp_resized = raw_path.with_name(raw_path.stem + '_2res.png')
         if precomp_resized.exists():
             resized = Image.open(str(precomp_resized)).convert('L')
-            # Still need raw_transformed for human correlation (load separately below).
-            need_pipeline = False
         else:
-            resized, simplified, enhanced, masked, transformed, raw_transformed = \
-                xeno_image.load_image(str(raw_path), False, image_side=28,
-                                      input_quad=input_quad,
-                                      squircle_mode=squircle_mode)
-            need_pipeline = True
+            resized = pipeline.resized
 
         result["density"] = xeno_image._image_density(resized)
         result["resized_bytes"] = _img_to_bytes(resized)
@@ -106,12 +105,9 @@ def _process_one(args_tuple):
         precomp_trn = raw_path.with_name(raw_path.stem + '_0trn.png')
         if precomp_trn.exists():
             transformed_disp = Image.open(str(precomp_trn)).convert('L')
-        elif need_pipeline:
-            transformed_disp = transformed
         else:
-            # Run only perspective transform (fast).
-            raw_img = Image.open(str(raw_path))
-            transformed_disp = xeno_image.transform(raw_img.convert('L'), input_quad)
+            # Only runs the perspective transform if resized was pre-computed (fast).
+            transformed_disp = pipeline.transformed
 
         # ---- correlations (need prev_ann) ----
         if prev_ann_str:
@@ -126,11 +122,7 @@ def _process_one(args_tuple):
                 result["ann_bytes"] = _img_to_bytes(projected)
 
                 # For human display: use perspective-corrected raw (no processing).
-                if need_pipeline:
-                    raw_for_display = raw_transformed
-                else:
-                    raw_img = Image.open(str(raw_path))
-                    raw_for_display = xeno_image.transform(raw_img.convert('RGB'), input_quad)
+                raw_for_display = pipeline.raw_transformed
 
                 # For human correlation: use natural base subtraction (scale=1, no
                 # amplification) to remove illumination gradient without artificial boost.
@@ -80,11 +80,11 @@ if __name__ == "__main__":
                         projected = None
 
             try:
-                resized, simplified, enhanced, masked, transformed, raw_transformed = \
-                    xeno_image.load_image(
+                resized, raw_transformed = \
+                    xeno_image.load_pipeline(
                         str(raw_path), False, image_side=28,
                         input_quad=input_quad, squircle_mode=squircle_mode
-                    )
+                    ).stages("resized", "raw_transformed")
 
                 vis = xeno_image.compute_visibility(
                     resized,
@@ -0,0 +1,129 @@
+"""
+xeno_timing.py — Stage-level latency instrumentation for xeno_osc steps.
+
+StepTiming records how long each stage of one step takes (image load,
+pipeline stages, every autoencoder iteration, post-processing, file saves,
+OSC sends). StageStats keeps the last samples of every stage and reports
+rolling percentiles, and append_csv() writes one row per step so regressions
+can be spotted in the field.
+
+Stages can be recorded from several threads (e.g. the artifact writer timing
+background saves) as long as each stage is only recorded by one of them.
+
+Usage:
+    import xeno_timing
+    stats = xeno_timing.StageStats()
+    timing = xeno_timing.StepTiming("snapshot_0001_raw")
+    with timing.measure("postprocess"):
+        image = xeno_image.postprocess_output(image)
+    writer.submit(timing.timed("save_3ann", image.save), path)
+    timing.end()
+    stats.record(timing)
+    stats.summary()   # {stage: (p50, p95, max)} in milliseconds
+"""
+
+import collections
+import contextlib
+import csv
+import os
+import threading
+import time
+
+import numpy as np
+
+# Default number of samples per stage used for the rolling percentiles.
+ROLLING_WINDOW = 100
+
+
+class StepTiming:
+    """Durations of the stages of one step.
+
+    A stage recorded several times in a step (e.g. each autoencoder
+    iteration) is summed in durations, counted in counts and every call is
+    kept in samples.
+    """
+
+    def __init__(self, name=""):
+        self.name = name
+        self.started = time.time()
+        self.durations = collections.OrderedDict()
+        self.counts = {}
+        self.samples = {}
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        """Record one call of stage that took seconds."""
+        with self._lock:
+            self.durations[stage] = self.durations.get(stage, 0.0) + seconds
+            self.counts[stage] = self.counts.get(stage, 0) + 1
+            self.samples.setdefault(stage, []).append(seconds)
+
+    @contextlib.contextmanager
+    def measure(self, stage):
+        """Context manager recording the duration of its block as stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def timed(self, stage, fn):
+        """Return fn wrapped so that each call is recorded as stage (for background jobs)."""
+        def wrapper(*args, **kwargs):
+            with self.measure(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    def end(self):
+        """Record the time since the step started as the "total" stage."""
+        self.add("total", time.perf_counter() - self._start)
+
+    def row(self):
+        """Return a CSV row: step name, start time, n_iterations and each stage in milliseconds."""
+        row = {"step": self.name,
+               "time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started)),
+               "n_iterations": self.counts.get("iteration", 0)}
+        with self._lock:
+            for stage, seconds in self.durations.items():
+                row[stage] = round(seconds * 1000.0, 3)
+        return row
+
+
+class StageStats:
+    """Rolling latency statistics over the last window samples of each stage."""
+
+    def __init__(self, window=ROLLING_WINDOW):
+        self._history = collections.OrderedDict()
+        self._window = window
+        self._lock = threading.Lock()
+
+    def record(self, timing):
+        """Add the samples of a StepTiming."""
+        with self._lock:
+            for stage, samples in timing.samples.items():
+                if stage not in self._history:
+                    self._history[stage] = collections.deque(maxlen=self._window)
+                self._history[stage].extend(samples)
+
+    def summary(self):
+        """Return {stage: (p50, p95, max)} in milliseconds."""
+        with self._lock:
+            history = [(stage, np.array(samples) * 1000.0) for stage, samples in self._history.items()]
+        return collections.OrderedDict(
+            (stage, (float(np.percentile(ms, 50)), float(np.percentile(ms, 95)), float(ms.max())))
+            for stage, ms in history)
+
+
+def append_csv(path, timing, columns):
+    """Append the row of timing to the CSV file at path (header written on creation).
+
+    columns lists the stage columns, in order; stages not in columns are not written.
+    """
+    fieldnames = ["step", "time", "n_iterations"] + list(columns)
+    new_file = not os.path.exists(path)
+    with open(path, "a", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
+        if new_file:
+            writer.writeheader()
+        writer.writerow(timing.row())
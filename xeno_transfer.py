@@ -0,0 +1,180 @@
+"""
+xeno_transfer.py — Incremental transfer of experiment directories from XenoPi.
+
+xeno_server fetches an experiment directory from XenoPi at every NEW, STEP,
+LAST_STEP and END message. A source lists the files of the remote directory
+with their modification time and size; only files that are missing locally or
+differ (new snapshots, diagnostic images, ...) are then copied, and each sync
+reports how many files and bytes it moved and how long it took.
+
+Sources:
+- SshSource: XenoPi over SSH. All commands go through one multiplexed
+  connection (OpenSSH ControlMaster, kept open by ControlPersist), so the SSH
+  handshake and authentication happen once instead of at every message. The
+  listing is a single `find` and the copy a single rsync of the changed files.
+- LocalSource: a local (or mounted) directory standing in for XenoPi; used by
+  the tests and for replays.
+
+Usage:
+    import xeno_transfer
+    source = xeno_transfer.SshSource("192.168.0.101", "pi", password="xenolalia")
+    result = source.sync("/home/pi/xenolalia/XenoPi/snapshots/<uid>", "contents/<uid>")
+    print(result.n_files, result.n_bytes, result.seconds)
+    source.close()
+"""
+
+import collections
+import logging
+import os
+import shlex
+import shutil
+import subprocess
+import tempfile
+import time
+
+log = logging.getLogger(__name__)
+
+# Result of one sync: files and bytes copied, duration, and success.
+SyncResult = collections.namedtuple("SyncResult", ["n_files", "n_bytes", "seconds", "ok"])
+
+# Seconds the SSH master connection stays open after its last use.
+CONTROL_PERSIST = 600
+
+
+def changed_files(listing, dst_dir):
+    """Return the relative paths of listing ({path: (mtime, size)}) missing or different in dst_dir.
+
+    Files are compared by size and whole-second modification time (copies
+    keep the source mtime).
+    """
+    changed = []
+    for path, (mtime, size) in sorted(listing.items()):
+        try:
+            stat = os.stat(os.path.join(dst_dir, path))
+        except OSError:
+            changed.append(path)
+            continue
+        if stat.st_size != size or int(stat.st_mtime) != int(mtime):
+            changed.append(path)
+    return changed
+
+
+class Source:
+    """Base class of transfer sources: subclasses implement list_files() and copy_files()."""
+
+    def list_files(self, src_dir):
+        """Return {relative path: (mtime, size)} of the files under src_dir."""
+        raise NotImplementedError
+
+    def copy_files(self, src_dir, paths, dst_dir):
+        """Copy paths (relative to src_dir) to dst_dir, keeping modification times."""
+        raise NotImplementedError
+
+    def sync(self, src_dir, dst_dir):
+        """Copy the files of src_dir that are new or changed since the last sync to dst_dir."""
+        start = time.perf_counter()
+        try:
+            listing = self.list_files(src_dir)
+            paths = changed_files(listing, dst_dir)
+            if paths:
+                os.makedirs(dst_dir, exist_ok=True)
+                self.copy_files(src_dir, paths, dst_dir)
+        except (OSError, subprocess.CalledProcessError) as e:
+            log.error("Sync of {} failed: {}".format(src_dir, e))
+            return SyncResult(0, 0, time.perf_counter() - start, False)
+        result = SyncResult(len(paths), sum(listing[path][1] for path in paths), time.perf_counter() - start, True)
+        log.info("Synced {}: {} files, {} bytes in {:.3f} s".format(src_dir, result.n_files, result.n_bytes, result.seconds))
+        return result
+
+    def close(self):
+        pass
+
+
+class LocalSource(Source):
+    """Source reading a local directory."""
+
+    def list_files(self, src_dir):
+        listing = {}
+        for root, _, files in os.walk(src_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                listing[os.path.relpath(path, src_dir)] = (stat.st_mtime, stat.st_size)
+        return listing
+
+    def copy_files(self, src_dir, paths, dst_dir):
+        for path in paths:
+            dst = os.path.join(dst_dir, path)
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            shutil.copy2(os.path.join(src_dir, path), dst)
+
+
+class SshSource(Source):
+    """Source reading a directory on a remote host over one multiplexed SSH connection.
+
+    The first command opens the master connection (authenticating with
+    password through sshpass if given, otherwise with keys); later commands
+    reuse it until close() or CONTROL_PERSIST seconds without use.
+    """
+
+    def __init__(self, host, username, password=None, control_dir=None):
+        self.host = host
+        self.username = username
+        self.password = password
+        control_dir = control_dir or tempfile.gettempdir()
+        # Kept short: unix socket paths are limited to about 100 characters.
+        self.control_path = os.path.join(control_dir, "xeno-ssh-%r@%h:%p")
+
+    def ssh_command(self):
+        """Return the ssh command line (list) shared by all connections."""
+        command = ["ssh",
+                   "-o", "StrictHostKeyChecking=no",
+                   "-o", "ControlMaster=auto",
+                   "-o", "ControlPath={}".format(self.control_path),
+                   "-o", "ControlPersist={}".format(CONTROL_PERSIST),
+                   "-l", self.username]
+        if self.password:
+            # Password read from the SSHPASS environment variable (not visible in the process list).
+            command = ["sshpass", "-e"] + command
+        return command
+
+    def _env(self):
+        env = dict(os.environ)
+        if self.password:
+            env["SSHPASS"] = self.password
+        return env
+
+    def _run(self, command, input=None):
+        return subprocess.run(command, input=input, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                              env=self._env(), check=True, universal_newlines=True).stdout
+
+    @staticmethod
+    def parse_listing(output):
+        """Parse `find -printf '%T@ %s %P\\n'` output into {path: (mtime, size)}."""
+        listing = {}
+        for line in output.splitlines():
+            if not line:
+                continue
+            mtime, size, path = line.split(" ", 2)
+            listing[path] = (float(mtime), int(size))
+        return listing
+
+    @staticmethod
+    def listing_command(src_dir):
+        """Return the remote shell command listing src_dir (empty if it does not exist yet)."""
+        return "test -d {0} && find {0} -type f -printf '%T@ %s %P\\n' || true".format(shlex.quote(src_dir))
+
+    def list_files(self, src_dir):
+        return self.parse_listing(self._run(self.ssh_command() + [self.host, self.listing_command(src_dir)]))
+
+    def copy_files(self, src_dir, paths, dst_dir):
+        # Only the listed files, through the master connection; -t keeps modification times.
+        self._run(["rsync", "-lt", "--files-from=-", "-e", " ".join(shlex.quote(arg) for arg in self.ssh_command()),
+                   "{}:{}/".format(self.host, src_dir.rstrip("/")), dst_dir],
+                  input="\n".join(paths) + "\n")
+
+    def close(self):
+        """Close the master connection."""
+        subprocess.run(["ssh", "-o", "ControlPath={}".format(self.control_path), "-l", self.username,
+                        "-O", "exit", self.host], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
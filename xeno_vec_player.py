@@ -1,6 +1,7 @@
 """xeno_vec_player.py — interactively send pre-generated encoder vectors via OSC.
 
-Loads a vector dataset (.npy, .csv, or .json), then lets you drive playback
+Loads a vector dataset (.npy, .csv, or .json) or the per-step encoder
+activations of an experiment directory, then lets you drive playback
 from the interactive terminal OR via OSC control messages from a Pd patch /
 Open Stage Control.
 
@@ -10,6 +11,7 @@ so you can test the Pd sonoscope patch without running the full system.
 Usage:
     python xeno_vec_player.py analysis/all_vecs.npy
     python xeno_vec_player.py analysis/all_vecs.npy -tp 7002 -rp 7010
+    python xeno_vec_player.py contents/experiments/<uid>     # per-channel averages of each step's _code.npy
 
 Terminal controls:
     Enter / b   → bang: send current vector
@@ -24,6 +26,7 @@ OSC control (default receive port 7010):
 """
 
 import argparse
+import glob
 import json
 import os
 import sys
@@ -34,6 +37,8 @@ from pythonosc import dispatcher as osc_dispatcher
 from pythonosc import osc_server
 from pythonosc import udp_client
 
+import xeno_activations
+
 # ── CLI ────────────────────────────────────────────────────────────────────────
 
 parser = argparse.ArgumentParser(
@@ -41,7 +46,7 @@ parser = argparse.ArgumentParser(
     description=__doc__,
 )
 parser.add_argument("file", type=str,
-                    help="Vector file: .npy (N×C or R×T×C), .csv (N×C), or .json")
+                    help="Vector file: .npy (N×C or R×T×C), .csv (N×C), or .json; or a directory of _code.npy / _code.json step files")
 parser.add_argument("-ip", "--target-ip",   type=str, default="127.0.0.1",
                     help="IP of the Pd sonoscope target")
 parser.add_argument("-tp", "--target-port", type=int, default=7002,
@@ -55,7 +60,24 @@ args = parser.parse_args()
 
 # ── Load vectors ───────────────────────────────────────────────────────────────
 
+def load_code_vectors(directory):
+    """One vector per step: per-channel average of the (memory-mapped) activations of each step."""
+    files = sorted(glob.glob(os.path.join(directory, "**", "*" + xeno_activations.NPY_SUFFIX), recursive=True))
+    if not files:
+        files = xeno_activations.find_json_files(directory)
+    if not files:
+        raise ValueError("No {} or {} files in {}".format(xeno_activations.NPY_SUFFIX, xeno_activations.JSON_SUFFIX, directory))
+    vectors = []
+    for path in files:
+        codes = xeno_activations.load_activations(path)
+        vectors.append(codes.reshape(len(codes), -1).mean(axis=1) if codes.ndim == 3 else codes)
+    arr = np.array(vectors, dtype=np.float32)
+    print("Loaded {} step files  {} vectors × {} channels".format(len(files), *arr.shape))
+    return arr
+
 def load_vectors(path):
+    if os.path.isdir(path):
+        return load_code_vectors(path)
     ext = os.path.splitext(path)[1].lower()
     if ext == ".npy":
         arr = np.load(path)
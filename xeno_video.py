@@ -1,17 +1,21 @@
 import glob
 import argparse
+import collections
+import io
+import json
 import os.path
+import struct
+import zlib
 
 import numpy as np
 import math
+from multiprocessing.pool import ThreadPool
 
 from PIL import Image, ImageOps
-from apng import APNG
 import xeno_image as xi
 
 # Load calibration settings from .json file.
 def load_settings(settings_file):
-    import json
     with open(settings_file, "r") as f:
         data = json.load(f)
         input_quad = tuple(data['camera_quad'])
@@ -57,20 +61,203 @@ def concatenate_horizontal(img1, img2):
     dst.paste(img2, (img1.width, 0))
     return dst
 
-# Generate animated GIF or APNG from list of same-size images.
-def save_images_as_animation(image_list, animation_file_name, fps=5):
+# Returns the frame of a single-frame GIF (as encoded by PIL) as (transparency index or None, image block): the image
+# descriptor, with the global color table turned into a local one, followed by the LZW-encoded data.
+def _gif_frame(data):
+    flags = data[10]
+    pos = 13
+    color_table = b""
+    if flags & 0x80:
+        color_table_size = 3 << ((flags & 7) + 1)
+        color_table = data[pos:pos + color_table_size]
+        pos += color_table_size
+    # Extensions: keep the transparency of the graphic control extension.
+    transparency = None
+    while data[pos:pos + 1] == b"!":
+        if data[pos + 1] == 0xF9 and data[pos + 3] & 1:
+            transparency = data[pos + 6]
+        pos += 2
+        while data[pos]:
+            pos += data[pos] + 1
+        pos += 1
+    descriptor = bytearray(data[pos:pos + 10])
+    if color_table:
+        descriptor[9] = (descriptor[9] & 0x40) | 0x80 | (flags & 7)
+    # Image data runs up to the trailer (";").
+    return transparency, bytes(descriptor) + color_table + data[pos + 10:-1]
+
+# Writes an animated GIF frame by frame, holding a single frame in memory (Image.save(append_images=...) keeps all
+# frames until the end). Each frame has its own color table; consecutive identical frames are merged, as PIL does.
+class GifWriter:
+
+    def __init__(self, file_name, delay, loop=0, deduplicate=True):
+        self.file_name = file_name
+        self.delay = delay
+        self.loop = loop
+        self.deduplicate = deduplicate
+        self.n_frames = 0
+        self._file = None
+        self._frame = None     # last frame (transparency, image block), written once the next one differs
+        self._duration = 0
+
+    def append(self, img):
+        buffer = io.BytesIO()
+        img.save(buffer, format="GIF")
+        frame = _gif_frame(buffer.getvalue())
+        if self.deduplicate and frame == self._frame:
+            self._duration += self.delay
+            return
+        if self._file is None:
+            self._file = open(self.file_name, "wb")
+            self._file.write(b"GIF89a" + struct.pack("<HHBBB", img.width, img.height, 0, 0, 0))
+            self._file.write(b"!\xff\x0bNETSCAPE2.0\x03\x01" + struct.pack("<H", self.loop) + b"\x00")
+        self._write_frame()
+        self._frame = frame
+        self._duration = self.delay
+        self.n_frames += 1
+
+    def _write_frame(self):
+        if self._frame is None:
+            return
+        transparency, block = self._frame
+        # Graphic control extension: duration (in 1/100 s) and transparency.
+        self._file.write(b"!\xf9\x04" + struct.pack("<BHB", 0 if transparency is None else 1, self._duration // 10,
+                                                     transparency or 0) + b"\x00")
+        self._file.write(block)
+
+    def close(self):
+        if self._file is None:
+            raise ValueError("No frames to save in {}".format(self.file_name))
+        self._write_frame()
+        self._file.write(b";")
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self._file is not None or exc[0] is None:
+            self.close()
+
+# Returns the chunks of PNG data as a list of (type, data).
+def _png_chunks(data):
+    chunks = []
+    pos = 8
+    while pos < len(data):
+        length = struct.unpack(">I", data[pos:pos + 4])[0]
+        chunks.append((data[pos + 4:pos + 8], data[pos + 8:pos + 8 + length]))
+        pos += 12 + length
+    return chunks
+
+def _png_chunk(chunk_type, data):
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data) & 0xffffffff)
+
+# Writes an animated PNG frame by frame, holding a single frame in memory. Frames are encoded in memory by PIL and
+# their chunks assembled into the APNG (IDAT data of the first frame, fdAT for the next ones). All frames take the
+# mode of the first one; with palette, they are quantized to the palette of the first frame (smaller files, suited to
+# frames of similar colors). Consecutive identical frames are merged.
+class ApngWriter:
+
+    def __init__(self, file_name, delay, loop=0, deduplicate=True, palette=False):
+        self.file_name = file_name
+        self.delay = delay
+        self.loop = loop
+        self.deduplicate = deduplicate
+        self.palette = palette
+        self.n_frames = 0
+        self._file = None
+        self._header = None        # IHDR data, shared by all frames
+        self._mode = None
+        self._palette_image = None
+        self._actl_position = None
+        self._sequence = 0
+        self._frame = None         # IDAT data of the last frame, written once the next one differs
+        self._duration = 0
+
+    def _encode(self, img):
+        if self.palette:
+            if self._palette_image is None:
+                img = self._palette_image = img.convert("RGB").quantize()
+            else:
+                img = img.convert("RGB").quantize(palette=self._palette_image)
+        elif self._mode is not None and img.mode != self._mode:
+            img = img.convert(self._mode)
+        self._mode = img.mode
+        buffer = io.BytesIO()
+        img.save(buffer, format="PNG")
+        return _png_chunks(buffer.getvalue())
+
+    def append(self, img):
+        chunks = self._encode(img)
+        frame = [data for chunk_type, data in chunks if chunk_type == b"IDAT"]
+        if self.deduplicate and frame == self._frame:
+            self._duration += self.delay
+            return
+        if self._file is None:
+            self._header = chunks[0][1]
+            self._file = open(self.file_name, "wb")
+            self._file.write(b"\x89PNG\r\n\x1a\n" + _png_chunk(b"IHDR", self._header))
+            # Frame count is known at close(): acTL is rewritten then.
+            self._actl_position = self._file.tell()
+            self._file.write(_png_chunk(b"acTL", struct.pack(">II", 0, self.loop)))
+            # Palette and other chunks preceding the image data.
+            for chunk_type, data in chunks[1:]:
+                if chunk_type in (b"IDAT", b"IEND"):
+                    break
+                self._file.write(_png_chunk(chunk_type, data))
+        elif chunks[0][1] != self._header:
+            raise ValueError("APNG frames must have the same size and mode")
+        self._write_frame()
+        self._frame = frame
+        self._duration = self.delay
+        self.n_frames += 1
+
+    def _write_frame(self):
+        if self._frame is None:
+            return
+        width, height = struct.unpack(">II", self._header[:8])
+        delay_num, delay_den = (self._duration, 1000) if self._duration <= 0xffff else (min(self._duration // 10, 0xffff), 100)
+        first_frame = self._sequence == 0
+        self._file.write(_png_chunk(b"fcTL", struct.pack(">IIIIIHHBB", self._sequence, width, height, 0, 0,
+                                                         delay_num, delay_den, 0, 0)))
+        self._sequence += 1
+        for data in self._frame:
+            if first_frame:
+                self._file.write(_png_chunk(b"IDAT", data))
+            else:
+                self._file.write(_png_chunk(b"fdAT", struct.pack(">I", self._sequence) + data))
+                self._sequence += 1
+
+    def close(self):
+        if self._file is None:
+            raise ValueError("No frames to save in {}".format(self.file_name))
+        self._write_frame()
+        self._file.write(_png_chunk(b"IEND", b""))
+        self._file.seek(self._actl_position)
+        self._file.write(_png_chunk(b"acTL", struct.pack(">II", self.n_frames, self.loop)))
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self._file is not None or exc[0] is None:
+            self.close()
+
+# Generate animated GIF or APNG from same-size images (any iterable: frames are consumed one at a time).
+# For APNG, palette quantizes all frames to the palette of the first one.
+def save_images_as_animation(images, animation_file_name, fps=5, deduplicate=True, palette=False):
     delay = int(1.0 / fps * 1000)
     type = os.path.splitext(animation_file_name)[1][1:]
     if type == "gif":
-        image_list[0].save(animation_file_name, format="GIF", append_images=image_list[1:],
-                           save_all=True, duration=delay, loop=0)
+        writer = GifWriter(animation_file_name, delay, deduplicate=deduplicate)
     elif type == "png":
-        file = APNG()
-        for img in image_list:
-            tmp_file_name = "/tmp/temp_file.png"
-            img.save(tmp_file_name, format="png")
-            file.append_file(tmp_file_name, delay=delay)
-        file.save(animation_file_name)
+        writer = ApngWriter(animation_file_name, delay, deduplicate=deduplicate, palette=palette)
+    else:
+        raise ValueError("Unsupported animation type: {}".format(type))
+    with writer:
+        for img in images:
+            writer.append(img)
 
 # Batch-resize list of images to a square image of image_side x image_side.
 def resize_square_images(image_list, image_side=480):
@@ -82,46 +269,189 @@ def resize_square_images(image_list, image_side=480):
 def snapshot_file_get_timestamp(path):
     return path.split('/')[-1].split('_')[2]
 
+# Returns list of files in folder that correspond to a certain pattern, ordered according to timestamp.
+def get_ordered_snapshot_files(folder, pattern):
+    return sorted(glob.glob(f"{folder}/{pattern}"), key=snapshot_file_get_timestamp)
+
 # Returns list of images in folder that correspond to a certain pattern, ordered according to timestamp.
 def get_ordered_snapshot_images(folder, pattern):
-    return [Image.open(filename) for filename in sorted(glob.glob(f"{folder}/{pattern}"), key=snapshot_file_get_timestamp)]
+    return [Image.open(filename) for filename in get_ordered_snapshot_files(folder, pattern)]
 
-# Get all "ann" images in experiment folder, with optional background and foreground RGB colors.
-# Uses _4prj.png (postprocessed projected output) when available, falls back to _3ann.png.
-def get_ann_images(experiment_folder, gif_file_side, background=(0, 0, 0), foreground=(255, 255, 255), fit_in_circle=False):
-    pattern = "*_4prj.png" if glob.glob(f"{experiment_folder}/*_4prj.png") else "*_3ann.png"
-    images = get_ordered_snapshot_images(experiment_folder, pattern)
-    images = [ImageOps.colorize(img, background, foreground) for img in images]
-    images = resize_square_images(images, gif_file_side)
+# Returns the file pattern of "ann" images: _4prj.png (postprocessed projected output) when available, else _3ann.png.
+def ann_images_pattern(experiment_folder):
+    return "*_4prj.png" if glob.glob(f"{experiment_folder}/*_4prj.png") else "*_3ann.png"
+
+# Display frame of one "ann" image, with background and foreground RGB colors.
+def ann_frame(img, gif_file_side, background=(0, 0, 0), foreground=(255, 255, 255), fit_in_circle=False):
+    img = resize_square_images([ImageOps.colorize(img, background, foreground)], gif_file_side)[0]
     if fit_in_circle:
-        images = [ann_image_fit_in_circle(img, background=background) for img in images]
-    return images
+        img = ann_image_fit_in_circle(img, background=background)
+    return img
+
+# Display frame of one "raw" image, perspective-corrected with input quad (already adjusted if fitting in circle).
+# Only the (cached) perspective warp is applied: none of the process_image() filtering stages.
+def bio_frame(img, gif_file_side, input_quad):
+    rt = xi.transform(img.convert('RGB'), input_quad)
+    # if fit_in_circle:
+    #     rt = xi.add_mask(rt)
+    return resize_square_images([rt], gif_file_side)[0]
+
+# Default number of frames rendered in parallel. Threads suffice: decoding, warping, resizing and encoding release the GIL.
+RENDER_WORKERS = os.cpu_count() or 4
+
+# Yields fn(item) for item in items, in order, computed by a pool of workers threads (default: RENDER_WORKERS) that
+# runs at most two frames per thread ahead of the consumer.
+def iter_frames(fn, items, workers=None):
+    workers = workers or RENDER_WORKERS
+    if workers <= 1:
+        for item in items:
+            yield fn(item)
+        return
+    with ThreadPool(workers) as pool:
+        pending = collections.deque()
+        for item in items:
+            pending.append(pool.apply_async(fn, (item,)))
+            if len(pending) > 2 * workers:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+# Returns [fn(item) for item in items], computed by a pool of workers threads (default: RENDER_WORKERS).
+def map_frames(fn, items, workers=None):
+    workers = min(workers or RENDER_WORKERS, len(items))
+    if workers <= 1:
+        return [fn(item) for item in items]
+    with ThreadPool(workers) as pool:
+        return pool.map(fn, items)
 
-# Get all "raw" images in experiment folder.
-def get_raw_images(experiment_folder, gif_file_side, input_quad, fit_in_circle=False):
-    raw_images = get_ordered_snapshot_images(experiment_folder, "*_raw.png")
-    base_image = Image.open(f"{experiment_folder}/base_image.png")
+# Get all "ann" images in experiment folder, with optional background and foreground RGB colors.
+def get_ann_images(experiment_folder, gif_file_side, background=(0, 0, 0), foreground=(255, 255, 255), fit_in_circle=False):
+    images = get_ordered_snapshot_images(experiment_folder, ann_images_pattern(experiment_folder))
+    return [ann_frame(img, gif_file_side, background, foreground, fit_in_circle) for img in images]
 
+# Get all "raw" images in experiment folder, resized and perspective-corrected ("bio").
+def get_raw_images(experiment_folder, gif_file_side, input_quad, fit_in_circle=False, workers=None):
     if fit_in_circle:
         input_quad = input_quad_fit_in_circle(input_quad)
-    raw_transformed_images = []
-    for img in raw_images:
-        __, __, __, __, __, rt = xi.process_image(img, base_image, image_side=28, input_quad=input_quad)
-        # if fit_in_circle:
-        #     rt = xi.add_mask(rt)
-        raw_transformed_images.append(rt)
-    return resize_square_images(raw_images, gif_file_side), resize_square_images(raw_transformed_images, gif_file_side)
+
+    def render(raw_file):
+        img = Image.open(raw_file)
+        return resize_square_images([img], gif_file_side)[0], bio_frame(img, gif_file_side, input_quad)
+
+    frames = map_frames(render, get_ordered_snapshot_files(experiment_folder, "*_raw.png"), workers)
+    return [raw for raw, _ in frames], [bio for _, bio in frames]
+
+# Manifest of the display images rendered in an experiment folder: {image file: source snapshot file}.
+DISPLAY_MANIFEST = "display_images.json"
+
+def load_display_manifest(experiment_folder):
+    manifest_file = f"{experiment_folder}/{DISPLAY_MANIFEST}"
+    if not os.path.exists(manifest_file):
+        return {}
+    with open(manifest_file, "r") as f:
+        return json.load(f)
+
+def save_display_manifest(experiment_folder, manifest):
+    manifest_file = f"{experiment_folder}/{DISPLAY_MANIFEST}"
+    with open(manifest_file + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(manifest_file + ".tmp", manifest_file)
+
+# Renders the display images ("ann_all", "raw_all" or "bio_all" mode) of an experiment that are not rendered yet:
+# one image per snapshot, saved as image_file_name with %d replaced by its (2-digit) index. The manifest records the
+# snapshot each image was rendered from: an image is rendered if it is missing or was rendered from another snapshot
+# (e.g. numbering changed), and only those snapshots are loaded and processed (by a pool of workers threads). Images
+# rendered before the manifest existed are kept and recorded. Returns the list of image files written.
+def render_display_images(experiment_folder, image_file_name, mode, gif_file_side=480, ann_background=(0, 0, 0),
+                          ann_foreground=(255, 255, 255), input_quad=None, fit_in_circle=False, overwrite=False,
+                          workers=None):
+    ann_files = get_ordered_snapshot_files(experiment_folder, ann_images_pattern(experiment_folder))
+    raw_files = get_ordered_snapshot_files(experiment_folder, "*_raw.png")
+
+    # Raw/bio images are numbered after the first ann image if the experiment starts with it.
+    index_offset = 0
+    if mode == "ann_all":
+        source_files = ann_files
+    elif mode in ("raw_all", "bio_all"):
+        source_files = raw_files
+        if len(ann_files) > len(raw_files):
+            index_offset = 1
+    else:
+        raise ValueError("Unknown display images mode: {}".format(mode))
+
+    manifest = load_display_manifest(experiment_folder)
+    manifest_changed = False
+    tasks = []
+    for i, source_file in enumerate(source_files):
+        file_name = image_file_name.replace("%d", f'{i + index_offset:02d}')
+        image_name, source_name = os.path.basename(file_name), os.path.basename(source_file)
+        if overwrite or not os.path.exists(file_name) or manifest.get(image_name, source_name) != source_name:
+            tasks.append((file_name, source_file))
+        elif image_name not in manifest:
+            manifest[image_name] = source_name
+            manifest_changed = True
+    if not tasks:
+        if manifest_changed:
+            save_display_manifest(experiment_folder, manifest)
+        return []
+
+    if mode == "bio_all":
+        if input_quad is None:
+            input_quad = load_settings(f"{experiment_folder}/settings.json")
+        if fit_in_circle:
+            input_quad = input_quad_fit_in_circle(input_quad)
+
+    def render(task):
+        file_name, source_file = task
+        img = Image.open(source_file)
+        if mode == "ann_all":
+            img = ann_frame(img, gif_file_side, ann_background, ann_foreground, fit_in_circle)
+        elif mode == "raw_all":
+            img = resize_square_images([img], gif_file_side)[0]
+        else:
+            img = bio_frame(img, gif_file_side, input_quad)
+        img.save(file_name)
+
+    map_frames(render, tasks, workers)
+
+    for file_name, source_file in tasks:
+        manifest[os.path.basename(file_name)] = os.path.basename(source_file)
+    save_display_manifest(experiment_folder, manifest)
+    return [file_name for file_name, _ in tasks]
+
+# Easing curves of crossfades: mixing factor as a function of the position t (in [0, 1)) of a frame in the transition.
+EASINGS = {
+    "linear": lambda t: t,
+    "ease_in": lambda t: t * t,
+    "ease_out": lambda t: t * (2 - t),
+    "smoothstep": lambda t: t * t * (3 - 2 * t),
+    "sine": lambda t: 0.5 - 0.5 * math.cos(math.pi * t),
+}
+
+# Returns the mixing factors of the crossfade_steps frames of a transition, for an easing name or function.
+def crossfade_factors(crossfade_steps=10, easing="linear"):
+    if not callable(easing):
+        if easing not in EASINGS:
+            raise ValueError("Unknown easing: {}".format(easing))
+        easing = EASINGS[easing]
+    return [float(easing(float(j) / crossfade_steps)) for j in range(crossfade_steps)]
+
+# Yields the frames of a crossfade between consecutive images (any iterable), crossfade_steps frames per pair.
+# Each image is converted once and the factors computed once, so easing costs nothing per frame; blending is left to
+# Image.blend, whose C loop is faster than a NumPy interpolation of all steps at once (xeno_benchmark.py crossfade).
+def iter_crossfade(images, crossfade_steps=10, easing="linear"):
+    factors = crossfade_factors(crossfade_steps, easing)
+    img_from = None
+    for img in images:
+        img_to = img.convert('RGBA')
+        if img_from is not None:
+            for mixing_factor in factors:
+                yield Image.blend(img_from, img_to, mixing_factor)
+        img_from = img_to
 
 # Returns a new image list from source image list with crossfade between images.
-def crossfade(image_list, crossfade_steps=10):
-    new_image_list = []
-    for i in range(len(image_list) - 1):
-        img_from = image_list[i].convert('RGBA')
-        img_to = image_list[i + 1].convert('RGBA')
-        for j in range(crossfade_steps):
-            mixing_factor = float(j) / crossfade_steps
-            new_image_list.append(Image.blend(img_from, img_to, mixing_factor))
-    return new_image_list
+def crossfade(image_list, crossfade_steps=10, easing="linear"):
+    return list(iter_crossfade(image_list, crossfade_steps, easing))
 
 # Generates an animated GIF from a single experiment. Several modes and options available.
 # "ann" : animated sequence of ANN-only generated images
@@ -129,73 +459,66 @@ def crossfade(image_list, crossfade_steps=10):
 # "raw_transformed" : animated sequence of raw images, transformed according to input quad
 # "ann_raw_transformed_concatenated" : animated sequence intermixing ANN and raw transformed images side by side
 # "ann_raw_transformed_sequence" : animated sequence intermixing ANN and raw transformed images one after the other
+# Frames are decoded and rendered lazily, only from the snapshots the mode uses, and streamed to the animation file,
+# so memory use does not grow with the number of snapshots.
 def experiment_to_gif(experiment_folder, gif_file_name, mode, gif_file_side=480, fps=5.0, ann_background=(0, 0, 0),
-                      ann_foreground=(255, 255, 255), input_quad=None, fit_in_circle=False, add_mask=False, index=-1):
+                      ann_foreground=(255, 255, 255), input_quad=None, fit_in_circle=False, add_mask=False, index=-1,
+                      workers=None, palette=False, easing="linear"):
+    # One image per snapshot: render only the missing ones.
+    if mode.endswith("all"):
+        return render_display_images(experiment_folder, gif_file_name, mode, gif_file_side, ann_background, ann_foreground,
+                                     input_quad=input_quad, fit_in_circle=fit_in_circle, workers=workers)
+
     # Get input quad.
     if input_quad is None:
-        import json
-        settings_file = f"{experiment_folder}/settings.json"
-        data = json.load(open(settings_file, "r"))
-        input_quad = tuple(data['camera_quad'])
+        input_quad = load_settings(f"{experiment_folder}/settings.json")
+    if fit_in_circle:
+        input_quad = input_quad_fit_in_circle(input_quad)
+
+    # Get image files and frame renderers.
+    ann_files = get_ordered_snapshot_files(experiment_folder, ann_images_pattern(experiment_folder))
+    raw_files = get_ordered_snapshot_files(experiment_folder, "*_raw.png")
+
+    def render_ann(ann_file):
+        return ann_frame(Image.open(ann_file), gif_file_side, ann_background, ann_foreground, fit_in_circle)
+
+    def render_raw(raw_file):
+        return resize_square_images([Image.open(raw_file)], gif_file_side)[0]
+
+    def render_bio(raw_file):
+        return bio_frame(Image.open(raw_file), gif_file_side, input_quad)
 
-    # Get image frames.
-    ann_frames = get_ann_images(experiment_folder, gif_file_side, ann_background, ann_foreground, fit_in_circle=fit_in_circle)
-    raw_frames, raw_transformed_frames = get_raw_images(experiment_folder, gif_file_side, input_quad, fit_in_circle=fit_in_circle)
-    
     if mode.endswith("single"):
         if mode == "ann_single":
-            image = ann_frames[index]
+            image = render_ann(ann_files[index])
         elif mode == "raw_single":
-            image = raw_frames[index]
+            image = render_raw(raw_files[index])
         elif mode == "bio_single":
-            image = raw_transformed_frames[index]
+            image = render_bio(raw_files[index])
+        else:
+            raise ValueError("Unknown mode: {}".format(mode))
 
         image.save(gif_file_name)
         
-    elif mode.endswith("all"):
-        ann_first = len(ann_frames) > len(raw_frames)
-        index_offset = 0
-        
-        if mode == "ann_all":
-            image_list = ann_frames
-        elif mode == "raw_all":
-            image_list = raw_frames
-            if ann_first:
-                index_offset = 1
-        elif mode == "bio_all":
-            image_list = raw_transformed_frames
-            if ann_first:
-                index_offset = 1
-
-        for i in range(len(image_list)):
-            k = i + index_offset
-            image_file_name = gif_file_name.replace("%d", f'{k:02d}')
-            if not os.path.exists(image_file_name):
-                image_list[i].save(gif_file_name.replace("%d", f'{k:02d}'))
-            else:
-                print("File already exists: {}".format(image_file_name))
-
     else:
+        # Pairs of (ann, raw) files, up to the last ann image.
+        pairs = list(zip(ann_files[:-1], raw_files))
         if mode == "ann":
-            image_list = ann_frames
+            images = iter_frames(render_ann, ann_files, workers)
         elif mode == "raw":
-            image_list = raw_frames
+            images = iter_frames(render_raw, raw_files, workers)
         elif mode == "bio":
-            image_list = raw_transformed_frames
+            images = iter_frames(render_bio, raw_files, workers)
         elif mode == "ann_bio_cat":
-            image_list = []
-            for i in range(len(ann_frames) - 1):
-                image_list.append(concatenate_horizontal(ann_frames[i], raw_transformed_frames[i]))
+            images = iter_frames(lambda pair: concatenate_horizontal(render_ann(pair[0]), render_bio(pair[1])), pairs, workers)
         elif mode == "ann_bio_seq":
-            image_list = []
-            for i in range(len(ann_frames) - 1):
-                image_list.append(ann_frames[i])
-                image_list.append(raw_transformed_frames[i])
-            image_list = crossfade(image_list, 20)
+            rendered_pairs = iter_frames(lambda pair: (render_ann(pair[0]), render_bio(pair[1])), pairs, workers)
+            images = iter_crossfade((img for rendered_pair in rendered_pairs for img in rendered_pair), 20, easing)
             fps *= 20
+        else:
+            raise ValueError("Unknown mode: {}".format(mode))
 
-        save_images_as_animation(image_list, gif_file_name, fps=fps)
-
+        save_images_as_animation(images, gif_file_name, fps=fps, palette=palette)
 
 if __name__ == "__main__":
 
@@ -225,6 +548,12 @@ if __name__ == "__main__":
 
     parser.add_argument("--add-mask", default=False, action='store_true', help="Add mask to generated images")
 
+    parser.add_argument("-w", "--workers", type=int, default=RENDER_WORKERS, help="Number of frames rendered in parallel")
+
+    parser.add_argument("--palette", default=False, action='store_true', help="Animated PNG: quantize all frames to the palette of the first one (smaller, faster)")
+
+    parser.add_argument("-e", "--easing", type=str, default="linear", choices=sorted(EASINGS), help="Easing curve of crossfades (ann_bio_seq mode)")
+
     args = parser.parse_args()
 
     # Load input quad
@@ -234,4 +563,4 @@ if __name__ == "__main__":
         input_quad = load_settings("{}/settings.json".format(args.experiment_folder))
 
     # Create GIF.
-    experiment_to_gif(args.experiment_folder, args.output_gif_file, args.mode, gif_file_side=args.image_side, fps=args.frames_per_second, ann_background=args.ann_background, ann_foreground=args.ann_foreground, input_quad=input_quad, fit_in_circle=args.fit_in_circle, add_mask=args.add_mask, index=args.index)
+    experiment_to_gif(args.experiment_folder, args.output_gif_file, args.mode, gif_file_side=args.image_side, fps=args.frames_per_second, ann_background=args.ann_background, ann_foreground=args.ann_foreground, input_quad=input_quad, fit_in_circle=args.fit_in_circle, add_mask=args.add_mask, index=args.index, workers=args.workers, palette=args.palette, easing=args.easing)
@@ -0,0 +1,82 @@
+"""
+xeno_writer.py — Background writer for diagnostic artifacts.
+
+xeno_osc saves up to nine PNG/JSON files per step, but only the projected
+image (_4prj.png) is needed before replying to XenoPi. ArtifactWriter moves
+the encoding and writing of everything else to a background thread, with a
+bounded queue so a slow SD card applies back-pressure instead of growing
+memory without limit.
+
+Usage:
+    import xeno_writer
+    writer = xeno_writer.ArtifactWriter()
+    writer.save_image(image, "snapshot_0001_3ann.png")
+    writer.submit(save_encoded_json, encoded, "snapshot_0001_code.json")
+    ...
+    writer.close()   # on shutdown: waits for pending writes
+"""
+
+import logging
+import queue
+import threading
+
+log = logging.getLogger(__name__)
+
+# Default maximum number of pending writes (about eight per step).
+MAX_PENDING = 64
+
+
+class ArtifactWriter:
+    """Runs write jobs in order on a single daemon thread.
+
+    Jobs must only use objects that are no longer modified by the caller
+    (PIL images and fresh numpy arrays in xeno_osc). Errors are logged and do
+    not stop the writer.
+    """
+
+    def __init__(self, max_pending=MAX_PENDING):
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, name="artifact-writer", daemon=True)
+        self._closed = False
+        self._thread.start()
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs); blocks while max_pending jobs are waiting."""
+        if self._closed:
+            raise RuntimeError("ArtifactWriter is closed")
+        if self._queue.full():
+            log.warning("Artifact writer queue full: waiting for pending writes")
+        self._queue.put((fn, args, kwargs))
+
+    def save_image(self, image, path):
+        """Queue a PIL image save."""
+        self.submit(image.save, path)
+
+    def pending(self):
+        """Return the number of jobs not yet completed (approximate)."""
+        return self._queue.unfinished_tasks
+
+    def flush(self):
+        """Wait until all queued jobs have been written."""
+        self._queue.join()
+
+    def close(self):
+        """Write all pending jobs and stop the thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                fn, args, kwargs = job
+                fn(*args, **kwargs)
+            except Exception:
+                log.exception("Artifact write failed")
+            finally:
+                self._queue.task_done()